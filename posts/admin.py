@@ -1,9 +1,27 @@
 from django.contrib import admin
 
-from .models import Post
+from .models import Comment, Like, Post
+
+# Every foreign key shown in a changelist is joined into the page query, so
+# a page costs the same number of queries however many rows it shows.
 
 
 @admin.register(Post)
 class PostAdmin(admin.ModelAdmin):
     list_display = ("caption", "author", "created_at")
+    list_select_related = ("author",)
     search_fields = ("caption",)
+
+
+@admin.register(Comment)
+class CommentAdmin(admin.ModelAdmin):
+    list_display = ("__str__", "post", "author", "created_at")
+    list_select_related = ("post", "author")
+    raw_id_fields = ("post", "parent", "author")
+
+
+@admin.register(Like)
+class LikeAdmin(admin.ModelAdmin):
+    list_display = ("__str__", "post", "user", "created_at")
+    list_select_related = ("post", "user")
+    raw_id_fields = ("post", "user")
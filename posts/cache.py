@@ -0,0 +1,114 @@
+import asyncio
+from collections.abc import Awaitable, Callable, Iterable
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import BaseCache, caches
+from django.db.models import F
+from rest_framework.request import Request
+
+from .concurrency import run_blocking
+from .models import Like, Post
+
+# Serialized posts are cached as per-post fragments keyed by the post ID and
+# its version column, which the database moves on every update of the row.
+# Page queries load the version along with the ID, so a changed post misses
+# in every process without any invalidation, and a stale fragment is simply
+# never read again and expires on its own. ``liked_by_me`` depends on the
+# viewer and is overlaid on every read.
+
+
+def post_cache() -> BaseCache:
+    return caches[settings.POST_CACHE_ALIAS]
+
+
+def bump_post_versions(post_ids: Iterable[int]) -> None:
+    # For changes shown in a post's fragment that do not update its row
+    # (comment edits); any update of the row moves the version by itself.
+    Post.objects.filter(pk__in=set(post_ids)).update(version=F("version") + 1)
+
+
+def fragment_key(post: Post, host: str) -> str:
+    # created_at guards against primary keys being reused after a restore.
+    return f"post:{post.id}:{post.created_at.timestamp()}:{post.version}:{host}"
+
+
+def cached_fragments(
+    posts: list[Post],
+    request: Request,
+) -> tuple[dict[int, str], dict[str, dict]]:
+    host = request.get_host()
+    keys = {post.id: fragment_key(post, host) for post in posts}
+    return keys, post_cache().get_many(keys.values())
+
+
+def store_fragments(keys: dict[int, str], data: list[dict]) -> dict[str, dict]:
+    fresh = {keys[item["id"]]: item for item in data}
+    post_cache().set_many(fresh, timeout=settings.POST_CACHE_TIMEOUT)
+    return fresh
+
+
+def liked_post_ids(user_id: int | None, post_ids: Iterable[int]) -> set[int]:
+    return set(
+        Like.objects.filter(user_id=user_id, post_id__in=post_ids).values_list(
+            "post_id",
+            flat=True,
+        ),
+    )
+
+
+def overlay_likes(
+    posts: list[Post],
+    keys: dict[int, str],
+    fragments: dict[str, dict],
+    liked: set[int],
+) -> list[dict]:
+    return [
+        {**fragments[keys[post.id]], "liked_by_me": post.id in liked}
+        for post in posts
+        if keys[post.id] in fragments
+    ]
+
+
+def cached_post_data(
+    posts: list[Post],
+    request: Request,
+    serialize: Callable[[list[int]], list[dict]],
+) -> list[dict]:
+    # ``posts`` only needs ``id``, ``created_at`` and ``version``; fragments
+    # missing from the cache are built by ``serialize(missing_ids)`` and
+    # stored.
+    keys, fragments = cached_fragments(posts, request)
+    missing = [post_id for post_id, key in keys.items() if key not in fragments]
+    if missing:
+        fragments.update(store_fragments(keys, serialize(missing)))
+
+    liked = liked_post_ids(request.user.pk, keys)
+    return overlay_likes(posts, keys, fragments, liked)
+
+
+async def acached_post_data(
+    posts: list[Post],
+    request: Request,
+    aserialize: Callable[[list[int]], Awaitable[list[dict]]],
+) -> list[dict]:
+    # cached_post_data() for async views: the viewer's likes are loaded
+    # while the fragments are read and the missing ones rebuilt.
+    post_ids = [post.id for post in posts]
+
+    async def fragments() -> tuple[dict[int, str], dict[str, dict]]:
+        keys, found = await run_blocking(
+            partial(cached_fragments, posts, request),
+        )
+        missing = [post_id for post_id, key in keys.items() if key not in found]
+        if missing:
+            data = await aserialize(missing)
+            fresh = await run_blocking(partial(store_fragments, keys, data))
+            found.update(fresh)
+        return keys, found
+
+    (keys, found), liked = await asyncio.gather(
+        fragments(),
+        run_blocking(partial(liked_post_ids, request.user.pk, post_ids)),
+    )
+    return overlay_likes(posts, keys, found, liked)
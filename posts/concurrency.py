@@ -0,0 +1,164 @@
+import asyncio
+import contextvars
+import threading
+from collections.abc import AsyncIterator, Callable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from typing import TypeVar
+
+from asgiref.sync import SyncToAsync, sync_to_async
+from django.conf import settings
+from django.db import connection, connections
+from django.db.backends.base.base import BaseDatabaseWrapper
+
+T = TypeVar("T")
+
+# Async views hand their blocking calls (queries, cache reads) to
+# gather_blocking(), which runs independent calls at the same time on a pool
+# of ASYNC_QUERY_WORKERS threads. Under ASGI every request runs its sync code
+# on a fresh thread, whose database connection cannot outlive the request;
+# pool threads are long-lived and keep one connection each, so the pool is
+# also what bounds and reuses the connections of async views. With a database
+# connection pool (DB_POOL_MAX_SIZE) they borrow one per call instead.
+# Inside a transaction (ATOMIC_REQUESTS, tests) the calls run one after
+# another on the caller's connection instead: other connections could not
+# see its uncommitted rows. ASYNC_QUERY_WORKERS = 0 always does the latter.
+# Views call bind_connection_state() on the request's own thread so this is
+# decided once per request.
+
+_executor: ThreadPoolExecutor | None = None
+_pool_connections: set[BaseDatabaseWrapper] = set()
+_executor_lock = threading.Lock()
+_shares_connection: ContextVar[bool | None] = ContextVar(
+    "shares_connection",
+    default=None,
+)
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor  # noqa: PLW0603
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.ASYNC_QUERY_WORKERS,
+                thread_name_prefix="async-query",
+            )
+    return _executor
+
+
+def shutdown_executor() -> None:
+    # Stops the pool and closes its threads' connections, e.g. before the
+    # process exits or a test database is dropped.
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown()
+    while _pool_connections:
+        conn = _pool_connections.pop()
+        # The owning thread is gone; let this one close it.
+        conn.inc_thread_sharing()
+        conn.close()
+
+
+def _run_in_pool(call: Callable[[], T]) -> T:
+    try:
+        return call()
+    finally:
+        # Keep the thread's connections unless a query broke them. Pooled
+        # connections go back to the database pool, which then bounds the
+        # connections of sync and async code alike.
+        for conn in connections.all(initialized_only=True):
+            _pool_connections.add(conn)
+            if conn.settings_dict["OPTIONS"].get("pool"):
+                conn.close()
+            elif conn.connection is not None and conn.errors_occurred:
+                if conn.is_usable():
+                    conn.errors_occurred = False
+                else:
+                    conn.close()
+
+
+def _caller_connection_is_shared() -> bool:
+    return settings.ASYNC_QUERY_WORKERS <= 0 or connection.in_atomic_block
+
+
+def bind_connection_state() -> None:
+    _shares_connection.set(_caller_connection_is_shared())
+
+
+def _run_all(calls: tuple[Callable[[], T], ...]) -> list[T]:
+    return [call() for call in calls]
+
+
+async def gather_blocking(*calls: Callable[[], T]) -> list[T]:
+    shared = _shares_connection.get()
+    if shared is None:
+        shared = await sync_to_async(_caller_connection_is_shared)()
+    if shared:
+        return await sync_to_async(_run_all)(calls)
+
+    # Each call sees the caller's context variables, as with sync_to_async.
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    return list(
+        await asyncio.gather(
+            *(
+                loop.run_in_executor(
+                    executor,
+                    contextvars.copy_context().run,
+                    _run_in_pool,
+                    call,
+                )
+                for call in calls
+            ),
+        ),
+    )
+
+
+async def run_blocking(call: Callable[[], T]) -> T:
+    [result] = await gather_blocking(call)
+    return result
+
+
+def release_request_thread() -> None:
+    # Django's ASGI handler runs a request's sync code (signal receivers,
+    # middleware, auth) on a thread of its own and keeps that thread until
+    # the response is done, even when the view is async. Long-lived streams
+    # call this once their sync work is over so an idle stream holds no
+    # thread; a later sync call in the request starts another. asgiref has
+    # no public API for it, so this reaches into SyncToAsync: requirements.txt
+    # pins the asgiref versions it was checked against, PostEventTests fails
+    # if they change, and without the attributes it does nothing and streams
+    # keep their (idle) thread.
+    contexts = getattr(SyncToAsync, "thread_sensitive_context", None)
+    executors = getattr(SyncToAsync, "context_to_thread_executor", None)
+    if contexts is None or executors is None:
+        return
+    context = contexts.get(None)
+    if context is None:
+        return
+    executor = executors.pop(context, None)
+    if executor is not None:
+        executor.shutdown(wait=False)
+
+
+class ThreadBoundStream:
+    # Streaming response content from a sync iterator that must run on a
+    # single thread, e.g. one reading a server-side cursor, which belongs to
+    # its thread's connection. Under ASGI Django would read a sync iterator
+    # to the end before sending a byte; this steps it on the request's own
+    # thread instead, one chunk at a time. Django calls close(), on that
+    # same thread, once the response is done.
+    def __init__(self, iterator: Iterator[bytes]) -> None:
+        self.iterator = iterator
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        step = sync_to_async(next)
+        while (chunk := await step(self.iterator, None)) is not None:
+            yield chunk
+
+    def close(self) -> None:
+        close = getattr(self.iterator, "close", None)
+        if close is not None:
+            close()
@@ -0,0 +1,151 @@
+import asyncio
+import threading
+from collections import defaultdict, deque
+from collections.abc import AsyncIterator, Iterable
+from functools import cache
+from typing import Protocol
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .concurrency import release_request_thread
+from .renderers import FastJSONRenderer
+
+# New comments, likes and unlikes are pushed to clients as server-sent events
+# (``comment``, ``like`` and ``unlike``). Views call publish_event() after the
+# write; once its transaction commits the event is encoded once and handed to
+# the POST_EVENTS_BROKER, which delivers the frame to every subscription
+# watching that post (or all posts). LocalBroker only reaches subscribers in
+# the same process; a broker backed by a shared pub/sub service must
+# implement the same three methods to fan out across workers.
+
+# Sent instead of the dropped events when a subscriber falls more than
+# POST_EVENTS_BUFFER_SIZE events behind; the client should refetch.
+RESET_FRAME = b"event: reset\ndata: {}\n\n"
+KEEPALIVE_FRAME = b": keepalive\n\n"
+
+
+def encode_event(name: str, data: object) -> bytes:
+    return b"event: %s\ndata: %s\n\n" % (
+        name.encode(),
+        FastJSONRenderer().render(data),
+    )
+
+
+class Subscription:
+    def __init__(
+        self,
+        post_ids: frozenset[int] | None,
+        buffer_size: int,
+    ) -> None:
+        self.post_ids = post_ids
+        self.frames: deque[bytes] = deque(maxlen=buffer_size)
+        self.overflowed = False
+        self._loop = asyncio.get_running_loop()
+        self._ready = asyncio.Event()
+        self._wakeup_pending = False
+        self._lock = threading.Lock()
+
+    def push(self, frame: bytes) -> None:
+        # Called from any thread. A slow reader never blocks the publisher:
+        # the oldest frame is dropped and the reader told to reset.
+        with self._lock:
+            if len(self.frames) == self.frames.maxlen:
+                self.overflowed = True
+            self.frames.append(frame)
+            if self._wakeup_pending:
+                return
+            self._wakeup_pending = True
+        self._loop.call_soon_threadsafe(self._ready.set)
+
+    async def next_frames(self) -> list[bytes]:
+        # Waits for at least one frame and returns everything buffered.
+        await self._ready.wait()
+        with self._lock:
+            self._ready.clear()
+            self._wakeup_pending = False
+            frames = list(self.frames)
+            self.frames.clear()
+            if self.overflowed:
+                self.overflowed = False
+                frames.insert(0, RESET_FRAME)
+        return frames
+
+
+class Broker(Protocol):
+    def publish(self, post_id: int, frame: bytes) -> None: ...
+
+    def subscribe(self, post_ids: Iterable[int] | None = None) -> Subscription: ...
+
+    def unsubscribe(self, subscription: Subscription) -> None: ...
+
+
+class LocalBroker:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._by_post: defaultdict[int, set[Subscription]] = defaultdict(set)
+        self._all_posts: set[Subscription] = set()
+
+    def publish(self, post_id: int, frame: bytes) -> None:
+        with self._lock:
+            subscriptions = [*self._all_posts, *self._by_post.get(post_id, ())]
+        for subscription in subscriptions:
+            subscription.push(frame)
+
+    def subscribe(self, post_ids: Iterable[int] | None = None) -> Subscription:
+        subscription = Subscription(
+            None if post_ids is None else frozenset(post_ids),
+            settings.POST_EVENTS_BUFFER_SIZE,
+        )
+        with self._lock:
+            if subscription.post_ids is None:
+                self._all_posts.add(subscription)
+            for post_id in subscription.post_ids or ():
+                self._by_post[post_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._all_posts.discard(subscription)
+            for post_id in subscription.post_ids or ():
+                watchers = self._by_post.get(post_id)
+                if watchers is not None:
+                    watchers.discard(subscription)
+                    if not watchers:
+                        del self._by_post[post_id]
+
+
+@cache
+def get_broker() -> Broker:
+    return import_string(settings.POST_EVENTS_BROKER)()
+
+
+def publish_event(name: str, post_id: int, data: object) -> None:
+    frame = encode_event(name, data)
+    transaction.on_commit(lambda: get_broker().publish(post_id, frame))
+
+
+class EventStream:
+    # Streaming response content. Holds no thread and no database connection
+    # while idle (see release_request_thread()); the comment frames keep
+    # proxies from closing the connection and let the server notice clients
+    # that went away. Django calls close() once the response is done, however
+    # the stream ended.
+    def __init__(self, broker: Broker, post_ids: Iterable[int] | None = None) -> None:
+        self.broker = broker
+        self.subscription = broker.subscribe(post_ids)
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        release_request_thread()
+        yield KEEPALIVE_FRAME
+        while True:
+            try:
+                async with asyncio.timeout(settings.POST_EVENTS_KEEPALIVE):
+                    frames = await self.subscription.next_frames()
+            except TimeoutError:
+                frames = [KEEPALIVE_FRAME]
+            yield b"".join(frames)
+
+    def close(self) -> None:
+        self.broker.unsubscribe(self.subscription)
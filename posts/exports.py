@@ -0,0 +1,115 @@
+from collections.abc import Callable, Iterable, Iterator
+
+from django.contrib.postgres.expressions import ArraySubquery
+from django.db.models import OuterRef
+
+from .models import Comment, Like, Post
+from .renderers import FastJSONRenderer
+from .serializers import datetime_field
+
+# A user's history as NDJSON: their posts, then their comments, then their
+# likes, oldest first, one object per line with a "type" key. Post lines
+# have the shape ``manage.py import_posts`` reads, so an export imports
+# elsewhere as is. Rows are read through server-side cursors
+# (QuerySet.iterator()) and sent in chunks of EXPORT_CHUNK_ROWS lines, so
+# memory use does not grow with the length of the history.
+
+EXPORT_CHUNK_ROWS = 500
+
+
+def post_lines(user_id: int, image_url: Callable[[str], str]) -> Iterator[dict]:
+    tag_names = ArraySubquery(
+        Post.tags.through.objects.filter(post_id=OuterRef("pk"))
+        .order_by("tag__name")
+        .values("tag__name"),
+    )
+    rows = (
+        Post.objects.filter(author_id=user_id)
+        .annotate(tag_names=tag_names)
+        .order_by("created_at", "id")
+        .values_list(
+            "id",
+            "author__username",
+            "caption",
+            "created_at",
+            "image",
+            "tag_names",
+            "like_count",
+            "comment_count",
+        )
+    )
+    for (
+        post_id,
+        author,
+        caption,
+        created_at,
+        image,
+        tags,
+        like_count,
+        comment_count,
+    ) in rows.iterator(chunk_size=EXPORT_CHUNK_ROWS):
+        yield {
+            "type": "post",
+            "id": post_id,
+            "author": author,
+            "caption": caption,
+            "created_at": datetime_field.to_representation(created_at),
+            "image": image,
+            "image_url": image_url(image),
+            "tags": tags,
+            "like_count": like_count,
+            "comment_count": comment_count,
+        }
+
+
+def comment_lines(user_id: int) -> Iterator[dict]:
+    rows = (
+        Comment.objects.filter(author_id=user_id)
+        .order_by("created_at", "id")
+        .values_list("id", "post_id", "parent_id", "content", "created_at")
+    )
+    for comment_id, post_id, parent_id, content, created_at in rows.iterator(
+        chunk_size=EXPORT_CHUNK_ROWS,
+    ):
+        yield {
+            "type": "comment",
+            "id": comment_id,
+            "post": post_id,
+            "parent": parent_id,
+            "content": content,
+            "created_at": datetime_field.to_representation(created_at),
+        }
+
+
+def like_lines(user_id: int) -> Iterator[dict]:
+    rows = (
+        Like.objects.filter(user_id=user_id)
+        .order_by("created_at", "id")
+        .values_list("post_id", "created_at")
+    )
+    for post_id, created_at in rows.iterator(chunk_size=EXPORT_CHUNK_ROWS):
+        yield {
+            "type": "like",
+            "post": post_id,
+            "created_at": datetime_field.to_representation(created_at),
+        }
+
+
+def encode_lines(objects: Iterable[dict]) -> Iterator[bytes]:
+    renderer = FastJSONRenderer()
+    chunk = []
+    for data in objects:
+        chunk.append(renderer.render(data))
+        if len(chunk) == EXPORT_CHUNK_ROWS:
+            yield b"\n".join(chunk) + b"\n"
+            chunk = []
+    if chunk:
+        yield b"\n".join(chunk) + b"\n"
+
+
+def export_history(user_id: int, image_url: Callable[[str], str]) -> Iterator[bytes]:
+    # One query (and one server-side cursor) at a time, on the thread that
+    # iterates; see posts.concurrency.ThreadBoundStream for ASGI.
+    yield from encode_lines(post_lines(user_id, image_url))
+    yield from encode_lines(comment_lines(user_id))
+    yield from encode_lines(like_lines(user_id))
@@ -0,0 +1,218 @@
+import heapq
+from datetime import datetime, timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from users.models import Follow
+
+from .models import Post, TimelineEntry
+
+User = get_user_model()
+
+# last_login is written at most this often, so signing in stays one query.
+LAST_LOGIN_RESOLUTION = timedelta(days=1)
+
+
+def active_since() -> datetime:
+    # Followers who have not signed in since are left out of the fan-out;
+    # record_sign_in() refills their timeline when they come back.
+    return timezone.now() - timedelta(days=settings.FEED_ACTIVE_DAYS)
+
+
+def fan_out_post(post: Post) -> None:
+    # Copies the post into the timelines of the author and every recently
+    # active follower with a single INSERT ... SELECT. Celebrity posts are
+    # skipped and pulled in by timeline_post_ids() at read time instead.
+    if post.author.is_celebrity:
+        TimelineEntry.objects.bulk_create(
+            [TimelineEntry(user=post.author, post=post, created_at=post.created_at)],
+            ignore_conflicts=True,
+        )
+        return
+
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {qn(TimelineEntry._meta.db_table)} "  # noqa: S608, SLF001
+            "(user_id, post_id, created_at) "
+            "SELECT %s, %s, %s "
+            "UNION ALL "
+            f"SELECT f.follower_id, %s, %s FROM {qn(Follow._meta.db_table)} f "  # noqa: SLF001
+            f"JOIN {qn(User._meta.db_table)} u ON u.id = f.follower_id "  # noqa: SLF001
+            "WHERE f.followee_id = %s AND u.is_active AND u.last_login >= %s "
+            "ON CONFLICT (user_id, post_id) DO NOTHING",
+            [
+                post.author_id,
+                post.id,
+                connection.ops.adapt_datetimefield_value(post.created_at),
+                post.id,
+                connection.ops.adapt_datetimefield_value(post.created_at),
+                post.author_id,
+                connection.ops.adapt_datetimefield_value(active_since()),
+            ],
+        )
+
+
+def fan_out_posts(post_ids: list[int]) -> None:
+    # fan_out_post() for a batch of posts, e.g. an import, in one statement.
+    if not post_ids:
+        return
+    qn = connection.ops.quote_name
+    post_table = qn(Post._meta.db_table)  # noqa: SLF001
+    user_table = qn(User._meta.db_table)  # noqa: SLF001
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {qn(TimelineEntry._meta.db_table)} "  # noqa: S608, SLF001
+            "(user_id, post_id, created_at) "
+            f"SELECT p.author_id, p.id, p.created_at FROM {post_table} p "
+            "WHERE p.id = ANY(%s) "
+            "UNION ALL "
+            "SELECT f.follower_id, p.id, p.created_at "
+            f"FROM {post_table} p "
+            f"JOIN {user_table} a ON a.id = p.author_id "
+            f"JOIN {qn(Follow._meta.db_table)} f ON f.followee_id = a.id "  # noqa: SLF001
+            f"JOIN {user_table} u ON u.id = f.follower_id "
+            "WHERE p.id = ANY(%s) AND a.follower_count <= %s "
+            "AND u.is_active AND u.last_login >= %s "
+            "ON CONFLICT (user_id, post_id) DO NOTHING",
+            [
+                post_ids,
+                post_ids,
+                settings.FEED_CELEBRITY_FOLLOWERS,
+                connection.ops.adapt_datetimefield_value(active_since()),
+            ],
+        )
+
+
+def backfill_timeline(follower_id: int, followee: User) -> None:
+    if followee.is_celebrity:
+        return
+    recent = (
+        Post.objects.filter(author=followee)
+        .order_by("-created_at", "-id")
+        .values_list("id", "created_at")[: settings.FEED_BACKFILL_POSTS]
+    )
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user_id=follower_id, post_id=post_id, created_at=created_at)
+            for post_id, created_at in recent
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def backfill_former_celebrity(author_id: int) -> None:
+    # Called after the author lost a follower. Once they are back at
+    # FEED_CELEBRITY_FOLLOWERS, their posts are fanned out on write again
+    # instead of merged in on read, so their recent posts are copied into the
+    # timelines of their active followers.
+    if not User.objects.filter(
+        pk=author_id,
+        follower_count=settings.FEED_CELEBRITY_FOLLOWERS,
+    ).exists():
+        return
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {qn(TimelineEntry._meta.db_table)} "  # noqa: S608, SLF001
+            "(user_id, post_id, created_at) "
+            "SELECT f.follower_id, p.id, p.created_at "
+            f"FROM {qn(Follow._meta.db_table)} f "  # noqa: SLF001
+            f"JOIN {qn(User._meta.db_table)} u ON u.id = f.follower_id "  # noqa: SLF001
+            f"CROSS JOIN (SELECT id, created_at FROM {qn(Post._meta.db_table)} "  # noqa: SLF001
+            "WHERE author_id = %s ORDER BY created_at DESC, id DESC LIMIT %s) p "
+            "WHERE f.followee_id = %s AND u.is_active AND u.last_login >= %s "
+            "ON CONFLICT (user_id, post_id) DO NOTHING",
+            [
+                author_id,
+                settings.FEED_BACKFILL_POSTS,
+                author_id,
+                connection.ops.adapt_datetimefield_value(active_since()),
+            ],
+        )
+
+
+def refill_timeline(user_id: int) -> None:
+    # The recent posts of every non-celebrity author the user follows, as
+    # backfill_timeline() copies them on a follow, in one statement.
+    qn = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {qn(TimelineEntry._meta.db_table)} "  # noqa: S608, SLF001
+            "(user_id, post_id, created_at) "
+            "SELECT f.follower_id, p.id, p.created_at "
+            f"FROM {qn(Follow._meta.db_table)} f "  # noqa: SLF001
+            f"JOIN {qn(User._meta.db_table)} a ON a.id = f.followee_id "  # noqa: SLF001
+            f"CROSS JOIN LATERAL (SELECT id, created_at FROM {qn(Post._meta.db_table)} "  # noqa: SLF001
+            "WHERE author_id = f.followee_id "
+            "ORDER BY created_at DESC, id DESC LIMIT %s) p "
+            "WHERE f.follower_id = %s AND a.follower_count <= %s "
+            "ON CONFLICT (user_id, post_id) DO NOTHING",
+            [
+                settings.FEED_BACKFILL_POSTS,
+                user_id,
+                settings.FEED_CELEBRITY_FOLLOWERS,
+            ],
+        )
+
+
+def record_sign_in(user: User) -> None:
+    # Marks the user as active for fan_out_post(). A user returning after
+    # FEED_ACTIVE_DAYS missed the fan-out meanwhile, so their timeline is
+    # refilled from the authors they follow.
+    now = timezone.now()
+    last_login = user.last_login
+    if last_login is not None and last_login > now - LAST_LOGIN_RESOLUTION:
+        return
+    # update() instead of save(): no signals, so the user's tokens stay valid.
+    User.objects.filter(pk=user.pk).update(last_login=now)
+    user.last_login = now
+    if last_login is None or last_login < active_since():
+        refill_timeline(user.pk)
+
+
+def drop_from_timeline(follower_id: int, followee_id: int) -> None:
+    TimelineEntry.objects.filter(
+        user_id=follower_id,
+        post__author_id=followee_id,
+    ).delete()
+
+
+def seek_filter(position: list | None, id_field: str) -> Q:
+    if position is None:
+        return Q()
+    created_at, pk = position
+    return Q(created_at__lt=created_at) | Q(
+        created_at=created_at,
+        **{f"{id_field}__lt": pk},
+    )
+
+
+def timeline_post_ids(user_id: int, position: list | None, limit: int) -> list[int]:
+    # One range scan over the materialized timeline, merged with the newest
+    # posts of followed celebrities, newest first.
+    materialized = (
+        TimelineEntry.objects.filter(user_id=user_id)
+        .filter(seek_filter(position, "post_id"))
+        .order_by("-created_at", "-post_id")
+        .values_list("created_at", "post_id")[:limit]
+    )
+    celebrities = Follow.objects.filter(
+        follower_id=user_id,
+        followee__follower_count__gt=settings.FEED_CELEBRITY_FOLLOWERS,
+    ).values("followee_id")
+    pulled = (
+        Post.objects.filter(author__in=celebrities)
+        .filter(seek_filter(position, "id"))
+        .order_by("-created_at", "-id")
+        .values_list("created_at", "id")[:limit]
+    )
+
+    merged = heapq.merge(materialized, pulled, reverse=True)
+    post_ids = dict.fromkeys(post_id for _, post_id in merged)
+    return list(islice(post_ids, limit))
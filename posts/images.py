@@ -0,0 +1,149 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps, features
+
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+_executor: ThreadPoolExecutor | None = None
+
+
+def variant_format() -> str:
+    if settings.POST_IMAGE_FORMAT == "WEBP" and not features.check("webp"):
+        return "JPEG"
+    return settings.POST_IMAGE_FORMAT
+
+
+def render_variant(
+    image: Image.Image,
+    max_side: int,
+    image_format: str,
+) -> tuple[bytes, tuple[int, int]]:
+    variant = image.copy()
+    variant.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+
+    # Only pixel data is written back out, so EXIF (GPS position, camera
+    # serial numbers) never reaches the variants.
+    buffer = BytesIO()
+    variant.save(
+        buffer,
+        format=image_format,
+        quality=settings.POST_IMAGE_QUALITY,
+        optimize=True,
+    )
+    return buffer.getvalue(), variant.size
+
+
+def variant_name(image_name: str, variant: str, extension: str) -> str:
+    # Variants sit next to their original and share its (content hash) stem,
+    # so every post that reuses the same bytes reuses the same variants. They
+    # are served as immutable, so a stored variant is never rewritten: new
+    # POST_IMAGE_VARIANTS sizes or quality only apply to new images.
+    path = PurePosixPath(image_name)
+    return str(path.parent / f"{path.stem}_{variant}.{extension}")
+
+
+def stored_variant(path: str) -> tuple[int, int] | None:
+    # The size of a variant already in storage, or None if there is none
+    # that can be read.
+    if not default_storage.exists(path):
+        return None
+    try:
+        with default_storage.open(path) as file, Image.open(file) as variant:
+            return variant.size
+    except (OSError, Image.DecompressionBombError):
+        return None
+
+
+def update_image_state(post_id: int, **fields: object) -> None:
+    Post.objects.filter(pk=post_id).update(**fields)
+
+
+def process_post_image(post_id: int) -> None:
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None:
+        # Deleted before its turn came.
+        return
+    image_format = variant_format()
+    extension = image_format.lower().replace("jpeg", "jpg")
+
+    processed = (
+        Post.objects.filter(image=post.image.name, image_status=Post.ImageStatus.READY)
+        .exclude(pk=post_id)
+        .values("image_width", "image_height", "image_variants")
+        .first()
+    )
+    if processed is not None:
+        update_image_state(
+            post_id,
+            **processed,
+            image_status=Post.ImageStatus.READY,
+        )
+        return
+
+    try:
+        with post.image.open("rb"), Image.open(post.image) as original:
+            width, height = original.size
+            image = ImageOps.exif_transpose(original)
+            image = image.convert("RGBA" if image_format == "WEBP" else "RGB")
+
+            variants = {}
+            for name, max_side in settings.POST_IMAGE_VARIANTS.items():
+                path = variant_name(post.image.name, name, extension)
+                size = stored_variant(path)
+                if size is None:
+                    content, size = render_variant(image, max_side, image_format)
+                    path = default_storage.save(path, ContentFile(content))
+                variant_width, variant_height = size
+                variants[name] = {
+                    "name": path,
+                    "width": variant_width,
+                    "height": variant_height,
+                }
+    except (OSError, Image.DecompressionBombError):
+        logger.exception("Could not process image of post %s", post_id)
+        update_image_state(post_id, image_status=Post.ImageStatus.FAILED)
+        return
+
+    update_image_state(
+        post_id,
+        image_width=width,
+        image_height=height,
+        image_variants=variants,
+        image_status=Post.ImageStatus.READY,
+    )
+
+
+def _process_in_worker(post_id: int) -> None:
+    close_old_connections()
+    try:
+        process_post_image(post_id)
+    except Exception:
+        logger.exception("Image worker crashed on post %s", post_id)
+    finally:
+        close_old_connections()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor  # noqa: PLW0603
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.POST_IMAGE_WORKERS,
+            thread_name_prefix="post-images",
+        )
+    return _executor
+
+
+def schedule_post_image(post_id: int) -> None:
+    # Runs after commit so the worker never sees a post that was rolled back.
+    # Posts left pending by a restart are picked up by the
+    # ``process_post_images`` management command.
+    transaction.on_commit(lambda: get_executor().submit(_process_in_worker, post_id))
@@ -0,0 +1,450 @@
+import json
+import math
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from argparse import ArgumentParser
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client, override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from PIL import Image
+
+from posts.models import Like, Post
+from users.tokens import ClaimsRefreshToken
+
+from .generate_benchmark_data import PASSWORD
+
+User = get_user_model()
+
+SCENARIOS = ("feed_scroll", "like_storm", "upload_burst", "login_storm")
+DEFAULT_BASELINE = settings.BASE_DIR / "benchmarks" / "baseline.json"
+# Written by RequestMetricsMiddleware into the Server-Timing header.
+QUERIES = re.compile(r'desc="(\d+) queries"')
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+# One timed request: (label, status, seconds, queries or None).
+Sample = tuple[str, int, float, int | None]
+
+
+def percentile(ordered: list[float], percent: int) -> float:
+    # Nearest rank, so a handful of samples still gives a real latency.
+    return ordered[max(math.ceil(len(ordered) * percent / 100), 1) - 1]
+
+
+def summarize(samples: list[Sample], elapsed: float) -> dict[str, dict]:
+    by_label: defaultdict[str, list[Sample]] = defaultdict(list)
+    for sample in samples:
+        by_label[sample[0]].append(sample)
+
+    summary = {}
+    for label, group in sorted(by_label.items()):
+        latencies = sorted(seconds * 1000 for _, _, seconds, _ in group)
+        queries = [count for _, _, _, count in group if count is not None]
+        statuses = Counter(str(status) for _, status, _, _ in group)
+        summary[label] = {
+            "requests": len(group),
+            "requests_per_second": round(len(group) / elapsed, 1),
+            "p50_ms": round(percentile(latencies, 50), 1),
+            "p95_ms": round(percentile(latencies, 95), 1),
+            "p99_ms": round(percentile(latencies, 99), 1),
+            "queries_per_request": (
+                round(sum(queries) / len(queries), 2) if queries else None
+            ),
+            "max_queries": max(queries, default=None),
+            "statuses": dict(sorted(statuses.items())),
+        }
+    return summary
+
+
+def regressions(
+    baseline: dict[str, dict],
+    results: dict[str, dict],
+    tolerance: float,
+) -> list[str]:
+    # Query counts are deterministic and compared exactly; latency varies
+    # from run to run and may grow by ``tolerance`` before it counts.
+    found = []
+    for scenario, labels in results.items():
+        for label, result in labels.items():
+            name = f"{scenario} {label}"
+            if any(status.startswith("5") for status in result["statuses"]):
+                found.append(f"{name}: server errors {result['statuses']}")
+            before = baseline.get(scenario, {}).get(label)
+            if before is None:
+                continue
+            if (result["max_queries"] or 0) > (before["max_queries"] or 0):
+                found.append(
+                    f"{name}: up to {result['max_queries']} queries per request, "
+                    f"baseline {before['max_queries']}",
+                )
+            if result["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+                found.append(
+                    f"{name}: p95 {result['p95_ms']} ms, "
+                    f"baseline {before['p95_ms']} ms",
+                )
+    return found
+
+
+def png_upload(rgb: int) -> SimpleUploadedFile:
+    # A random color per upload, so content-addressed storage cannot
+    # deduplicate the burst (or a rerun of it) into files it already has.
+    buffer = BytesIO()
+    color = (rgb & 0xFF, (rgb >> 8) & 0xFF, (rgb >> 16) & 0xFF)
+    Image.new("RGB", (640, 480), color).save(buffer, "PNG")
+    return SimpleUploadedFile(f"burst{rgb}.png", buffer.getvalue(), "image/png")
+
+
+class InProcessTransport:
+    # Requests go through the full middleware stack in this process, on a
+    # test client per thread; each thread keeps its own connections.
+    def __init__(self) -> None:
+        self.local = threading.local()
+
+    def __call__(
+        self,
+        method: str,
+        path: str,
+        body: bytes,
+        headers: dict[str, str],
+    ) -> tuple[int, str, bytes]:
+        if not hasattr(self.local, "client"):
+            self.local.client = Client()
+        content_type = headers.pop("Content-Type", "application/octet-stream")
+        response = self.local.client.generic(
+            method,
+            path,
+            body,
+            content_type,
+            headers=headers,
+        )
+        return (
+            response.status_code,
+            response.headers.get("Server-Timing", ""),
+            response.content,
+        )
+
+    @staticmethod
+    def finish_thread() -> None:
+        connections.close_all()
+
+
+class HTTPTransport:
+    def __init__(self, base_url: str) -> None:
+        self.base_url = base_url.rstrip("/")
+
+    def __call__(
+        self,
+        method: str,
+        path: str,
+        body: bytes,
+        headers: dict[str, str],
+    ) -> tuple[int, str, bytes]:
+        request = urllib.request.Request(  # noqa: S310
+            self.base_url + path,
+            data=body or None,
+            headers=headers,
+            method=method,
+        )
+        try:
+            with urllib.request.urlopen(request) as response:  # noqa: S310
+                return (
+                    response.status,
+                    response.headers.get("Server-Timing", ""),
+                    response.read(),
+                )
+        except urllib.error.HTTPError as exc:
+            return exc.code, exc.headers.get("Server-Timing", ""), exc.read()
+        except OSError:
+            return 0, "", b""
+
+    @staticmethod
+    def finish_thread() -> None:
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Run scripted API scenarios (feed_scroll, like_storm, upload_burst, "
+        "login_storm) as the users of ``manage.py generate_benchmark_data`` "
+        "and report latency percentiles and SQL queries per request. Runs "
+        "in-process unless --url points at a server. --save writes a "
+        "baseline JSON to commit; --compare fails on regressions against it."
+    )
+
+    def add_arguments(self, parser: ArgumentParser) -> None:
+        parser.add_argument(
+            "scenarios",
+            nargs="*",
+            help=f"Scenarios to run: {', '.join(SCENARIOS)}. All by default.",
+        )
+        parser.add_argument(
+            "--url",
+            help="Base URL of a running server, e.g. http://127.0.0.1:8000.",
+        )
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=200,
+            help="Sessions per scenario. A feed_scroll session reads --pages pages.",
+        )
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--pages", type=int, default=5)
+        parser.add_argument(
+            "--users",
+            type=int,
+            default=200,
+            help="Generated users to act as, in turn.",
+        )
+        parser.add_argument("--prefix", default="bench")
+        parser.add_argument(
+            "--save",
+            nargs="?",
+            type=Path,
+            const=DEFAULT_BASELINE,
+            help=f"Write the results as the baseline (default {DEFAULT_BASELINE}).",
+        )
+        parser.add_argument(
+            "--compare",
+            nargs="?",
+            type=Path,
+            const=DEFAULT_BASELINE,
+            help="Fail if the results regress from this baseline.",
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.25,
+            help="Allowed p95 latency growth over the baseline, as a fraction.",
+        )
+
+    def handle(self, *args: str, **options: object) -> None:  # noqa: ARG002
+        unknown = set(options["scenarios"]) - set(SCENARIOS)
+        if unknown:
+            msg = f"Unknown scenario(s): {', '.join(sorted(unknown))}."
+            raise CommandError(msg)
+
+        users = list(
+            User.objects.filter(
+                username__startswith=options["prefix"],
+                is_active=True,
+            ).order_by("pk")[: options["users"]],
+        )
+        if not users:
+            msg = (
+                f"No users named {options['prefix']}*; "
+                "run manage.py generate_benchmark_data first."
+            )
+            raise CommandError(msg)
+
+        self.users = users
+        self.prefix = options["prefix"]
+        self.tokens = [
+            str(ClaimsRefreshToken.for_user(user).access_token) for user in users
+        ]
+        # The newest posts draw the likes, as in generate_benchmark_data;
+        # like_storm goes through the (user, post) pairs not liked yet.
+        hot_post_ids = list(
+            Post.objects.filter(author__username__startswith=options["prefix"])
+            .order_by("-created_at", "-id")
+            .values_list("id", flat=True)[:10],
+        )
+        liked = set(
+            Like.objects.filter(post__in=hot_post_ids, user__in=users).values_list(
+                "user_id",
+                "post_id",
+            ),
+        )
+        self.unliked = [
+            (index, post_id)
+            for index, user in enumerate(users)
+            for post_id in hot_post_ids
+            if (user.pk, post_id) not in liked
+        ]
+        self.pages = options["pages"]
+        self.transport = (
+            HTTPTransport(options["url"]) if options["url"] else InProcessTransport()
+        )
+
+        # In process, every request is measured and reports its query count,
+        # and the test client's host is allowed as under the test runner.
+        with override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"],
+            REQUEST_METRICS_SAMPLE_RATE=1,
+            REQUEST_METRICS_SERVER_TIMING=True,
+        ):
+            results = {
+                scenario: self.run(scenario, options)
+                for scenario in options["scenarios"] or SCENARIOS
+            }
+
+        # Latencies only compare between runs of the same shape.
+        run = {
+            "server": options["url"] or "in-process",
+            **{key: options[key] for key in ("iterations", "concurrency", "pages")},
+        }
+        if options["compare"]:
+            self.compare(options["compare"], run, results, options["tolerance"])
+        if options["save"]:
+            options["save"].parent.mkdir(parents=True, exist_ok=True)
+            options["save"].write_text(
+                json.dumps({"run": run, "scenarios": results}, indent=2) + "\n",
+            )
+            self.stdout.write(
+                self.style.SUCCESS(f"Baseline written to {options['save']}."),
+            )
+
+    def run(self, scenario: str, options: dict) -> dict[str, dict]:
+        session = getattr(self, scenario)
+        self.samples: list[Sample] = []
+        indices = iter(range(options["iterations"]))
+        lock = threading.Lock()
+
+        def worker() -> None:
+            try:
+                while True:
+                    with lock:
+                        index = next(indices, None)
+                    if index is None:
+                        return
+                    session(index)
+            finally:
+                self.transport.finish_thread()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+            workers = [executor.submit(worker) for _ in range(options["concurrency"])]
+            for future in workers:
+                future.result()
+        summary = summarize(self.samples, time.perf_counter() - start)
+
+        for label, result in summary.items():
+            queries = (
+                "no query counts"
+                if result["queries_per_request"] is None
+                else f"{result['queries_per_request']} queries/request "
+                f"(max {result['max_queries']})"
+            )
+            self.stdout.write(
+                f"{scenario} {label}: {result['requests']} request(s), "
+                f"{result['requests_per_second']} req/s, "
+                f"p50 {result['p50_ms']} ms, p95 {result['p95_ms']} ms, "
+                f"p99 {result['p99_ms']} ms, {queries}, status "
+                + ", ".join(f"{code}: {n}" for code, n in result["statuses"].items()),
+            )
+        return summary
+
+    def compare(self, path: Path, run: dict, results: dict, tolerance: float) -> None:
+        try:
+            baseline = json.loads(path.read_text())
+        except (OSError, ValueError) as exc:
+            msg = f"Cannot read baseline {path}: {exc}"
+            raise CommandError(msg) from exc
+        if baseline["run"] != run:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"The baseline ran with {baseline['run']}, this run with {run}.",
+                ),
+            )
+        found = regressions(baseline["scenarios"], results, tolerance)
+        if found:
+            msg = "Regressions against the baseline:\n" + "\n".join(found)
+            raise CommandError(msg)
+        self.stdout.write(self.style.SUCCESS(f"No regressions against {path}."))
+
+    def auth(self, index: int) -> dict[str, str]:
+        return {"Authorization": f"Bearer {self.tokens[index % len(self.tokens)]}"}
+
+    def send(
+        self,
+        label: str,
+        path: str,
+        headers: dict[str, str],
+        body: bytes = b"",
+    ) -> tuple[int, object]:
+        # ``label`` starts with the HTTP method, e.g. "POST like".
+        start = time.perf_counter()
+        status, server_timing, content = self.transport(
+            label.partition(" ")[0],
+            path,
+            body,
+            dict(headers),
+        )
+        seconds = time.perf_counter() - start
+        match = QUERIES.search(server_timing)
+        self.samples.append((label, status, seconds, int(match[1]) if match else None))
+        try:
+            return status, json.loads(content) if content else None
+        except ValueError:
+            return status, None
+
+    def feed_scroll(self, index: int) -> None:
+        # Opens the home timeline and follows its cursor down.
+        path = "/api/feed/"
+        for _ in range(self.pages):
+            status, page = self.send("GET feed", path, self.auth(index))
+            if status != 200 or not page.get("next"):  # noqa: PLR2004
+                return
+            url = urlsplit(page["next"])
+            path = f"{url.path}?{url.query}"
+
+    def like_storm(self, index: int) -> None:
+        # Everyone likes the same few posts at once, then takes it back so
+        # the next run starts from the same data.
+        if not self.unliked:
+            return
+        user_index, post_id = self.unliked[index % len(self.unliked)]
+        status, like = self.send(
+            "POST like",
+            "/api/likes/",
+            {**self.auth(user_index), **JSON_HEADERS},
+            json.dumps({"post": post_id}).encode(),
+        )
+        if status == 201:  # noqa: PLR2004
+            self.send(
+                "DELETE like",
+                f"/api/likes/{like['id']}/",
+                self.auth(user_index),
+            )
+
+    def upload_burst(self, index: int) -> None:
+        data = {
+            "caption": f"Burst upload {index}",
+            "image": png_upload(random.getrandbits(24)),
+            "tag_names": [f"{self.prefix}burst"],
+        }
+        status, post = self.send(
+            "POST post",
+            "/api/posts/",
+            {**self.auth(index), "Content-Type": MULTIPART_CONTENT},
+            encode_multipart(BOUNDARY, data),
+        )
+        if status == 201:  # noqa: PLR2004
+            self.send("DELETE post", f"/api/posts/{post['id']}/", self.auth(index))
+
+    def login_storm(self, index: int) -> None:
+        # A distinct client address per sign-in, so the per-IP throttle
+        # does not cut the storm short; DRF reads it from X-Forwarded-For.
+        user = self.users[index % len(self.users)]
+        self.send(
+            "POST token",
+            "/api/token/",
+            {
+                "X-Forwarded-For": ".".join(map(str, (10, *index.to_bytes(3)))),
+                **JSON_HEADERS,
+            },
+            json.dumps({"username": user.username, "password": PASSWORD}).encode(),
+        )
@@ -0,0 +1,123 @@
+import copy
+import statistics
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from importlib.util import find_spec
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure what database connection handling adds to request latency: "
+        "simulated requests run a few queries on a new connection each "
+        "(DB_CONN_MAX_AGE=0), on a persistent connection per thread that is "
+        "health-checked per request, and on connections borrowed from a "
+        "psycopg pool (DB_POOL_MAX_SIZE)."
+    )
+
+    def add_arguments(self, parser: ArgumentParser) -> None:
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=500,
+            help="Simulated requests per mode.",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=8,
+            help="Simulated request threads; also the size of the pool.",
+        )
+        parser.add_argument(
+            "--queries",
+            type=int,
+            default=3,
+            help="Queries per request.",
+        )
+
+    def handle(self, *args: str, **options: int) -> None:  # noqa: ARG002
+        default = connections["default"].settings_dict
+        self.stdout.write(
+            f"{options['requests']} request(s) of {options['queries']} "
+            f"query(ies), {options['concurrency']} thread(s), "
+            f"{default['HOST'] or 'local socket'}:{default['PORT'] or 'default'}",
+        )
+
+        # Persistent and pooled connections are checked before reuse.
+        modes = {
+            "connect": {"CONN_MAX_AGE": 0},
+            "persistent": {"CONN_MAX_AGE": None, "CONN_HEALTH_CHECKS": True},
+        }
+        if find_spec("psycopg_pool") is None:
+            self.stderr.write(
+                self.style.WARNING(
+                    "psycopg_pool is not installed; skipping the pooled mode.",
+                ),
+            )
+        else:
+            modes["pooled"] = {
+                "CONN_MAX_AGE": 0,
+                "CONN_HEALTH_CHECKS": True,
+                "pool": {
+                    "min_size": options["concurrency"],
+                    "max_size": options["concurrency"],
+                },
+            }
+        for label, overrides in modes.items():
+            settings_dict = copy.deepcopy(default)
+            settings_dict["OPTIONS"].pop("pool", None)
+            if "pool" in overrides:
+                settings_dict["OPTIONS"]["pool"] = overrides.pop("pool")
+            settings_dict.update(overrides)
+            self.run(label, settings_dict, options)
+
+    def run(self, label: str, settings_dict: dict, options: dict) -> None:
+        # A connection alias of its own per mode: Django then keeps one
+        # wrapper per thread, as for request threads, and the pooled mode
+        # gets a pool of its own.
+        alias = f"benchmark_{label}"
+        connections.settings[alias] = settings_dict
+        wrappers = []
+
+        def request() -> float:
+            connection = connections[alias]
+            if connection not in wrappers:
+                wrappers.append(connection)
+            start = time.perf_counter()
+            # What the request_started and request_finished signals do.
+            connection.close_if_unusable_or_obsolete()
+            with connection.cursor() as cursor:
+                for _ in range(options["queries"]):
+                    cursor.execute("SELECT 1")
+                    cursor.fetchone()
+            connection.close_if_unusable_or_obsolete()
+            return time.perf_counter() - start
+
+        owner = connections[alias]
+        try:
+            if owner.pool is not None:
+                # Fill the pool outside the measurement.
+                owner.pool.open(wait=True)
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+                latencies = sorted(
+                    executor.map(lambda _: request(), range(options["requests"])),
+                )
+            elapsed = time.perf_counter() - start
+        finally:
+            for wrapper in wrappers:
+                # The owning thread is gone; let this one close it.
+                wrapper.inc_thread_sharing()
+                wrapper.close()
+            owner.close_pool()
+            del connections[alias]
+            del connections.settings[alias]
+
+        p50, p95 = (statistics.quantiles(latencies, n=100)[index] for index in (49, 94))
+        self.stdout.write(
+            f"{label}: {options['requests'] / elapsed:.1f} requests/s, "
+            f"p50 {p50 * 1000:.2f} ms, p95 {p95 * 1000:.2f} ms",
+        )
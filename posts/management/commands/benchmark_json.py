@@ -0,0 +1,132 @@
+import timeit
+from argparse import ArgumentParser
+from collections.abc import Callable
+from datetime import UTC, datetime, timedelta
+from io import BytesIO
+
+from django.core.management.base import BaseCommand
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from posts import renderers
+from posts.parsers import FastJSONParser
+from posts.renderers import FastJSONRenderer
+
+
+def feed_page(size: int) -> dict:
+    # Shaped like a PostFeedPagination page of PostSerializer output.
+    now = datetime.now(tz=UTC)
+    results = []
+    for index in range(size):
+        created_at = (now - timedelta(minutes=index)).isoformat()
+        results.append(
+            {
+                "id": 100_000 - index,
+                "image": f"https://example.com/media/posts/ab/cd/{index:064x}.jpg",
+                "image_status": "ready",
+                "image_width": 4032,
+                "image_height": 3024,
+                "image_variants": {
+                    name: {
+                        "url": (
+                            "https://example.com/media/posts/ab/cd/"
+                            f"{index:064x}_{name}.webp"
+                        ),
+                        "width": side,
+                        "height": side * 3 // 4,
+                    }
+                    for name, side in (
+                        ("thumbnail", 320),
+                        ("feed", 1080),
+                        ("full", 2048),
+                    )
+                },
+                "caption": f"Sunset over the lake, day {index} of the trip ✨",
+                "created_at": created_at,
+                "author": index % 500,
+                "tags": [{"id": tag, "name": f"tag{tag}"} for tag in range(index % 5)],
+                "like_count": index * 7,
+                "comment_count": index * 3,
+                "liked_by_me": bool(index % 2),
+                "recent_comments": [
+                    {
+                        "id": index * 10 + comment,
+                        "post": 100_000 - index,
+                        "content": f"Comment {comment} on post {index}",
+                        "created_at": created_at,
+                        "author": comment,
+                    }
+                    for comment in range(3)
+                ],
+            },
+        )
+    return {
+        "count": size * 100,
+        "next": "https://example.com/api/posts/?page=2",
+        "previous": None,
+        "results": results,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the stock DRF JSON renderer and parser with the orjson "
+        "backed ones on a synthetic feed page."
+    )
+
+    def add_arguments(self, parser: ArgumentParser) -> None:
+        parser.add_argument(
+            "--page-size",
+            type=int,
+            default=100,
+            help="Number of posts on the rendered page.",
+        )
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=200,
+            help="Renders and parses timed per implementation.",
+        )
+
+    def handle(self, *args: str, **options: int) -> None:  # noqa: ARG002
+        if renderers.orjson is None:
+            self.stderr.write(
+                self.style.WARNING(
+                    "orjson is not installed; both sides use the stdlib encoder.",
+                ),
+            )
+
+        page = feed_page(options["page_size"])
+        body = JSONRenderer().render(page)
+        self.stdout.write(
+            f"Page of {options['page_size']} post(s), {len(body)} bytes, "
+            f"{options['iterations']} iteration(s)",
+        )
+
+        self.compare(
+            "render",
+            lambda: JSONRenderer().render(page),
+            lambda: FastJSONRenderer().render(page),
+            options["iterations"],
+        )
+        self.compare(
+            "parse",
+            lambda: JSONParser().parse(BytesIO(body)),
+            lambda: FastJSONParser().parse(BytesIO(body)),
+            options["iterations"],
+        )
+
+    def compare(
+        self,
+        label: str,
+        stock: Callable[[], object],
+        fast: Callable[[], object],
+        iterations: int,
+    ) -> None:
+        stock_seconds = min(timeit.repeat(stock, number=iterations, repeat=3))
+        fast_seconds = min(timeit.repeat(fast, number=iterations, repeat=3))
+        self.stdout.write(
+            f"{label}: stock {stock_seconds / iterations * 1000:.3f} ms, "
+            f"fast {fast_seconds / iterations * 1000:.3f} ms, "
+            f"speedup {stock_seconds / fast_seconds:.1f}x",
+        )
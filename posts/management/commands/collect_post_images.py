@@ -0,0 +1,120 @@
+import re
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from posts.images import variant_name
+from posts.models import ImageBlob, Post
+
+HASHED_NAME = re.compile(r"[0-9a-f]{64}")
+SHARD_NAME = re.compile(r"[0-9a-f]{2}")
+# Variants are WebP, or JPEG where Pillow was built without WebP support.
+VARIANT_EXTENSIONS = ("webp", "jpg")
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete stored post images that no post references any more, "
+        "together with their resized variants."
+    )
+
+    def add_arguments(self, parser: ArgumentParser) -> None:
+        parser.add_argument(
+            "--grace-hours",
+            type=float,
+            default=24,
+            help="Only collect files unreferenced for at least this long.",
+        )
+        parser.add_argument(
+            "--scan",
+            action="store_true",
+            help=(
+                "Also walk the storage for hashed files without an ImageBlob "
+                "row, e.g. left behind by rolled-back uploads."
+            ),
+        )
+
+    def handle(self, *args: str, **options: float | bool) -> None:  # noqa: ARG002
+        self.storage = Post._meta.get_field("image").storage  # noqa: SLF001
+        cutoff = timezone.now() - timedelta(hours=options["grace_hours"])
+
+        collected = self.collect_unreferenced(cutoff)
+        if options["scan"]:
+            collected += self.collect_untracked(cutoff)
+
+        self.stdout.write(self.style.SUCCESS(f"Collected {collected} image(s)."))
+
+    def collect_unreferenced(self, cutoff: datetime) -> int:
+        collected = 0
+        candidates = ImageBlob.objects.filter(
+            ref_count__lte=0,
+            updated_at__lt=cutoff,
+        ).values_list("pk", flat=True)
+        for pk in candidates.iterator():
+            with transaction.atomic():
+                # Saving the same bytes again moves updated_at; see
+                # ContentAddressedStorage.
+                blob = (
+                    ImageBlob.objects.select_for_update()
+                    .filter(pk=pk, ref_count__lte=0, updated_at__lt=cutoff)
+                    .first()
+                )
+                if blob is None:
+                    continue
+                references = Post.objects.filter(image=blob.name).count()
+                if references:
+                    blob.ref_count = references
+                    blob.save(update_fields=["ref_count"])
+                    continue
+                self.delete_with_variants(blob.name)
+                blob.delete()
+            collected += 1
+        return collected
+
+    def collect_untracked(self, cutoff: datetime) -> int:
+        collected = 0
+        for directory in self.hashed_directories():
+            _, files = self.storage.listdir(directory)
+            originals = {
+                f"{directory}/{name}"
+                for name in files
+                if HASHED_NAME.fullmatch(PurePosixPath(name).stem)
+            }
+            tracked = set(
+                ImageBlob.objects.filter(name__in=originals).values_list(
+                    "name",
+                    flat=True,
+                ),
+            )
+            for name in originals - tracked:
+                if self.storage.get_modified_time(name) < cutoff:
+                    self.delete_with_variants(name)
+                    collected += 1
+        return collected
+
+    def hashed_directories(self) -> list[str]:
+        if not self.storage.exists("posts"):
+            return []
+        directories = []
+        shards, _ = self.storage.listdir("posts")
+        for shard in filter(SHARD_NAME.fullmatch, shards):
+            subshards, _ = self.storage.listdir(f"posts/{shard}")
+            directories.extend(
+                f"posts/{shard}/{subshard}"
+                for subshard in filter(SHARD_NAME.fullmatch, subshards)
+            )
+        return directories
+
+    def delete_with_variants(self, name: str) -> None:
+        self.storage.delete(name)
+        # Only the exact variant names: legacy uploads renamed on collision
+        # (photo_AbC1234.png) share the stem but are originals of their own.
+        for variant in settings.POST_IMAGE_VARIANTS:
+            for extension in VARIANT_EXTENSIONS:
+                default_storage.delete(variant_name(name, variant, extension))
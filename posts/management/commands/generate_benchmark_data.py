@@ -0,0 +1,344 @@
+import random
+import time
+from argparse import ArgumentParser
+from collections import Counter
+from collections.abc import Callable, Iterator
+from datetime import timedelta
+from itertools import accumulate, islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import (
+    Count,
+    DateTimeField,
+    ExpressionWrapper,
+    F,
+    IntegerField,
+    OuterRef,
+    Subquery,
+    Value,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from posts.models import (
+    Comment,
+    ImageBlob,
+    Like,
+    Post,
+    Tag,
+    TagUsage,
+    TimelineEntry,
+)
+from users.models import Follow
+
+User = get_user_model()
+
+# Every generated user signs in with this password; it is hashed once.
+PASSWORD = "benchmark-password"
+IMAGE_NAME = "posts/benchmark.webp"
+REPLY_SHARE = 0.3
+
+
+def batched(items: Iterator, size: int) -> Iterator[list]:
+    while batch := list(islice(items, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-generate users, follows, tags, posts, comments and likes for "
+        "``manage.py benchmark_api``. Popularity is skewed like real traffic: "
+        "a few users and posts get most of the follows, likes and comments."
+    )
+
+    def add_arguments(self, parser: ArgumentParser) -> None:
+        parser.add_argument("--users", type=int, default=10_000)
+        parser.add_argument(
+            "--follows",
+            type=int,
+            default=20,
+            help="Users followed by each generated user.",
+        )
+        parser.add_argument("--tags", type=int, default=1000)
+        parser.add_argument("--posts", type=int, default=100_000)
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=90,
+            help="Posts are spread evenly over this many days up to now.",
+        )
+        parser.add_argument("--comments", type=int, default=300_000)
+        parser.add_argument("--likes", type=int, default=500_000)
+        parser.add_argument(
+            "--prefix",
+            default="bench",
+            help="Prefix of the generated usernames and tag names.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Rows per INSERT statement.",
+        )
+
+    def handle(self, *args: str, **options: int | str) -> None:  # noqa: ARG002
+        prefix = options["prefix"]
+        if (
+            User.objects.filter(username__startswith=prefix).exists()
+            or Tag.objects.filter(name__startswith=prefix).exists()
+        ):
+            msg = f"Users or tags named {prefix}* exist already; pass another --prefix."
+            raise CommandError(msg)
+
+        self.rng = random.Random(options["seed"])  # noqa: S311
+        self.batch_size = options["batch_size"]
+
+        # Every step commits on its own, so no transaction holds the whole
+        # data set. A failed run leaves its rows behind; repeat it with
+        # another --prefix.
+        user_ids = self.step("users", self.create_users, options)
+        self.step("follows", self.create_follows, user_ids, options)
+        tag_ids = self.step("tags", self.create_tags, options)
+        post_ids = self.step("posts", self.create_posts, user_ids, tag_ids, options)
+        self.step("comments", self.create_comments, user_ids, post_ids, options)
+        self.step("likes", self.create_likes, user_ids, post_ids, options)
+        self.step("timelines", self.fill_timelines, user_ids)
+        self.step(
+            "counters",
+            call_command,
+            "reconcile_post_counters",
+            stdout=self.stdout,
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Generated {len(user_ids)} user(s) named {prefix}*, "
+                f"password {PASSWORD!r}.",
+            ),
+        )
+
+    def step(
+        self,
+        label: str,
+        run: Callable,
+        *args: object,
+        **kwargs: object,
+    ) -> object:
+        start = time.perf_counter()
+        with transaction.atomic():
+            result = run(*args, **kwargs)
+        count = f" {len(result)}" if isinstance(result, list) else ""
+        self.stdout.write(
+            f"{label}:{count} in {time.perf_counter() - start:.1f} s",
+        )
+        return result
+
+    def skewed(self, ids: list[int]) -> Callable[[int], list[int]]:
+        # Zipf-like: the n-th ID is picked with weight 1 / n.
+        cum_weights = list(accumulate(1 / rank for rank in range(1, len(ids) + 1)))
+        return lambda k: self.rng.choices(ids, cum_weights=cum_weights, k=k)
+
+    def bulk_create(self, model: type, rows: Iterator, **kwargs: object) -> list[int]:
+        # Returns the primary keys only; the instances of a batch are dropped
+        # once it is inserted. With ignore_conflicts there are none.
+        pks = []
+        for batch in batched(rows, self.batch_size):
+            pks.extend(obj.pk for obj in model.objects.bulk_create(batch, **kwargs))
+        return pks
+
+    def id_batches(self, ids: list[int]) -> Iterator[list[int]]:
+        # Bounds the IN lists and arrays of statements over generated rows.
+        return batched(iter(ids), self.batch_size)
+
+    def create_users(self, options: dict) -> list[int]:
+        password = make_password(PASSWORD)
+        # Signed in recently, so posts fan out to them as in fill_timelines().
+        now = timezone.now()
+        users = (
+            User(
+                username=f"{options['prefix']}{index}",
+                password=password,
+                last_login=now,
+            )
+            for index in range(options["users"])
+        )
+        return self.bulk_create(User, users)
+
+    def create_follows(self, user_ids: list[int], options: dict) -> list[int]:
+        popular = self.skewed(user_ids)
+        follows = (
+            Follow(follower_id=follower_id, followee_id=followee_id)
+            for follower_id in user_ids
+            for followee_id in set(popular(options["follows"])) - {follower_id}
+        )
+        self.bulk_create(Follow, follows, ignore_conflicts=True)
+        followers = (
+            Follow.objects.filter(followee=OuterRef("pk"))
+            .order_by()
+            .values("followee")
+            .annotate(total=Count("pk"))
+            .values("total")
+        )
+        for batch in self.id_batches(user_ids):
+            User.objects.filter(pk__in=batch).update(
+                follower_count=Coalesce(
+                    Subquery(followers, output_field=IntegerField()),
+                    0,
+                ),
+            )
+        return user_ids
+
+    def create_tags(self, options: dict) -> list[int]:
+        tags = (
+            Tag(name=f"{options['prefix']}{index}") for index in range(options["tags"])
+        )
+        return self.bulk_create(Tag, tags)
+
+    def create_posts(
+        self,
+        user_ids: list[int],
+        tag_ids: list[int],
+        options: dict,
+    ) -> list[int]:
+        tags = self.skewed(tag_ids)
+        posts = (
+            Post(
+                image=IMAGE_NAME,
+                image_status=Post.ImageStatus.READY,
+                image_width=1080,
+                image_height=1080,
+                caption=f"Generated post {index}",
+                author_id=author_id,
+            )
+            for index, author_id in enumerate(
+                self.rng.choices(user_ids, k=options["posts"]),
+            )
+        )
+        post_ids = self.bulk_create(Post, posts)
+
+        # auto_now_add stamped every post with the current time; spread them
+        # out, oldest first, so feeds and cursors see realistic gaps.
+        now = timezone.now()
+        step = timedelta(days=options["days"]) / max(len(post_ids), 1)
+        for batch in self.id_batches(post_ids):
+            Post.objects.filter(pk__in=batch).update(
+                created_at=ExpressionWrapper(
+                    Value(now) - (post_ids[-1] - F("id")) * Value(step),
+                    output_field=DateTimeField(),
+                ),
+            )
+
+        post_tags = {post_id: set(tags(self.rng.randint(0, 3))) for post_id in post_ids}
+        through = Post.tags.through
+        self.bulk_create(
+            through,
+            (
+                through(post_id=post_id, tag_id=tag_id)
+                for post_id, tag_ids in post_tags.items()
+                for tag_id in tag_ids
+            ),
+        )
+        usage = Counter(
+            (tag_id, TagUsage.bucket_start(now - (post_ids[-1] - post_id) * step))
+            for post_id, tag_ids in post_tags.items()
+            for tag_id in tag_ids
+        )
+        self.bulk_create(
+            TagUsage,
+            (
+                TagUsage(tag_id=tag_id, bucket=bucket, post_count=count)
+                for (tag_id, bucket), count in usage.items()
+            ),
+        )
+        ImageBlob.objects.bulk_create(
+            [ImageBlob(name=IMAGE_NAME)],
+            ignore_conflicts=True,
+        )
+        ImageBlob.objects.filter(name=IMAGE_NAME).update(
+            ref_count=F("ref_count") + len(post_ids),
+        )
+        return post_ids
+
+    def create_comments(
+        self,
+        user_ids: list[int],
+        post_ids: list[int],
+        options: dict,
+    ) -> list[int]:
+        # Newest posts draw the most comments. Replies go to random
+        # top-level comments of the same post.
+        posts = self.skewed(post_ids[::-1])
+        replies = int(options["comments"] * REPLY_SHARE)
+        commented = posts(options["comments"] - replies)
+        top_level = self.bulk_create(
+            Comment,
+            (
+                Comment(
+                    post_id=post_id,
+                    author_id=self.rng.choice(user_ids),
+                    content=f"Generated comment {index}",
+                )
+                for index, post_id in enumerate(commented)
+            ),
+        )
+        parents = list(zip(top_level, commented, strict=True))
+        self.bulk_create(
+            Comment,
+            (
+                Comment(
+                    post_id=post_id,
+                    parent_id=parent_id,
+                    author_id=self.rng.choice(user_ids),
+                    content=f"Generated reply {index}",
+                )
+                for index, (parent_id, post_id) in enumerate(
+                    self.rng.choices(parents, k=replies) if parents else [],
+                )
+            ),
+        )
+        return top_level
+
+    def create_likes(
+        self,
+        user_ids: list[int],
+        post_ids: list[int],
+        options: dict,
+    ) -> None:
+        posts = self.skewed(post_ids[::-1])
+        likes = (
+            Like(post_id=post_id, user_id=self.rng.choice(user_ids))
+            for post_id in posts(options["likes"])
+        )
+        # Duplicate (post, user) pairs are skipped.
+        self.bulk_create(Like, likes, ignore_conflicts=True)
+
+    def fill_timelines(self, user_ids: list[int]) -> None:
+        # The rows fan_out_post() would have written: each post goes to its
+        # author and to the followers of non-celebrity authors.
+        qn = connection.ops.quote_name
+        models = (User, Follow, Post)
+        tables = [qn(model._meta.db_table) for model in models]  # noqa: SLF001
+        with connection.cursor() as cursor:
+            # Fresh statistics, or the planner still sees the empty tables.
+            cursor.execute(f"ANALYZE {', '.join(tables)}")
+            for batch in self.id_batches(user_ids):
+                cursor.execute(
+                    f"INSERT INTO {qn(TimelineEntry._meta.db_table)} "  # noqa: S608, SLF001
+                    "(user_id, post_id, created_at) "
+                    "SELECT p.author_id, p.id, p.created_at "
+                    f"FROM {qn(Post._meta.db_table)} p "  # noqa: SLF001
+                    "WHERE p.author_id = ANY(%s) "
+                    "UNION ALL "
+                    "SELECT f.follower_id, p.id, p.created_at "
+                    f"FROM {qn(Follow._meta.db_table)} f "  # noqa: SLF001
+                    f"JOIN {qn(User._meta.db_table)} u ON u.id = f.followee_id "  # noqa: SLF001
+                    f"JOIN {qn(Post._meta.db_table)} p ON p.author_id = u.id "  # noqa: SLF001
+                    "WHERE f.follower_id = ANY(%s) AND u.follower_count <= %s "
+                    "ON CONFLICT (user_id, post_id) DO NOTHING",
+                    [batch, batch, settings.FEED_CELEBRITY_FOLLOWERS],
+                )
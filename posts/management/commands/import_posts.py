@@ -0,0 +1,301 @@
+import json
+import sys
+import tarfile
+from argparse import ArgumentParser
+from collections import Counter
+from collections.abc import Callable, Iterator
+from contextlib import ExitStack
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO
+
+from django.contrib.auth import get_user_model
+from django.core.files import File
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from PIL import Image, UnidentifiedImageError
+
+from posts.feed import fan_out_posts
+from posts.models import ImageBlob, Post, PostImportProgress, Tag, TagUsage
+from posts.search import index_posts
+from posts.serializers import PostImportSerializer
+
+User = get_user_model()
+
+# Reads the manifest in chunks of this many bytes when skipping to the saved
+# offset of a stream that cannot seek.
+SKIP_CHUNK = 1 << 20
+
+
+def skip(stream: BinaryIO, offset: int) -> None:
+    if stream.seekable():
+        stream.seek(offset)
+        return
+    while offset > 0:
+        chunk = stream.read(min(offset, SKIP_CHUNK))
+        if not chunk:
+            return
+        offset -= len(chunk)
+
+
+def directory_opener(root: Path) -> Callable[[str], BinaryIO]:
+    root = root.resolve()
+
+    def open_image(name: str) -> BinaryIO:
+        path = (root / name).resolve()
+        # Manifests may come from elsewhere; stay inside the image directory.
+        if not path.is_relative_to(root):
+            raise FileNotFoundError(name)
+        return path.open("rb")
+
+    return open_image
+
+
+def archive_member(archive: tarfile.TarFile, name: str) -> tarfile.TarInfo:
+    try:
+        member = archive.getmember(name)
+    except KeyError:
+        member = None
+    if member is None or not member.isfile():
+        raise FileNotFoundError(name)
+    return member
+
+
+def archive_opener(archive: tarfile.TarFile) -> Callable[[str], BinaryIO]:
+    def open_image(name: str) -> BinaryIO:
+        return archive.extractfile(archive_member(archive, name))
+
+    return open_image
+
+
+class Command(BaseCommand):
+    help = (
+        "Import posts from an NDJSON manifest with one post per line, or from "
+        "a tar archive holding the manifest and the images it names. Posts "
+        "are written in batches; each batch commits together with the "
+        "import's progress, so running the command again on the same source "
+        "resumes after the last committed batch. Image variants are left to "
+        "``manage.py process_post_images``."
+    )
+
+    def add_arguments(self, parser: ArgumentParser) -> None:
+        parser.add_argument(
+            "source",
+            help="NDJSON manifest, tar archive, or - for a manifest on stdin.",
+        )
+        parser.add_argument(
+            "--images",
+            type=Path,
+            help=(
+                "Directory the manifest's image paths are relative to; the "
+                "manifest's own directory by default. Unused for archives."
+            ),
+        )
+        parser.add_argument(
+            "--manifest",
+            default="posts.ndjson",
+            help="Name of the manifest inside a tar archive.",
+        )
+        parser.add_argument(
+            "--author",
+            help="Username of the author of posts whose line names none.",
+        )
+        parser.add_argument(
+            "--name",
+            help=(
+                "Key the progress is saved under; the source's absolute path "
+                "by default. Required when reading stdin."
+            ),
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore saved progress and import from the beginning.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Posts written per transaction.",
+        )
+
+    def handle(self, *args: str, **options: object) -> None:  # noqa: ARG002
+        source = options["source"]
+        if source == "-" and not options["name"]:
+            msg = "--name is required when reading the manifest from stdin."
+            raise CommandError(msg)
+        name = options["name"] or str(Path(source).resolve())
+
+        with ExitStack() as stack:
+            manifest, open_image = self.open_source(stack, source, options)
+            progress, _ = PostImportProgress.objects.get_or_create(source=name)
+            if options["restart"]:
+                progress.offset = progress.post_count = 0
+                progress.save()
+            elif progress.offset:
+                self.stdout.write(
+                    f"Resuming after {progress.post_count} post(s), "
+                    f"at byte {progress.offset}.",
+                )
+            skip(manifest, progress.offset)
+
+            imported = 0
+            for batch, offset in self.batches(manifest, progress.offset, options):
+                with transaction.atomic():
+                    self.import_batch(batch, open_image)
+                    progress.offset = offset
+                    progress.post_count += len(batch)
+                    progress.save()
+                imported += len(batch)
+                if options["verbosity"] > 1:
+                    self.stdout.write(f"{progress.post_count} post(s) imported")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {imported} post(s), {progress.post_count} from "
+                f"{name} in total. Run manage.py process_post_images to "
+                "generate their image variants.",
+            ),
+        )
+
+    def open_source(
+        self,
+        stack: ExitStack,
+        source: str,
+        options: dict,
+    ) -> tuple[BinaryIO, Callable[[str], BinaryIO]]:
+        if source == "-":
+            return sys.stdin.buffer, directory_opener(options["images"] or Path.cwd())
+        if not Path(source).is_file():
+            msg = f"No such file: {source}"
+            raise CommandError(msg)
+
+        if tarfile.is_tarfile(source):
+            archive = stack.enter_context(tarfile.open(source))  # noqa: SIM115
+            try:
+                member = archive_member(archive, options["manifest"])
+            except FileNotFoundError as exc:
+                msg = f"{source} holds no {options['manifest']}."
+                raise CommandError(msg) from exc
+            manifest = stack.enter_context(archive.extractfile(member))
+            open_image = archive_opener(archive)
+        else:
+            manifest = stack.enter_context(Path(source).open("rb"))  # noqa: SIM115
+            open_image = directory_opener(options["images"] or Path(source).parent)
+        return manifest, open_image
+
+    def batches(
+        self,
+        manifest: BinaryIO,
+        offset: int,
+        options: dict,
+    ) -> Iterator[tuple[list[dict], int]]:
+        # Validated posts, batch_size at a time, each with the offset just
+        # past its last line. Lines of other types ("comment", "like" in a
+        # history export) and blank lines are skipped.
+        batch = []
+        for line in iter(manifest.readline, b""):
+            start, offset = offset, offset + len(line)
+            if not line.strip():
+                continue
+            try:
+                data = json.loads(line)
+            except ValueError as exc:
+                msg = f"Invalid JSON at byte {start}: {exc}"
+                raise CommandError(msg) from exc
+            if isinstance(data, dict) and data.get("type", "post") != "post":
+                continue
+
+            serializer = PostImportSerializer(data=data)
+            if not serializer.is_valid():
+                msg = f"Invalid post at byte {start}: {serializer.errors}"
+                raise CommandError(msg)
+            post = serializer.validated_data
+            post.setdefault("author", options["author"])
+            if not post["author"]:
+                msg = f"Post at byte {start} names no author; pass --author."
+                raise CommandError(msg)
+
+            batch.append(post)
+            if len(batch) >= options["batch_size"]:
+                yield batch, offset
+                batch = []
+        if batch:
+            yield batch, offset
+
+    def import_batch(
+        self,
+        batch: list[dict],
+        open_image: Callable[[str], BinaryIO],
+    ) -> None:
+        authors = dict(
+            User.objects.filter(
+                username__in={post["author"] for post in batch},
+            ).values_list("username", "id"),
+        )
+        tags = {
+            tag.name: tag
+            for tag in Tag.get_or_create_many(
+                sorted({name for post in batch for name in post["tags"]}),
+            )
+        }
+
+        posts = []
+        for data in batch:
+            if data["author"] not in authors:
+                msg = f"No user named {data['author']!r}."
+                raise CommandError(msg)
+            posts.append(
+                Post(
+                    author_id=authors[data["author"]],
+                    caption=data["caption"],
+                    image=self.store_image(data["image"], open_image),
+                ),
+            )
+        Post.objects.bulk_create(posts)
+
+        # created_at is set on insert; restore the original timestamps.
+        dated = []
+        for post, data in zip(posts, batch, strict=True):
+            if "created_at" in data:
+                post.created_at = data["created_at"]
+                dated.append(post)
+        Post.objects.bulk_update(dated, ["created_at"])
+
+        Post.tags.through.objects.bulk_create(
+            [
+                Post.tags.through(post_id=post.pk, tag_id=tags[name].pk)
+                for post, data in zip(posts, batch, strict=True)
+                for name in data["tags"]
+            ],
+        )
+        TagUsage.record_counts(
+            Counter(
+                (tags[name].pk, TagUsage.bucket_start(post.created_at))
+                for post, data in zip(posts, batch, strict=True)
+                for name in data["tags"]
+            ),
+        )
+        ImageBlob.acquire_many(post.image.name for post in posts)
+
+        post_ids = [post.pk for post in posts]
+        index_posts(post_ids)
+        fan_out_posts(post_ids)
+
+    @staticmethod
+    def store_image(name: str, open_image: Callable[[str], BinaryIO]) -> str:
+        # Saved one file at a time, so a batch holds no open files; stored
+        # bytes are deduplicated by the content-addressed storage.
+        field = Post._meta.get_field("image")  # noqa: SLF001
+        try:
+            with open_image(name) as image:
+                with Image.open(image):
+                    pass
+                image.seek(0)
+                return field.storage.save(
+                    field.generate_filename(None, PurePosixPath(name).name),
+                    File(image),
+                    max_length=field.max_length,
+                )
+        except (OSError, UnidentifiedImageError) as exc:
+            msg = f"Cannot read image {name!r}: {exc}"
+            raise CommandError(msg) from exc
@@ -0,0 +1,80 @@
+import statistics
+import time
+import urllib.error
+import urllib.request
+from argparse import ArgumentParser
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Send concurrent GET requests to a running server and report "
+        "throughput and latency, e.g. to compare one WSGI and one ASGI "
+        "worker process serving /api/posts/."
+    )
+
+    def add_arguments(self, parser: ArgumentParser) -> None:
+        parser.add_argument("url", help="Absolute URL to request.")
+        parser.add_argument(
+            "--token",
+            help="JWT access token sent as a Bearer Authorization header.",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=500,
+            help="Total number of requests.",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=32,
+            help="Requests kept in flight at once.",
+        )
+
+    def handle(self, *args: str, **options: object) -> None:  # noqa: ARG002
+        if not options["url"].startswith(("http://", "https://")):
+            msg = "url must be an absolute http(s) URL."
+            raise CommandError(msg)
+
+        headers = {}
+        if options["token"]:
+            headers["Authorization"] = f"Bearer {options['token']}"
+        request = urllib.request.Request(options["url"], headers=headers)  # noqa: S310
+
+        def timed(_: int) -> tuple[int, float]:
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request) as response:  # noqa: S310
+                    response.read()
+                    status = response.status
+            except urllib.error.HTTPError as exc:
+                status = exc.code
+            except OSError:
+                status = 0
+            return status, time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+            results = list(executor.map(timed, range(options["requests"])))
+        elapsed = time.perf_counter() - start
+
+        statuses = Counter(status for status, _ in results)
+        latencies = sorted(latency for _, latency in results)
+        p50, p95, p99 = (
+            statistics.quantiles(latencies, n=100)[index] for index in (49, 94, 98)
+        )
+        self.stdout.write(
+            f"{options['requests']} request(s), {options['concurrency']} concurrent: "
+            f"{options['requests'] / elapsed:.1f} req/s, p50 {p50 * 1000:.1f} ms, "
+            f"p95 {p95 * 1000:.1f} ms, p99 {p99 * 1000:.1f} ms",
+        )
+        self.stdout.write(
+            "status codes: "
+            + ", ".join(
+                f"{code or 'error'}: {n}" for code, n in sorted(statuses.items())
+            ),
+        )
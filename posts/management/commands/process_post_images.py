@@ -0,0 +1,38 @@
+from argparse import ArgumentParser
+
+from django.core.management.base import BaseCommand
+
+from posts.images import process_post_image
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = "Generate resized variants for post images that are still pending."
+
+    def add_arguments(self, parser: ArgumentParser) -> None:
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=None,
+            help="Process at most this many posts.",
+        )
+        parser.add_argument(
+            "--retry-failed",
+            action="store_true",
+            help="Also reprocess posts whose previous attempt failed.",
+        )
+
+    def handle(self, *args: str, **options: int | bool | None) -> None:  # noqa: ARG002
+        statuses = [Post.ImageStatus.PENDING]
+        if options["retry_failed"]:
+            statuses.append(Post.ImageStatus.FAILED)
+
+        post_ids = Post.objects.filter(image_status__in=statuses).order_by("id")
+        post_ids = post_ids.values_list("id", flat=True)[: options["limit"]]
+
+        processed = 0
+        for post_id in post_ids.iterator():
+            process_post_image(post_id)
+            processed += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} image(s)."))
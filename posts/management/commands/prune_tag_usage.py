@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts.models import TagUsage
+
+
+class Command(BaseCommand):
+    help = "Delete tag usage buckets that fell out of TRENDING_TAGS_WINDOW."
+
+    def handle(self, *args: str, **options: object) -> None:  # noqa: ARG002
+        since = TagUsage.bucket_start(timezone.now()) - settings.TRENDING_TAGS_WINDOW
+        deleted, _ = TagUsage.objects.filter(bucket__lte=since).delete()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} bucket(s)."))
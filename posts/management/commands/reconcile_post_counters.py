@@ -0,0 +1,57 @@
+from argparse import ArgumentParser
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import Comment, Like, Post
+
+
+def count_children(model: type[Like | Comment]) -> Coalesce:
+    counts = (
+        model.objects.filter(post=OuterRef("pk"))
+        .order_by()
+        .values("post")
+        .annotate(total=Count("pk"))
+        .values("total")
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+class Command(BaseCommand):
+    help = "Recompute Post.like_count and Post.comment_count where they drifted."
+
+    def add_arguments(self, parser: ArgumentParser) -> None:
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10000,
+            help="Number of post IDs checked per UPDATE statement.",
+        )
+
+    def handle(self, *args: str, **options: int) -> None:  # noqa: ARG002
+        batch_size = options["batch_size"]
+        last_id = Post.objects.aggregate(last=Max("id"))["last"] or 0
+        fixed = 0
+
+        for start in range(0, last_id + 1, batch_size):
+            batch = Post.objects.filter(id__gte=start, id__lt=start + batch_size)
+            drifted = (
+                batch.annotate(
+                    actual_likes=count_children(Like),
+                    actual_comments=count_children(Comment),
+                )
+                .filter(
+                    ~Q(like_count=F("actual_likes"))
+                    | ~Q(comment_count=F("actual_comments")),
+                )
+                .values_list("id", flat=True)
+            )
+            with transaction.atomic():
+                fixed += Post.objects.filter(id__in=list(drifted)).update(
+                    like_count=count_children(Like),
+                    comment_count=count_children(Comment),
+                )
+
+        self.stdout.write(self.style.SUCCESS(f"Reconciled {fixed} post(s)."))
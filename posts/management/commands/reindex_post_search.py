@@ -0,0 +1,33 @@
+from argparse import ArgumentParser
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from posts.models import Post
+from posts.search import search_document
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild Post.search_vector, e.g. after the search migration or a "
+        "change of POST_SEARCH_CONFIG."
+    )
+
+    def add_arguments(self, parser: ArgumentParser) -> None:
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of post IDs indexed per UPDATE statement.",
+        )
+
+    def handle(self, *args: str, **options: int) -> None:  # noqa: ARG002
+        batch_size = options["batch_size"]
+        last_id = Post.objects.aggregate(last=Max("id"))["last"] or 0
+        indexed = 0
+
+        for start in range(0, last_id + 1, batch_size):
+            batch = Post.objects.filter(id__gte=start, id__lt=start + batch_size)
+            indexed += batch.update(search_vector=search_document())
+
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} post(s)."))
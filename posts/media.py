@@ -0,0 +1,142 @@
+import mimetypes
+import os
+import re
+from collections.abc import Iterator
+from pathlib import Path, PurePosixPath
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpRequest,
+    HttpResponse,
+    StreamingHttpResponse,
+)
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+
+# Originals are named after their content hash, their resized variants
+# ``<hash>_<variant>`` (see posts.images); neither is ever rewritten.
+CONTENT_HASH = re.compile(r"[0-9a-f]{64}(?:_[a-z]+)?")
+BYTE_RANGE = re.compile(r"bytes=(\d*)-(\d*)")
+IMMUTABLE = "public, max-age=31536000, immutable"
+STREAM_CHUNK_SIZE = 64 * 2**10
+
+
+def is_content_addressed(path: str) -> bool:
+    return bool(CONTENT_HASH.fullmatch(PurePosixPath(path).stem))
+
+
+def parse_range(header: str, size: int) -> tuple[int, int] | None:
+    # Returns the inclusive (first, last) byte positions of a single range,
+    # None when the header should be ignored and the full file served.
+    # Raises ValueError for ranges that cannot be satisfied.
+    match = BYTE_RANGE.fullmatch(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        first, last = max(size - int(last), 0), size - 1
+    else:
+        first, last = int(first), min(int(last), size - 1) if last else size - 1
+    if first > last or first >= size:
+        raise ValueError(header)
+    return first, last
+
+
+def iter_file_range(path: Path, first: int, last: int) -> Iterator[bytes]:
+    with path.open("rb") as file:
+        file.seek(first)
+        remaining = last - first + 1
+        while remaining > 0:
+            chunk = file.read(min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def media_headers(path: str, full_path: Path, stat: os.stat_result) -> dict[str, str]:
+    if is_content_addressed(path):
+        etag = f'"{PurePosixPath(path).stem}"'
+        cache_control = IMMUTABLE
+    else:
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        cache_control = f"public, max-age={settings.MEDIA_CACHE_MAX_AGE}"
+    content_type, _encoding = mimetypes.guess_type(full_path.name)
+    return {
+        "Content-Type": content_type or "application/octet-stream",
+        "ETag": etag,
+        "Last-Modified": http_date(stat.st_mtime),
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+    }
+
+
+@require_safe
+def serve_media(request: HttpRequest, path: str) -> HttpResponse:
+    try:
+        full_path = Path(safe_join(settings.MEDIA_ROOT, path))
+    except SuspiciousFileOperation as exc:
+        raise Http404 from exc
+    if not full_path.is_file():
+        raise Http404
+
+    stat = full_path.stat()
+    headers = media_headers(path, full_path, stat)
+    response = HttpResponse(headers=headers)
+    conditional = get_conditional_response(
+        request,
+        etag=headers["ETag"],
+        last_modified=int(stat.st_mtime),
+        response=response,
+    )
+    if conditional is not response:
+        return conditional
+
+    # With a sendfile backend the proxy copies the bytes (and answers Range
+    # requests itself); the worker only returns headers.
+    backend = settings.MEDIA_SENDFILE_BACKEND
+    if backend == "nginx":
+        response["X-Accel-Redirect"] = quote(
+            f"{settings.MEDIA_ACCEL_REDIRECT_PREFIX}{path}",
+        )
+        return response
+    if backend == "xsendfile":
+        response["X-Sendfile"] = str(full_path)
+        return response
+
+    size = stat.st_size
+    range_header = request.headers.get("Range", "")
+    if_range = request.headers.get("If-Range")
+    if if_range and if_range != headers["ETag"]:
+        range_header = ""
+    try:
+        byte_range = parse_range(range_header, size) if range_header else None
+    except ValueError:
+        return HttpResponse(
+            status=416,
+            headers={**headers, "Content-Range": f"bytes */{size}"},
+        )
+
+    if byte_range is None:
+        response = FileResponse(full_path.open("rb"), headers=headers)
+        response["Content-Length"] = str(size)
+        return response
+
+    first, last = byte_range
+    return StreamingHttpResponse(
+        iter_file_range(full_path, first, last),
+        status=206,
+        headers={
+            **headers,
+            "Content-Range": f"bytes {first}-{last}/{size}",
+            "Content-Length": str(last - first + 1),
+        },
+    )
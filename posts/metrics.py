@@ -0,0 +1,229 @@
+import random
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from collections.abc import Awaitable, Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.http import HttpRequest, HttpResponseBase
+
+# RequestMetricsMiddleware times a REQUEST_METRICS_SAMPLE_RATE share of
+# requests: SQL queries on any connection (async views' pool threads
+# included, see posts.concurrency), serialization and rendering. Sampled
+# responses carry a Server-Timing header and are aggregated per route into
+# the histograms served by /api/metrics/. The aggregate lives in the process,
+# so each worker reports its own.
+
+DURATION_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+# Server-Timing metric names, in header order.
+PHASES = ("db", "serialize", "render")
+
+
+class RequestTimings:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.queries = 0
+        self.seconds: defaultdict[str, float] = defaultdict(float)
+
+    def add(self, phase: str, seconds: float, queries: int = 0) -> None:
+        # Queries of one request may run on several threads at once.
+        with self.lock:
+            self.seconds[phase] += seconds
+            self.queries += queries
+
+
+_current: ContextVar[RequestTimings | None] = ContextVar(
+    "request_timings",
+    default=None,
+)
+
+
+@contextmanager
+def timed(phase: str) -> Iterator[None]:
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(phase, time.perf_counter() - start)
+
+
+def record_query(
+    execute: Callable,
+    sql: str,
+    params: object,
+    many: bool,  # noqa: FBT001
+    context: dict,
+) -> object:
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.add("db", time.perf_counter() - start, queries=1)
+
+
+def install_query_timer(connection: BaseDatabaseWrapper) -> None:
+    # Runs for every new connection; a wrapper object that reconnects keeps
+    # the timer it already has.
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def as_dict(self) -> dict:
+        # Cumulative counts per upper bound, as Prometheus reports them.
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip((*self.buckets, "+Inf"), self.counts, strict=True):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {"count": self.count, "sum": round(self.sum, 3), "buckets": buckets}
+
+
+class RouteMetrics:
+    def __init__(self) -> None:
+        self.duration_ms = Histogram(DURATION_BUCKETS_MS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.phase_ms = dict.fromkeys(PHASES, 0.0)
+
+    def observe(self, duration: float, timings: RequestTimings) -> None:
+        self.duration_ms.observe(duration * 1000)
+        self.queries.observe(timings.queries)
+        for phase, seconds in timings.seconds.items():
+            self.phase_ms[phase] += seconds * 1000
+
+    def as_dict(self) -> dict:
+        return {
+            "duration_ms": self.duration_ms.as_dict(),
+            "queries": self.queries.as_dict(),
+            "phase_ms_sum": {
+                phase: round(total, 3) for phase, total in self.phase_ms.items()
+            },
+        }
+
+
+_routes: defaultdict[str, RouteMetrics] = defaultdict(RouteMetrics)
+_routes_lock = threading.Lock()
+
+
+def route_name(request: HttpRequest) -> str:
+    match = getattr(request, "resolver_match", None)
+    return f"{request.method} {match.view_name if match else '<unresolved>'}"
+
+
+def observe(request: HttpRequest, duration: float, timings: RequestTimings) -> None:
+    with _routes_lock:
+        _routes[route_name(request)].observe(duration, timings)
+
+
+def snapshot() -> dict[str, dict]:
+    with _routes_lock:
+        return {route: metrics.as_dict() for route, metrics in sorted(_routes.items())}
+
+
+def reset() -> None:
+    with _routes_lock:
+        _routes.clear()
+
+
+def server_timing(duration: float, timings: RequestTimings) -> str:
+    db = timings.seconds["db"] * 1000
+    metrics = [f'db;dur={db:.2f};desc="{timings.queries} queries"']
+    metrics.extend(
+        f"{phase};dur={timings.seconds[phase] * 1000:.2f}"
+        for phase in PHASES[1:]
+        if phase in timings.seconds
+    )
+    metrics.append(f"total;dur={duration * 1000:.2f}")
+    return ", ".join(metrics)
+
+
+# Outermost middleware, so "total" covers the whole middleware stack. Works
+# under WSGI and ASGI; requests outside the sample pay for one random() call.
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(
+        self,
+        get_response: (
+            Callable[[HttpRequest], HttpResponseBase]
+            | Callable[[HttpRequest], Awaitable[HttpResponseBase]]
+        ),
+    ) -> None:
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(
+        self,
+        request: HttpRequest,
+    ) -> HttpResponseBase | Awaitable[HttpResponseBase]:
+        if self.is_async:
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, time.perf_counter() - start, timings)
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponseBase:
+        if not self.sampled():
+            return await self.get_response(request)
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, time.perf_counter() - start, timings)
+
+    @staticmethod
+    def sampled() -> bool:
+        rate = settings.REQUEST_METRICS_SAMPLE_RATE
+        return rate >= 1 or (rate > 0 and random.random() < rate)  # noqa: S311
+
+    @staticmethod
+    def finish(
+        request: HttpRequest,
+        response: HttpResponseBase,
+        duration: float,
+        timings: RequestTimings,
+    ) -> HttpResponseBase:
+        # Streaming responses are measured until their body starts.
+        observe(request, duration, timings)
+        if settings.REQUEST_METRICS_SERVER_TIMING:
+            response["Server-Timing"] = server_timing(duration, timings)
+        return response
@@ -0,0 +1,56 @@
+# Generated by Django 5.1.1 on 2026-10-18 10:09
+
+from django.db import migrations, models
+from django.db.models import Count
+
+import posts.storage
+
+
+def count_image_references(apps, schema_editor) -> None:  # noqa: ANN001, ARG001
+    Post = apps.get_model("posts", "Post")
+    ImageBlob = apps.get_model("posts", "ImageBlob")
+    references = Post.objects.values("image").annotate(total=Count("id")).order_by()
+    ImageBlob.objects.bulk_create(
+        (
+            ImageBlob(name=row["image"], ref_count=row["total"])
+            for row in references.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0010_post_image_variants"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ImageBlob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100, unique=True)),
+                ("ref_count", models.IntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name="post",
+            name="image",
+            field=models.ImageField(
+                db_index=True,
+                storage=posts.storage.post_image_storage,
+                upload_to="posts/",
+            ),
+        ),
+        migrations.RunPython(count_image_references, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.1.1 on 2026-10-18 10:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0013_post_search_vector"),
+    ]
+
+    operations = [
+        # Lets a tag's posts be read newest first straight from the index;
+        # the default index on the through table only covers tag_id.
+        migrations.RunSQL(
+            "CREATE INDEX post_tags_tag_post_idx "
+            "ON posts_post_tags (tag_id, post_id DESC)",
+            "DROP INDEX post_tags_tag_post_idx",
+        ),
+        migrations.CreateModel(
+            name="TagUsage",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("bucket", models.DateTimeField()),
+                ("post_count", models.PositiveIntegerField(default=0)),
+                (
+                    "tag",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="posts.tag",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["bucket"], name="tag_usage_bucket_idx"),
+                ],
+                "unique_together": {("tag", "bucket")},
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.1 on 2026-10-18 12:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0016_post_import_progress"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="version",
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        # Any update of a post row, from the ORM, raw SQL or another process,
+        # moves its version; updates that change nothing do not.
+        migrations.RunSQL(
+            "CREATE FUNCTION posts_post_bump_version() RETURNS trigger AS $$ "
+            "BEGIN NEW.version := OLD.version + 1; RETURN NEW; END "
+            "$$ LANGUAGE plpgsql",
+            "DROP FUNCTION posts_post_bump_version()",
+        ),
+        migrations.RunSQL(
+            "CREATE TRIGGER posts_post_bump_version "
+            "BEFORE UPDATE ON posts_post FOR EACH ROW "
+            "WHEN (OLD.* IS DISTINCT FROM NEW.*) "
+            "EXECUTE FUNCTION posts_post_bump_version()",
+            "DROP TRIGGER posts_post_bump_version ON posts_post",
+        ),
+    ]
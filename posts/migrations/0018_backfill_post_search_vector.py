@@ -0,0 +1,71 @@
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import Max, OuterRef, Subquery, TextField
+
+BATCH_SIZE = 1000
+
+
+def search_document(Post, Comment) -> SearchVector:  # noqa: ANN001, N803
+    # A copy of posts.search.search_document as of this migration, so later
+    # changes to the live one do not change what it backfills. The POST_SEARCH
+    # settings are still read: the index has to match the deployment's.
+    config = settings.POST_SEARCH_CONFIG
+    tag_names = (
+        Post.tags.through.objects.filter(post_id=OuterRef("pk"))
+        .order_by()
+        .values("post_id")
+        .annotate(names=StringAgg("tag__name", " "))
+        .values("names")
+    )
+    document = SearchVector("caption", config=config, weight="A") + SearchVector(
+        Subquery(tag_names, output_field=TextField()),
+        config=config,
+        weight="B",
+    )
+    if settings.POST_SEARCH_INCLUDE_COMMENTS:
+        newest = (
+            Comment.objects.filter(post=OuterRef(OuterRef("pk")))
+            .order_by("-created_at", "-id")
+            .values("pk")[: settings.POST_SEARCH_MAX_COMMENTS]
+        )
+        comment_text = (
+            Comment.objects.filter(post=OuterRef("pk"), pk__in=newest)
+            .order_by()
+            .values("post")
+            .annotate(
+                text=StringAgg("content", " ", ordering=("-created_at", "-id")),
+            )
+            .values("text")
+        )
+        document += SearchVector(
+            Subquery(comment_text, output_field=TextField()),
+            config=config,
+            weight="C",
+        )
+    return document
+
+
+def index_existing_posts(apps, schema_editor) -> None:  # noqa: ANN001, ARG001
+    # What ``manage.py reindex_post_search`` did when this migration was
+    # written, with the historical models.
+    Post = apps.get_model("posts", "Post")
+    Comment = apps.get_model("posts", "Comment")
+    document = search_document(Post, Comment)
+    last_id = Post.objects.aggregate(last=Max("id"))["last"] or 0
+    for start in range(0, last_id + 1, BATCH_SIZE):
+        Post.objects.filter(id__gte=start, id__lt=start + BATCH_SIZE).update(
+            search_vector=document,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0017_post_version"),
+    ]
+
+    operations = [
+        migrations.RunPython(index_existing_posts, migrations.RunPython.noop),
+    ]
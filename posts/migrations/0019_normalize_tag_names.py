@@ -0,0 +1,87 @@
+from importlib import import_module
+
+from django.db import migrations
+from django.db.models import F
+
+# The index of the posts whose tag names change is rebuilt with the same
+# frozen expression as the backfill.
+search_document = import_module(
+    "posts.migrations.0018_backfill_post_search_vector",
+).search_document
+
+
+def normalize_name(name: str) -> str:
+    # Tag.normalize_name as of this migration.
+    return " ".join(name.split()).lower()
+
+
+def normalize_tags(apps, schema_editor) -> None:  # noqa: ANN001, ARG001
+    # Tags created before names were normalized ("Cats", " cats") are merged
+    # into one tag per normalized name: its posts and its TagUsage counts
+    # move to the tag that keeps the name, and tags left without a name are
+    # dropped from their posts.
+    Post = apps.get_model("posts", "Post")
+    Comment = apps.get_model("posts", "Comment")
+    Tag = apps.get_model("posts", "Tag")
+    TagUsage = apps.get_model("posts", "TagUsage")
+    post_tags = Post.tags.through
+
+    groups: dict[str, list[tuple[int, str]]] = {}
+    for tag_id, name in Tag.objects.order_by("id").values_list("id", "name"):
+        groups.setdefault(normalize_name(name), []).append((tag_id, name))
+
+    renamed = {}
+    removed = []
+    for normalized, tags in groups.items():
+        if not normalized:
+            removed.extend(tag_id for tag_id, _ in tags)
+            continue
+        # The tag already carrying the name keeps it, else the oldest one.
+        keep = next((tag_id for tag_id, name in tags if name == normalized), None)
+        keep = keep or tags[0][0]
+        merged = [tag_id for tag_id, _ in tags if tag_id != keep]
+        if merged:
+            post_tags.objects.bulk_create(
+                [
+                    post_tags(post_id=post_id, tag_id=keep)
+                    for post_id in post_tags.objects.filter(
+                        tag_id__in=merged,
+                    ).values_list("post_id", flat=True)
+                ],
+                ignore_conflicts=True,
+            )
+            usage = TagUsage.objects.filter(tag_id__in=merged)
+            for bucket, post_count in usage.values_list("bucket", "post_count"):
+                kept, _ = TagUsage.objects.get_or_create(tag_id=keep, bucket=bucket)
+                TagUsage.objects.filter(pk=kept.pk).update(
+                    post_count=F("post_count") + post_count,
+                )
+            removed.extend(merged)
+        if any(tag_id == keep and name != normalized for tag_id, name in tags):
+            renamed[keep] = normalized
+
+    affected = set(
+        post_tags.objects.filter(tag_id__in=[*removed, *renamed]).values_list(
+            "post_id",
+            flat=True,
+        ),
+    )
+    # Deletes their post links and TagUsage rows with them.
+    Tag.objects.filter(pk__in=removed).delete()
+    for tag_id, name in renamed.items():
+        Tag.objects.filter(pk=tag_id).update(name=name)
+    if affected:
+        Post.objects.filter(pk__in=affected).update(
+            search_vector=search_document(Post, Comment),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("posts", "0018_backfill_post_search_vector"),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_tags, migrations.RunPython.noop),
+    ]
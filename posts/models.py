@@ -1,5 +1,17 @@
+from collections import Counter
+from collections.abc import Iterable
+from datetime import UTC, datetime
+
 from django.conf import settings
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.core.exceptions import ValidationError
+from django.db import connection, models, transaction
+from django.db.backends.utils import CursorWrapper
+from django.db.models import Case, F, When
+from django.utils import timezone
+
+from .storage import post_image_storage
 
 
 class Tag(models.Model):
@@ -8,9 +20,101 @@ class Tag(models.Model):
     def __str__(self) -> str:
         return self.name
 
+    @staticmethod
+    def normalize_name(name: str) -> str:
+        return " ".join(name.split()).lower()
+
+    @classmethod
+    def normalize_names(cls, names: Iterable[str]) -> list[str]:
+        # Normalized, without blanks and duplicates, in first-seen order.
+        normalized = (cls.normalize_name(name) for name in names)
+        return list(dict.fromkeys(name for name in normalized if name))
+
+    @classmethod
+    def get_or_create_many(cls, names: list[str]) -> list["Tag"]:
+        # Two statements for any number of names: an insert that skips
+        # existing rows and a fetch of the resulting IDs.
+        if not names:
+            return []
+        cls.objects.bulk_create(
+            [cls(name=name) for name in names],
+            ignore_conflicts=True,
+        )
+        return list(cls.objects.filter(name__in=names))
+
+
+class TagUsage(models.Model):
+    # Number of posts tagged with ``tag`` that were created during the
+    # TRENDING_TAGS_BUCKET starting at ``bucket``. Incremented as posts are
+    # created and summed over the recent buckets by posts.tags.trending_tags().
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE, related_name="+")
+    bucket = models.DateTimeField()
+    post_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ("tag", "bucket")
+        indexes = [models.Index(fields=["bucket"], name="tag_usage_bucket_idx")]
+
+    def __str__(self) -> str:
+        return f"Tag {self.tag_id} used {self.post_count} time(s) from {self.bucket}"
+
+    @staticmethod
+    def bucket_start(moment: datetime) -> datetime:
+        size = int(settings.TRENDING_TAGS_BUCKET.total_seconds())
+        timestamp = int(moment.timestamp())
+        return datetime.fromtimestamp(timestamp - timestamp % size, tz=UTC)
+
+    @classmethod
+    def record(cls, tag_ids: list[int], moment: datetime) -> None:
+        bucket = cls.bucket_start(moment)
+        cls.record_counts({(tag_id, bucket): 1 for tag_id in tag_ids})
+
+    @classmethod
+    def record_counts(cls, counts: dict[tuple[int, datetime], int]) -> None:
+        # One upsert for any number of (tag ID, bucket start) pairs, in tag
+        # order so concurrent posts cannot deadlock on the bucket rows.
+        if not counts:
+            return
+        table = connection.ops.quote_name(cls._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (tag_id, bucket, post_count) "  # noqa: S608
+                f"VALUES {', '.join(['(%s, %s, %s)'] * len(counts))} "
+                "ON CONFLICT (tag_id, bucket) "
+                f"DO UPDATE SET post_count = {table}.post_count + "
+                "EXCLUDED.post_count",
+                [
+                    value
+                    for (tag_id, bucket), count in sorted(counts.items())
+                    for value in (
+                        tag_id,
+                        connection.ops.adapt_datetimefield_value(bucket),
+                        count,
+                    )
+                ],
+            )
+
 
 class Post(models.Model):
-    image = models.ImageField(upload_to="posts/")
+    class ImageStatus(models.TextChoices):
+        PENDING = "pending"
+        READY = "ready"
+        FAILED = "failed"
+
+    image = models.ImageField(
+        upload_to="posts/",
+        storage=post_image_storage,
+        db_index=True,
+    )
+    image_status = models.CharField(
+        max_length=10,
+        choices=ImageStatus.choices,
+        default=ImageStatus.PENDING,
+        db_index=True,
+    )
+    image_width = models.PositiveIntegerField(null=True, blank=True)
+    image_height = models.PositiveIntegerField(null=True, blank=True)
+    image_variants = models.JSONField(default=dict, blank=True)
     caption = models.TextField(max_length=500)
     created_at = models.DateTimeField(auto_now_add=True)
     author = models.ForeignKey(
@@ -19,13 +123,124 @@ class Post(models.Model):
         related_name="posts",
     )
     tags = models.ManyToManyField(Tag, related_name="posts", blank=True)
+    like_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+    # Maintained by posts.search.index_posts().
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Moved by a database trigger on every update of the row (migration
+    # 0017), whichever process makes it; ETags and cached fragments are keyed
+    # by it.
+    version = models.PositiveBigIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["-created_at", "-id"],
+                name="post_created_at_id_idx",
+            ),
+            models.Index(
+                fields=["author", "-created_at", "-id"],
+                name="post_author_created_at_idx",
+            ),
+            GinIndex(fields=["search_vector"], name="post_search_vector_idx"),
+        ]
 
     def __str__(self) -> str:
         return self.caption
 
+    @classmethod
+    def adjust_counter(cls, post_id: int, field: str, delta: int) -> None:
+        cls.objects.filter(pk=post_id).update(**{field: F(field) + delta})
+
+
+class TimelineEntry(models.Model):
+    # A post materialized into one follower's home timeline. ``created_at``
+    # copies the post's timestamp so a page is one range scan of the index.
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="timeline",
+    )
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="+")
+    created_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ("user", "post")
+        indexes = [
+            models.Index(
+                fields=["user", "-created_at", "-post"],
+                name="timeline_user_created_at_idx",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"Post {self.post_id} in timeline of {self.user_id}"
+
+
+class ImageBlob(models.Model):
+    # One row per stored image file, counting the posts that point at it.
+    # Rows at zero references are reclaimed by ``collect_post_images``.
+    name = models.CharField(max_length=100, unique=True)
+    ref_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return self.name
+
+    @classmethod
+    def acquire(cls, name: str) -> None:
+        cls.objects.bulk_create([cls(name=name)], ignore_conflicts=True)
+        cls.objects.filter(name=name).update(
+            ref_count=F("ref_count") + 1,
+            updated_at=timezone.now(),
+        )
+
+    @classmethod
+    def acquire_many(cls, names: Iterable[str]) -> None:
+        # acquire() for every name in two statements; repeated names count
+        # once per occurrence.
+        counts = Counter(names)
+        if not counts:
+            return
+        cls.objects.bulk_create(
+            [cls(name=name) for name in counts],
+            ignore_conflicts=True,
+        )
+        cls.objects.filter(name__in=counts).update(
+            ref_count=F("ref_count")
+            + Case(
+                *(When(name=name, then=count) for name, count in counts.items()),
+                output_field=models.IntegerField(),
+            ),
+            updated_at=timezone.now(),
+        )
+
+    @classmethod
+    def release(cls, name: str) -> None:
+        cls.objects.filter(name=name).update(
+            ref_count=F("ref_count") - 1,
+            updated_at=timezone.now(),
+        )
+
 
 class Comment(models.Model):
-    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="comments")
+    # The composite indexes below start with the foreign keys, so those get
+    # no index of their own.
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name="comments",
+        db_index=False,
+    )
+    # Set on replies; top-level comments of a post have no parent.
+    parent = models.ForeignKey(
+        "self",
+        on_delete=models.CASCADE,
+        related_name="replies",
+        null=True,
+        blank=True,
+        db_index=False,
+    )
     content = models.TextField(max_length=500)
     created_at = models.DateTimeField(auto_now_add=True)
     author = models.ForeignKey(
@@ -34,9 +249,42 @@ class Comment(models.Model):
         related_name="comments",
     )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["post", "created_at", "id"],
+                name="comment_post_created_at_idx",
+            ),
+            models.Index(
+                fields=["parent", "created_at", "id"],
+                name="comment_parent_created_idx",
+            ),
+        ]
+
+    # IDs only, so listing comments never loads their author or post.
     def __str__(self) -> str:
-        return f'Comment by {self.author.username} on {self.created_at.strftime
-        ("%Y-%m-%d %H:%M:%S")}: {self.content[:50]}'
+        return f"Comment {self.pk} by user {self.author_id}: {self.content[:50]}"
+
+    def clean(self) -> None:
+        # The API fixes a comment's parent when it is created; the admin can
+        # still move it, so it must not end up under its own replies.
+        if self.parent_id is None:
+            return
+        if self.parent.post_id != self.post_id:
+            raise ValidationError(
+                {"parent": "Replies must be on the same post as their parent."},
+            )
+        ancestor_id = self.parent_id if self.pk is not None else None
+        while ancestor_id is not None:
+            if ancestor_id == self.pk:
+                raise ValidationError(
+                    {"parent": "A comment cannot reply to itself or its replies."},
+                )
+            ancestor_id = (
+                Comment.objects.filter(pk=ancestor_id)
+                .values_list("parent_id", flat=True)
+                .first()
+            )
 
 
 class Like(models.Model):
@@ -52,4 +300,92 @@ class Like(models.Model):
         unique_together = ("post", "user")
 
     def __str__(self) -> str:
-        return f"Like by {self.user.username} on post {self.post.id}"
+        return f"Like by user {self.user_id} on post {self.post_id}"
+
+    @classmethod
+    def apply_states(
+        cls,
+        user_id: int,
+        states: dict[int, bool],
+    ) -> tuple[dict[int, int], list[tuple], list[int]]:
+        # Idempotently sets the like state of ``user_id`` for every post in
+        # ``states``. Returns the resulting like counts, the rows of the likes
+        # it added (id, post_id, user_id, created_at) and the ids of the
+        # posts it removed a like from; states that were already in place
+        # appear in neither. Posts that do not exist are missing from the
+        # counts. The statement count does not depend on the number of posts,
+        # and concurrent calls cannot trip the (post, user) unique constraint
+        # or double count.
+        liked = sorted(post_id for post_id, state in states.items() if state)
+        unliked = sorted(post_id for post_id, state in states.items() if not state)
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            added = cls._insert_missing(cursor, user_id, liked)
+            removed = cls._delete_existing(cursor, user_id, unliked)
+            for post_ids, delta in (([row[1] for row in added], 1), (removed, -1)):
+                if post_ids:
+                    Post.objects.filter(pk__in=post_ids).update(
+                        like_count=F("like_count") + delta,
+                    )
+            like_counts = dict(
+                Post.objects.filter(pk__in=states).values_list("id", "like_count"),
+            )
+        return like_counts, added, removed
+
+    @classmethod
+    def _insert_missing(
+        cls,
+        cursor: CursorWrapper,
+        user_id: int,
+        post_ids: list[int],
+    ) -> list[tuple]:
+        if not post_ids:
+            return []
+        like_table = connection.ops.quote_name(cls._meta.db_table)
+        post_table = connection.ops.quote_name(Post._meta.db_table)  # noqa: SLF001
+        placeholders = ", ".join(["%s"] * len(post_ids))
+        created_at = timezone.now()
+        cursor.execute(
+            f"INSERT INTO {like_table} (post_id, user_id, created_at) "  # noqa: S608
+            f"SELECT id, %s, %s FROM {post_table} WHERE id IN ({placeholders}) "
+            "ON CONFLICT (post_id, user_id) DO NOTHING RETURNING id, post_id",
+            [
+                user_id,
+                connection.ops.adapt_datetimefield_value(created_at),
+                *post_ids,
+            ],
+        )
+        return [
+            (like_id, post_id, user_id, created_at)
+            for like_id, post_id in cursor.fetchall()
+        ]
+
+    @classmethod
+    def _delete_existing(
+        cls,
+        cursor: CursorWrapper,
+        user_id: int,
+        post_ids: list[int],
+    ) -> list[int]:
+        if not post_ids:
+            return []
+        placeholders = ", ".join(["%s"] * len(post_ids))
+        cursor.execute(
+            f"DELETE FROM {connection.ops.quote_name(cls._meta.db_table)} "  # noqa: S608
+            f"WHERE user_id = %s AND post_id IN ({placeholders}) RETURNING post_id",
+            [user_id, *post_ids],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+class PostImportProgress(models.Model):
+    # How far ``manage.py import_posts`` got through one source: the byte
+    # offset after the last committed batch. Saved in that batch's
+    # transaction, so a resumed import neither skips nor repeats a post.
+    source = models.CharField(max_length=255, unique=True)
+    offset = models.PositiveBigIntegerField(default=0)
+    post_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"{self.source}: {self.post_count} post(s) up to byte {self.offset}"
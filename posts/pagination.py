@@ -0,0 +1,198 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.db.models import Field, Model, Q, QuerySet
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.views import APIView
+
+from .feed import timeline_post_ids
+from .serializers import CommentReadSerializer
+
+
+# Seek pagination over a composite, unique ordering key. The cursor stores the
+# ordering values of the last row on the page, so every page is one indexed
+# range scan with no COUNT(*) and no OFFSET. All fields in ``ordering`` must
+# share one direction and the last one must be unique. Pages of values_list()
+# rows name the row's fields in ``row_fields``.
+class KeysetPagination(BasePagination):
+
+    cursor_query_param = "cursor"
+    page_size = api_settings.PAGE_SIZE
+    ordering = ("-created_at", "-id")
+    row_fields: tuple[str, ...] = ()
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(
+        self,
+        queryset: QuerySet,
+        request: Request,
+        view: APIView | None = None,  # noqa: ARG002
+    ) -> list[Model]:
+        self.request = request
+        queryset = queryset.order_by(*self.ordering)
+
+        position = self.decode_cursor(request, queryset)
+        if position is not None:
+            queryset = queryset.filter(self.seek_filter(position))
+
+        rows = list(queryset[: self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[: self.page_size]
+        return self.page
+
+    def seek_filter(self, position: list) -> Q:
+        descending = self.ordering[0].startswith("-")
+        lookup = "lt" if descending else "gt"
+        fields = [field.lstrip("-") for field in self.ordering]
+
+        condition = Q()
+        for index, field in enumerate(fields):
+            equal = {name: position[i] for i, name in enumerate(fields[:index])}
+            condition |= Q(**equal, **{f"{field}__{lookup}": position[index]})
+        return condition
+
+    def position_from_instance(self, instance: Model | tuple) -> list:
+        row = (
+            dict(zip(self.row_fields, instance, strict=True))
+            if self.row_fields
+            else None
+        )
+        position = []
+        for field in self.ordering:
+            name = field.lstrip("-")
+            value = getattr(instance, name) if row is None else row[name]
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            position.append(value)
+        return position
+
+    def decode_cursor(self, request: Request, queryset: QuerySet) -> list | None:
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        try:
+            position = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+        except (TypeError, ValueError, binascii.Error) as exc:
+            raise NotFound(self.invalid_cursor_message) from exc
+
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        # Each value is parsed as the field it seeks on, so a tampered cursor
+        # is a 404 rather than a database error.
+        try:
+            position = [
+                self.ordering_field(queryset, field.lstrip("-")).to_python(value)
+                for field, value in zip(self.ordering, position, strict=True)
+            ]
+        except (TypeError, ValueError, ValidationError) as exc:
+            raise NotFound(self.invalid_cursor_message) from exc
+        if None in position:
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    @staticmethod
+    def ordering_field(queryset: QuerySet, name: str) -> Field:
+        annotation = queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        return queryset.model._meta.get_field(name)  # noqa: SLF001
+
+    def encode_cursor(self, position: list) -> str:
+        url = self.request.build_absolute_uri()
+        encoded = base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+        return replace_query_param(url, self.cursor_query_param, encoded)
+
+    def get_next_link(self) -> str | None:
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.position_from_instance(self.page[-1]))
+
+    def get_paginated_response(self, data: list) -> Response:
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema: dict) -> dict:
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+
+# Keyset pagination for the home timeline: the page's post IDs come from
+# timeline_post_ids() and are then loaded from the given Post queryset.
+class TimelinePagination(KeysetPagination):
+    def paginate_queryset(
+        self,
+        queryset: QuerySet,
+        request: Request,
+        view: APIView | None = None,  # noqa: ARG002
+    ) -> list[Model]:
+        self.request = request
+        position = self.decode_cursor(request, queryset)
+        post_ids = timeline_post_ids(request.user.id, position, self.page_size + 1)
+        self.has_next = len(post_ids) > self.page_size
+
+        posts = queryset.in_bulk(post_ids[: self.page_size])
+        self.page = [posts[post_id] for post_id in post_ids if post_id in posts]
+        return self.page
+
+
+# Keyset pagination for search results: most relevant first, the post ID
+# breaking ties. The queryset must be annotated with ``rank`` (see
+# posts.search.search_posts).
+class SearchPagination(KeysetPagination):
+    ordering = ("-rank", "-id")
+
+
+# Keyset pagination over the rows of a tag in the Post.tags through table,
+# newest post (highest ID) first.
+class TagPostsPagination(KeysetPagination):
+    ordering = ("-post_id",)
+
+
+# Keyset pagination over a post's top-level comments, newest first, and over
+# the replies to one comment, oldest first. Both page CommentReadSerializer
+# rows.
+class CommentPagination(KeysetPagination):
+    row_fields = CommentReadSerializer.fields
+
+
+class ReplyPagination(CommentPagination):
+    ordering = ("created_at", "id")
+
+
+# Page-number pagination with an opt-in keyset mode: requests carrying a
+# ``cursor`` query parameter (empty for the first page) are paginated by
+# KeysetPagination, everything else keeps the classic ``?page=N`` behaviour.
+class PostFeedPagination(PageNumberPagination):
+
+    keyset_class = KeysetPagination
+
+    def paginate_queryset(
+        self,
+        queryset: QuerySet,
+        request: Request,
+        view: APIView | None = None,
+    ) -> list[Model] | None:
+        self.keyset = None
+        if self.keyset_class.cursor_query_param in request.query_params:
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data: list) -> Response:
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.http.multipartparser import (
+    MultiPartParser as DjangoMultiPartParser,
+)
+from django.http.multipartparser import MultiPartParserError
+from rest_framework.exceptions import ParseError, ValidationError
+from rest_framework.parsers import DataAndFiles, JSONParser, MultiPartParser
+
+from .uploadhandlers import StreamingImageUploadHandler
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+
+# Decodes request bodies with orjson when it is installed; other encodings
+# than UTF-8 and environments without orjson use the stock parser.
+class FastJSONParser(JSONParser):
+    def parse(
+        self,
+        stream: object,
+        media_type: str | None = None,
+        parser_context: dict | None = None,
+    ) -> object:
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace("_", "-") != "utf-8":
+            return super().parse(stream, media_type, parser_context)
+
+        try:
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            msg = f"JSON parse error - {exc}"
+            raise ParseError(msg) from exc
+
+
+class StreamingImageMultiPartParser(MultiPartParser):
+    def parse(
+        self,
+        stream: object,
+        media_type: str | None = None,
+        parser_context: dict | None = None,
+    ) -> DataAndFiles:
+        parser_context = parser_context or {}
+        request = parser_context["request"]
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        meta = request.META.copy()
+        meta["CONTENT_TYPE"] = media_type
+        handler = StreamingImageUploadHandler()
+
+        try:
+            parser = DjangoMultiPartParser(meta, stream, [handler], encoding)
+            data, files = parser.parse()
+        except MultiPartParserError as exc:
+            msg = f"Multipart form parse error - {exc}"
+            raise ParseError(msg) from exc
+
+        if handler.errors:
+            raise ValidationError(handler.errors)
+        return DataAndFiles(data, files)
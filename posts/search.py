@@ -0,0 +1,92 @@
+from collections.abc import Iterable
+
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+)
+from django.db.models import (
+    F,
+    FloatField,
+    Model,
+    OuterRef,
+    QuerySet,
+    Subquery,
+    TextField,
+)
+from django.db.models.functions import Cast
+
+from .models import Comment, Post
+
+# Post.search_vector holds the caption (weight A), the tag names (B) and,
+# with POST_SEARCH_INCLUDE_COMMENTS, the text of the newest
+# POST_SEARCH_MAX_COMMENTS comments (C). Every write that changes one of them
+# calls index_posts() in the same transaction, so the cap keeps a comment
+# write on a long thread from aggregating the whole thread again;
+# ``manage.py reindex_post_search`` rebuilds the column for existing posts.
+
+
+def search_document(
+    post_model: type[Model] = Post,
+    comment_model: type[Model] = Comment,
+) -> SearchVector:
+    # The models are parameters so migrations can pass their historical ones.
+    config = settings.POST_SEARCH_CONFIG
+    tag_names = (
+        post_model.tags.through.objects.filter(post_id=OuterRef("pk"))
+        .order_by()
+        .values("post_id")
+        .annotate(names=StringAgg("tag__name", " "))
+        .values("names")
+    )
+    document = SearchVector("caption", config=config, weight="A") + SearchVector(
+        Subquery(tag_names, output_field=TextField()),
+        config=config,
+        weight="B",
+    )
+    if settings.POST_SEARCH_INCLUDE_COMMENTS:
+        # Walks comment_post_created_at_idx backwards from the newest comment.
+        newest = (
+            comment_model.objects.filter(post=OuterRef(OuterRef("pk")))
+            .order_by("-created_at", "-id")
+            .values("pk")[: settings.POST_SEARCH_MAX_COMMENTS]
+        )
+        comment_text = (
+            comment_model.objects.filter(post=OuterRef("pk"), pk__in=newest)
+            .order_by()
+            .values("post")
+            .annotate(
+                text=StringAgg("content", " ", ordering=("-created_at", "-id")),
+            )
+            .values("text")
+        )
+        document += SearchVector(
+            Subquery(comment_text, output_field=TextField()),
+            config=config,
+            weight="C",
+        )
+    return document
+
+
+def index_posts(post_ids: Iterable[int]) -> int:
+    # One UPDATE for any number of posts.
+    return Post.objects.filter(pk__in=set(post_ids)).update(
+        search_vector=search_document(),
+    )
+
+
+def search_posts(queryset: QuerySet, text: str) -> QuerySet:
+    # Matches ``text`` with web search syntax ("quoted phrases", or, -not)
+    # through the GIN index and annotates each post with its ``rank``. The
+    # rank is cast to double precision so it survives a round trip through
+    # a pagination cursor unchanged.
+    query = SearchQuery(
+        text,
+        config=settings.POST_SEARCH_CONFIG,
+        search_type="websearch",
+    )
+    return queryset.filter(search_vector=query).annotate(
+        rank=Cast(SearchRank(F("search_vector"), query), FloatField()),
+    )
@@ -1,6 +1,17 @@
+from collections import defaultdict
+from functools import partial
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import F, QuerySet, Window
+from django.db.models.functions import RowNumber
 from rest_framework import serializers
+from rest_framework.request import Request
 
-from .models import Comment, Like, Post, Tag
+from .concurrency import gather_blocking
+from .metrics import timed
+from .models import Comment, Like, Post, Tag, TagUsage
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -12,9 +23,26 @@ class TagSerializer(serializers.ModelSerializer):
 class CommentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Comment
-        fields = ["id", "post", "content", "created_at", "author"]
+        fields = ["id", "post", "parent", "content", "created_at", "author"]
         read_only_fields = ["created_at", "author"]
 
+    def get_extra_kwargs(self) -> dict:
+        # A comment stays on the post and under the parent it was created
+        # with; updates only change its content.
+        extra_kwargs = super().get_extra_kwargs()
+        if self.instance is not None:
+            for field in ("post", "parent"):
+                extra_kwargs.setdefault(field, {})["read_only"] = True
+        return extra_kwargs
+
+    def validate(self, attrs: dict) -> dict:
+        parent = attrs.get("parent")
+        if parent is not None and parent.post_id != attrs["post"].id:
+            raise serializers.ValidationError(
+                {"parent": "Replies must be on the same post as their parent."},
+            )
+        return attrs
+
 
 class LikeSerializer(serializers.ModelSerializer):
     class Meta:
@@ -23,9 +51,58 @@ class LikeSerializer(serializers.ModelSerializer):
         read_only_fields = ["user", "created_at"]
 
 
+class LikeActionSerializer(serializers.Serializer):
+    # Bounded by the bigint post id column.
+    post = serializers.IntegerField(min_value=1, max_value=2**63 - 1)
+    liked = serializers.BooleanField()
+
+
+class LikeBatchSerializer(serializers.Serializer):
+    actions = LikeActionSerializer(many=True, allow_empty=False, max_length=100)
+
+
+class PostSearchSerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=200)
+
+
+class PostEventsSerializer(serializers.Serializer):
+    post = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=100,
+        required=False,
+    )
+
+
+class StreamedImageField(serializers.ImageField):
+    def to_internal_value(self, data: File) -> File:
+        # Files from StreamingImageUploadHandler had their header checked
+        # while streaming, so skip Pillow's second full read of the file.
+        if getattr(data, "image_format", None):
+            return serializers.FileField.to_internal_value(self, data)
+        return super().to_internal_value(data)
+
+
+def absolute_url(url: str, request: Request | None) -> str:
+    return url if request is None else request.build_absolute_uri(url)
+
+
+def variant_urls(image_variants: dict, request: Request | None) -> dict:
+    return {
+        name: {
+            "url": absolute_url(default_storage.url(variant["name"]), request),
+            "width": variant["width"],
+            "height": variant["height"],
+        }
+        for name, variant in image_variants.items()
+    }
+
+
 class PostSerializer(serializers.ModelSerializer):
-    comments = CommentSerializer(many=True, read_only=True)
-    likes = LikeSerializer(many=True, read_only=True)
+    image = StreamedImageField()
+    image_variants = serializers.SerializerMethodField()
+    liked_by_me = serializers.BooleanField(read_only=True)
+    recent_comments = CommentSerializer(many=True, read_only=True)
     tags = TagSerializer(many=True, read_only=True)
     tag_names = serializers.ListField(
         child=serializers.CharField(max_length=50),
@@ -38,22 +115,247 @@ class PostSerializer(serializers.ModelSerializer):
         fields = [
             "id",
             "image",
+            "image_status",
+            "image_width",
+            "image_height",
+            "image_variants",
             "caption",
             "created_at",
             "author",
             "tags",
             "tag_names",
-            "likes",
-            "comments",
+            "like_count",
+            "comment_count",
+            "liked_by_me",
+            "recent_comments",
+        ]
+        read_only_fields = [
+            "author",
+            "image_status",
+            "image_width",
+            "image_height",
+            "like_count",
+            "comment_count",
         ]
-        read_only_fields = ["author"]
 
+    def get_image_variants(self, post: Post) -> dict:
+        return variant_urls(post.image_variants, self.context.get("request"))
+
+    def validate_tag_names(self, value: list[str]) -> list[str]:
+        return Tag.normalize_names(value)
+
+    @transaction.atomic
     def create(self, validated_data: dict) -> Post:
         tag_names = validated_data.pop("tag_names", [])
         post = Post.objects.create(**validated_data)
 
-        for tag_name in tag_names:
-            tag, created = Tag.objects.get_or_create(name=tag_name)
-            post.tags.add(tag)
+        tags = Tag.get_or_create_many(tag_names)
+        Post.tags.through.objects.bulk_create(
+            [Post.tags.through(post=post, tag=tag) for tag in tags],
+        )
+        TagUsage.record([tag.id for tag in tags], post.created_at)
 
         return post
+
+
+class PostImportSerializer(serializers.Serializer):
+    # One line of an ``import_posts`` manifest. The "post" lines of a
+    # history export have the same shape, so an export can be imported.
+    author = serializers.CharField(max_length=150, required=False)
+    caption = serializers.CharField(max_length=500)
+    image = serializers.CharField(max_length=255)
+    tags = serializers.ListField(
+        child=serializers.CharField(max_length=50),
+        required=False,
+        default=list,
+    )
+    created_at = serializers.DateTimeField(required=False)
+
+    def validate_tags(self, value: list[str]) -> list[str]:
+        return Tag.normalize_names(value)
+
+
+# Read-only counterparts of the serializers above for the hot list
+# endpoints. They build the same representation straight from
+# ``values_list()`` tuples, without per-field serializer dispatch; the
+# parity tests in posts/tests.py keep the two in step.
+datetime_field = serializers.DateTimeField()
+
+
+class RowSerializer:
+    # Subclasses name the ``fields`` they read and turn one row of them into
+    # a dict in a static ``to_representation(row)``.
+    fields: tuple[str, ...] = ()
+
+    @classmethod
+    def rows(cls, queryset: QuerySet) -> QuerySet:
+        return queryset.values_list(*cls.fields)
+
+    @classmethod
+    def many(cls, rows: list[tuple]) -> list[dict]:
+        with timed("serialize"):
+            return [cls.to_representation(row) for row in rows]
+
+
+class CommentReadSerializer(RowSerializer):
+    fields = ("id", "post_id", "parent_id", "content", "created_at", "author_id")
+
+    @staticmethod
+    def to_representation(row: tuple) -> dict:
+        comment_id, post_id, parent_id, content, created_at, author_id = row
+        return {
+            "id": comment_id,
+            "post": post_id,
+            "parent": parent_id,
+            "content": content,
+            "created_at": datetime_field.to_representation(created_at),
+            "author": author_id,
+        }
+
+    @classmethod
+    def replies_by_parent(
+        cls,
+        parent_ids: list[int],
+        limit: int,
+    ) -> dict[int, list[dict]]:
+        # The oldest ``limit`` replies of each parent in one query. The
+        # LATERAL subquery stops after ``limit`` rows of
+        # comment_parent_created_idx per parent, however long the thread is.
+        qn = connection.ops.quote_name
+        columns = ", ".join(f"c.{qn(field)}" for field in cls.fields)
+        replies = defaultdict(list)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT {columns} FROM unnest(%s::bigint[]) AS p(id) "  # noqa: S608
+                "CROSS JOIN LATERAL ("
+                f"SELECT * FROM {qn(Comment._meta.db_table)} "  # noqa: SLF001
+                "WHERE parent_id = p.id ORDER BY created_at, id LIMIT %s"
+                ") c ORDER BY c.created_at, c.id",
+                [parent_ids, limit],
+            )
+            for row in cursor.fetchall():
+                replies[row[2]].append(cls.to_representation(row))
+        return replies
+
+
+class LikeReadSerializer(RowSerializer):
+    fields = ("id", "post_id", "user_id", "created_at")
+
+    @staticmethod
+    def to_representation(row: tuple) -> dict:
+        like_id, post_id, user_id, created_at = row
+        return {
+            "id": like_id,
+            "post": post_id,
+            "user": user_id,
+            "created_at": datetime_field.to_representation(created_at),
+        }
+
+
+class PostReadSerializer:
+    fields = (
+        "id",
+        "image",
+        "image_status",
+        "image_width",
+        "image_height",
+        "image_variants",
+        "caption",
+        "created_at",
+        "author_id",
+        "like_count",
+        "comment_count",
+    )
+
+    def __init__(self, request: Request | None, recent_comments: int) -> None:
+        self.request = request
+        self.recent_comments = recent_comments
+        self.storage = Post._meta.get_field("image").storage  # noqa: SLF001
+
+    def serialize(self, post_ids: list[int]) -> list[dict]:
+        # Three queries for any number of posts: the post rows, their tags
+        # and the newest comments of each post. liked_by_me is viewer
+        # specific and always False here; callers overlay it.
+        return self.build(
+            self.post_rows(post_ids),
+            self.tags_by_post(post_ids),
+            self.comments_by_post(post_ids),
+        )
+
+    async def aserialize(self, post_ids: list[int]) -> list[dict]:
+        # The same three queries, run concurrently.
+        rows, tags, comments = await gather_blocking(
+            partial(self.post_rows, post_ids),
+            partial(self.tags_by_post, post_ids),
+            partial(self.comments_by_post, post_ids),
+        )
+        return self.build(rows, tags, comments)
+
+    def build(self, rows: list[tuple], tags: dict, comments: dict) -> list[dict]:
+        with timed("serialize"):
+            return [self.to_representation(row, tags, comments) for row in rows]
+
+    def post_rows(self, post_ids: list[int]) -> list[tuple]:
+        return list(Post.objects.filter(pk__in=post_ids).values_list(*self.fields))
+
+    def tags_by_post(self, post_ids: list[int]) -> dict[int, list[dict]]:
+        tags = defaultdict(list)
+        tag_rows = (
+            Post.tags.through.objects.filter(post_id__in=post_ids)
+            .order_by("tag_id")
+            .values_list("post_id", "tag_id", "tag__name")
+        )
+        for post_id, tag_id, name in tag_rows:
+            tags[post_id].append({"id": tag_id, "name": name})
+        return tags
+
+    def comments_by_post(self, post_ids: list[int]) -> dict[int, list[dict]]:
+        comments = defaultdict(list)
+        comment_rows = CommentReadSerializer.rows(
+            Comment.objects.filter(post_id__in=post_ids)
+            .annotate(
+                rank=Window(
+                    RowNumber(),
+                    partition_by=F("post_id"),
+                    order_by=(F("created_at").desc(), F("id").desc()),
+                ),
+            )
+            .filter(rank__lte=self.recent_comments)
+            .order_by("post_id", "rank"),
+        )
+        for row in comment_rows:
+            comments[row[1]].append(CommentReadSerializer.to_representation(row))
+        return comments
+
+    def to_representation(self, row: tuple, tags: dict, comments: dict) -> dict:
+        (
+            post_id,
+            image,
+            image_status,
+            image_width,
+            image_height,
+            image_variants,
+            caption,
+            created_at,
+            author_id,
+            like_count,
+            comment_count,
+        ) = row
+        return {
+            "id": post_id,
+            "image": (
+                absolute_url(self.storage.url(image), self.request) if image else None
+            ),
+            "image_status": image_status,
+            "image_width": image_width,
+            "image_height": image_height,
+            "image_variants": variant_urls(image_variants, self.request),
+            "caption": caption,
+            "created_at": datetime_field.to_representation(created_at),
+            "author": author_id,
+            "tags": tags.get(post_id, []),
+            "like_count": like_count,
+            "comment_count": comment_count,
+            "liked_by_me": False,
+            "recent_comments": comments.get(post_id, []),
+        }
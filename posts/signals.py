@@ -0,0 +1,65 @@
+from django.core.signals import setting_changed
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .events import get_broker
+from .metrics import install_query_timer
+from .models import ImageBlob, Post
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous_image(
+    sender: type[Post],
+    instance: Post,
+    update_fields: frozenset | None = None,
+    **kwargs: object,  # noqa: ARG001
+) -> None:
+    instance.previous_image_name = None
+    if instance._state.adding:  # noqa: SLF001
+        return
+    if update_fields is not None and "image" not in update_fields:
+        return
+    instance.previous_image_name = (
+        sender.objects.filter(pk=instance.pk).values_list("image", flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Post)
+def count_image_reference(
+    sender: type[Post],  # noqa: ARG001
+    instance: Post,
+    created: bool,  # noqa: FBT001
+    **kwargs: object,  # noqa: ARG001
+) -> None:
+    previous = instance.previous_image_name
+    if not created and previous in (None, instance.image.name):
+        return
+    ImageBlob.acquire(instance.image.name)
+    if previous:
+        ImageBlob.release(previous)
+
+
+@receiver(post_delete, sender=Post)
+def release_image_reference(
+    sender: type[Post],  # noqa: ARG001
+    instance: Post,
+    **kwargs: object,  # noqa: ARG001
+) -> None:
+    ImageBlob.release(instance.image.name)
+
+
+@receiver(setting_changed)
+def reset_event_broker(setting: str, **kwargs: object) -> None:  # noqa: ARG001
+    if setting == "POST_EVENTS_BROKER":
+        get_broker.cache_clear()
+
+
+@receiver(connection_created)
+def time_queries(
+    sender: type[BaseDatabaseWrapper],  # noqa: ARG001
+    connection: BaseDatabaseWrapper,
+    **kwargs: object,  # noqa: ARG001
+) -> None:
+    install_query_timer(connection)
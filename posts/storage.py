@@ -0,0 +1,67 @@
+import hashlib
+import os
+from contextlib import suppress
+from pathlib import PurePosixPath
+
+from django.apps import apps
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils import timezone
+
+
+def content_hash(content: File) -> str:
+    # StreamingImageUploadHandler already hashed the upload while it arrived.
+    digest = getattr(content, "sha256", None)
+    if digest:
+        return digest
+
+    sha256 = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        sha256.update(chunk)
+    content.seek(0)
+    return sha256.hexdigest()
+
+
+# Names every file after the SHA-256 of its bytes, sharded into two levels of
+# directories (``posts/ab/cd/abcd....png``). Saving bytes that are already
+# stored is a no-op that returns the existing name, so reposts share one file
+# and every URL can be cached forever. Files are shared between Post rows and
+# must only be deleted through the ``collect_post_images`` command.
+class ContentAddressedStorage(FileSystemStorage):
+    def _save(self, name: str, content: File) -> str:
+        path = PurePosixPath(name)
+        digest = content_hash(content)
+        extension = path.suffix.lower().replace(".jpeg", ".jpg")
+        name = str(path.parent / digest[:2] / digest[2:4] / f"{digest}{extension}")
+
+        # Reusing a file restarts its collection grace period first: the
+        # update waits for a collect_post_images run that holds the blob, so
+        # a file that run deleted is written again below.
+        self.touch(name)
+        if self.exists(name):
+            return name
+
+        # Written under a temporary name and linked into place, so the hashed
+        # name only ever holds complete files and a concurrent save of the
+        # same bytes loses the race harmlessly.
+        temporary = super()._save(f"{name}.tmp", content)
+        try:
+            os.link(self.path(temporary), self.path(name))
+        except FileExistsError:
+            self.touch(name)
+        finally:
+            self.delete(temporary)
+        return name
+
+    def touch(self, name: str) -> None:
+        # Files are collected by ImageBlob.updated_at, or by modification
+        # time when no blob tracks them.
+        image_blob = apps.get_model("posts", "ImageBlob")
+        image_blob.objects.filter(name=name).update(updated_at=timezone.now())
+        with suppress(FileNotFoundError):
+            os.utime(self.path(name))
+
+
+def post_image_storage() -> ContentAddressedStorage:
+    return ContentAddressedStorage()
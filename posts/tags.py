@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import TagUsage
+
+TRENDING_TAGS_KEY = "trending-tags"
+
+
+def trending_tags() -> list[dict]:
+    # Sums at most one TagUsage row per tag and bucket in the window, never
+    # the posts themselves, and shares the result between requests.
+    tags = cache.get(TRENDING_TAGS_KEY)
+    if tags is None:
+        since = TagUsage.bucket_start(timezone.now()) - settings.TRENDING_TAGS_WINDOW
+        usage = (
+            TagUsage.objects.filter(bucket__gt=since)
+            .values("tag_id", "tag__name")
+            .annotate(total=Sum("post_count"))
+            .order_by("-total", "tag__name")[: settings.TRENDING_TAGS_LIMIT]
+        )
+        tags = [
+            {"id": row["tag_id"], "name": row["tag__name"], "post_count": row["total"]}
+            for row in usage
+        ]
+        cache.set(TRENDING_TAGS_KEY, tags, settings.TRENDING_TAGS_CACHE_TIMEOUT)
+    return tags
@@ -0,0 +1,28 @@
+from collections.abc import Iterator
+from contextlib import contextmanager
+from unittest import TestCase
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+
+# Test case mixin: unlike assertNumQueries, a budget is an upper bound, so
+# endpoints that get cheaper keep passing and the ones that regress (an N+1
+# over the rows of a page) fail with the offending SQL.
+class QueryBudgetMixin(TestCase):
+    @contextmanager
+    def assertQueryBudget(  # noqa: N802
+        self,
+        budget: int,
+        using: str = DEFAULT_DB_ALIAS,
+    ) -> Iterator[CaptureQueriesContext]:
+        with CaptureQueriesContext(connections[using]) as context:
+            yield context
+        if len(context) > budget:
+            queries = "\n".join(
+                f"{index}. {query['sql']}"
+                for index, query in enumerate(context.captured_queries, start=1)
+            )
+            self.fail(
+                f"{len(context)} queries executed, budget is {budget}:\n{queries}",
+            )
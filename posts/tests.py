@@ -1,13 +1,86 @@
+import asyncio
+import base64
+import copy
+import hashlib
+import json
+import shutil
+import tarfile
+import tempfile
+import threading
 import time
-from pathlib import Path
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from datetime import UTC, datetime, timedelta
+from decimal import Decimal
+from importlib import import_module
+from inspect import iscoroutinefunction
+from io import BytesIO, StringIO
+from pathlib import Path, PurePosixPath
+from unittest.mock import patch
 
+from asgiref.sync import SyncToAsync, ThreadSensitiveContext, sync_to_async
+from django.apps import apps
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import StopFutureHandlers
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.models import Count, F, Prefetch, QuerySet, Sum
+from django.test import (
+    AsyncClient,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from PIL import Image
 from rest_framework import status
-from rest_framework.test import APIClient, APITestCase
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory, APITestCase
 from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
 
-from .models import Comment, Like, Post, Tag
+from . import concurrency, metrics
+from .events import KEEPALIVE_FRAME, RESET_FRAME, LocalBroker, get_broker
+from .images import process_post_image
+from .management.commands.benchmark_json import feed_page
+from .models import (
+    Comment,
+    ImageBlob,
+    Like,
+    Post,
+    Tag,
+    TagUsage,
+    TimelineEntry,
+)
+from .parsers import FastJSONParser
+from .renderers import FastJSONRenderer
+from .search import search_posts
+from .serializers import (
+    CommentReadSerializer,
+    CommentSerializer,
+    LikeReadSerializer,
+    LikeSerializer,
+    PostReadSerializer,
+    PostSerializer,
+)
+from .storage import ContentAddressedStorage, post_image_storage
+from .testing import QueryBudgetMixin
+from .uploadhandlers import StreamingImageUploadHandler
+from .views import (
+    RECENT_COMMENTS,
+    REPLY_PREVIEW,
+    LikeCreateView,
+    with_viewer_state,
+)
 
 User = get_user_model()
 
@@ -52,6 +125,1376 @@ class PostsListTests(TestCase):
         self.assertEqual(response_data["results"][1]["caption"], self.post1.caption)
 
 
+class PostCursorPaginationTests(APITestCase):
+    TEST_PASSWORD = "testpassword"
+
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(
+            username="testuser",
+            password=self.TEST_PASSWORD,
+        )
+        self.client.force_authenticate(user=self.user)
+        self.posts = Post.objects.bulk_create(
+            Post(
+                image="\\posts\\test_image1.png",
+                caption=f"Post {index}",
+                author=self.user,
+            )
+            for index in range(15)
+        )
+
+    def test_cursor_pages_cover_feed_in_order(self) -> None:
+        expected = list(
+            Post.objects.order_by("-created_at", "-id").values_list("id", flat=True),
+        )
+        url = "/api/posts/?cursor="
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn("count", response.data)
+            seen.extend(post["id"] for post in response.data["results"])
+            url = response.data["next"]
+
+        self.assertEqual(seen, expected)
+
+    def test_cursor_mode_skips_count_query(self) -> None:
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/posts/?cursor=")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(
+            any("__count" in query["sql"] for query in queries),
+        )
+
+    def test_invalid_cursor(self) -> None:
+        response = self.client.get("/api/posts/?cursor=not-a-cursor")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        for position in (["yesterday", 1], ["2026-10-18T10:00:00+00:00", "x"]):
+            cursor = base64.urlsafe_b64encode(json.dumps(position).encode())
+            for url in ("/api/posts/", "/api/feed/"):
+                response = self.client.get(url, {"cursor": cursor.decode()})
+                self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class PostSearchTests(APITestCase):
+    TEST_PASSWORD = "testpassword"
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="testuser",
+            password=self.TEST_PASSWORD,
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def create_post(self, caption: str, tag_names: list[str] | None = None) -> int:
+        img_path = Path("media/posts/test_image1.png")
+        with img_path.open("rb") as img_file:
+            data = {"caption": caption, "image": img_file}
+            if tag_names:
+                data["tag_names"] = tag_names
+            response = self.client.post("/api/posts/", data, format="multipart")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data["id"]
+
+    def search(self, query: str) -> list[int]:
+        response = self.client.get("/api/posts/search/", {"q": query})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [post["id"] for post in response.data["results"]]
+
+    def test_matches_caption_and_tags(self) -> None:
+        sunset = self.create_post("Sunset over the harbour", ["Travel"])
+        self.create_post("Breakfast", ["food"])
+
+        self.assertEqual(self.search("sunset"), [sunset])
+        self.assertEqual(self.search("travel"), [sunset])
+        self.assertEqual(self.search("sunset -travel"), [])
+
+    def test_comments_are_indexed_on_write(self) -> None:
+        post_id = self.create_post("Quiet morning")
+        response = self.client.post(
+            "/api/comments/",
+            {"post": post_id, "content": "Lovely lighthouse"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.search("lighthouse"), [post_id])
+
+        self.client.delete(f"/api/comments/{response.data['id']}/")
+        self.assertEqual(self.search("lighthouse"), [])
+
+    @override_settings(POST_SEARCH_MAX_COMMENTS=2)
+    def test_only_the_newest_comments_are_indexed(self) -> None:
+        post_id = self.create_post("Quiet morning")
+        for content in ("Lovely lighthouse", "Calm sea", "Early ferry"):
+            self.client.post(
+                "/api/comments/",
+                {"post": post_id, "content": content},
+                format="json",
+            )
+
+        self.assertEqual(self.search("lighthouse"), [])
+        self.assertEqual(self.search("sea"), [post_id])
+        self.assertEqual(self.search("ferry"), [post_id])
+
+    def test_caption_update_is_indexed(self) -> None:
+        post_id = self.create_post("Draft")
+        self.client.patch(
+            f"/api/posts/{post_id}/",
+            {"caption": "Mountain lake"},
+            format="multipart",
+        )
+
+        self.assertEqual(self.search("draft"), [])
+        self.assertEqual(self.search("mountain"), [post_id])
+
+    def test_caption_matches_rank_above_tag_matches(self) -> None:
+        tagged = self.create_post("Weekend", ["beach"])
+        captioned = self.create_post("Beach day")
+
+        self.assertEqual(self.search("beach"), [captioned, tagged])
+
+    def test_cursor_pages_cover_results_in_rank_order(self) -> None:
+        Post.objects.bulk_create(
+            Post(
+                image="\\posts\\test_image1.png",
+                caption="cat " * (index % 4 + 1),
+                author=self.user,
+            )
+            for index in range(15)
+        )
+        call_command("reindex_post_search", batch_size=4, stdout=StringIO())
+
+        url = "/api/posts/search/?q=cat"
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append([post["id"] for post in response.data["results"]])
+            url = response.data["next"]
+
+        expected = sorted(
+            Post.objects.values_list("id", "caption"),
+            key=lambda row: (row[1].count("cat"), row[0]),
+            reverse=True,
+        )
+        self.assertEqual(len(pages), 2)
+        seen = [post_id for page in pages for post_id in page]
+        self.assertEqual(seen, [post_id for post_id, _ in expected])
+
+    def test_query_is_required(self) -> None:
+        response = self.client.get("/api/posts/search/")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("q", response.data)
+
+
+class TagTests(APITestCase):
+    TEST_PASSWORD = "testpassword"
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="testuser",
+            password=self.TEST_PASSWORD,
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def create_post(self, caption: str, tag_names: list[str]) -> int:
+        img_path = Path("media/posts/test_image1.png")
+        with img_path.open("rb") as img_file:
+            data = {"caption": caption, "image": img_file, "tag_names": tag_names}
+            response = self.client.post("/api/posts/", data, format="multipart")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return response.data["id"]
+
+    def trending(self) -> list[tuple[str, int]]:
+        response = self.client.get("/api/tags/trending/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [(tag["name"], tag["post_count"]) for tag in response.data]
+
+    def test_tag_posts_newest_first_across_pages(self) -> None:
+        tagged = [
+            self.create_post(f"Trip {index}", ["new york"]) for index in range(12)
+        ]
+        self.create_post("Elsewhere", ["paris"])
+
+        url = "/api/tags/New%20York/posts/"
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(post["id"] for post in response.data["results"])
+            url = response.data["next"]
+
+        self.assertEqual(seen, tagged[::-1])
+
+    def test_tag_posts_skip_posts_deleted_meanwhile(self) -> None:
+        kept = self.create_post("Kept", ["rain"])
+        deleted = self.create_post("Deleted", ["rain"])
+        in_bulk = QuerySet.in_bulk
+
+        def delete_first(queryset: QuerySet, id_list: list[int]) -> dict:
+            # The post goes away between the page query and the post query.
+            Post.objects.filter(pk=deleted).delete()
+            return in_bulk(queryset, id_list)
+
+        with patch.object(QuerySet, "in_bulk", delete_first):
+            response = self.client.get("/api/tags/rain/posts/")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([post["id"] for post in response.data["results"]], [kept])
+
+    def test_unknown_tag(self) -> None:
+        response = self.client.get("/api/tags/nothing/posts/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_trending_counts_recent_posts_per_tag(self) -> None:
+        self.create_post("One", ["food", "travel"])
+        self.create_post("Two", ["travel"])
+        self.create_post("Three", ["travel", "art"])
+
+        self.assertEqual(
+            self.trending(),
+            [("travel", 3), ("art", 1), ("food", 1)],
+        )
+        self.assertEqual(TagUsage.objects.count(), 3)
+
+    def test_trending_ignores_buckets_outside_the_window(self) -> None:
+        self.create_post("Now", ["fresh"])
+        stale = Tag.objects.create(name="stale")
+        TagUsage.objects.create(
+            tag=stale,
+            bucket=timezone.now() - timedelta(days=2),
+            post_count=50,
+        )
+
+        self.assertEqual(self.trending(), [("fresh", 1)])
+
+        call_command("prune_tag_usage", stdout=StringIO())
+        self.assertQuerySetEqual(
+            TagUsage.objects.values_list("tag__name", flat=True),
+            ["fresh"],
+        )
+
+    def test_trending_is_cached(self) -> None:
+        self.create_post("One", ["food"])
+        self.trending()
+        self.create_post("Two", ["food"])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.trending(), [("food", 1)])
+
+    def test_migration_merges_tags_by_normalized_name(self) -> None:
+        capitalized, lower, spaced, blank = (
+            Tag.objects.create(name=name) for name in ("Cats", "cats", " CATS ", " ")
+        )
+        posts = [
+            Post.objects.create(image="posts/a.png", caption=caption, author=self.user)
+            for caption in ("Both", "Spaced", "Blank")
+        ]
+        posts[0].tags.set([capitalized, lower])
+        posts[1].tags.set([spaced])
+        posts[2].tags.set([blank])
+        bucket = TagUsage.bucket_start(timezone.now())
+        TagUsage.objects.bulk_create(
+            [
+                TagUsage(tag=capitalized, bucket=bucket, post_count=1),
+                TagUsage(tag=lower, bucket=bucket, post_count=1),
+                TagUsage(tag=spaced, bucket=bucket - timedelta(hours=1), post_count=1),
+            ],
+        )
+
+        import_module("posts.migrations.0019_normalize_tag_names").normalize_tags(
+            apps,
+            connection.schema_editor(),
+        )
+
+        self.assertQuerySetEqual(
+            Tag.objects.values_list("pk", "name"),
+            [(lower.pk, "cats")],
+        )
+        self.assertQuerySetEqual(
+            Post.objects.filter(tags=lower).order_by("pk"),
+            posts[:2],
+        )
+        self.assertFalse(posts[2].tags.exists())
+        self.assertEqual(
+            dict(TagUsage.objects.values_list("bucket", "post_count")),
+            {bucket: 2, bucket - timedelta(hours=1): 1},
+        )
+        self.assertEqual(
+            list(search_posts(Post.objects.order_by("pk"), "cats")),
+            posts[:2],
+        )
+
+
+class PostFeedRepresentationTests(APITestCase):
+    TEST_PASSWORD = "testpassword"
+
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(
+            username="testuser",
+            password=self.TEST_PASSWORD,
+        )
+        self.other_user = User.objects.create_user(
+            username="otheruser",
+            password=self.TEST_PASSWORD,
+        )
+        self.client.force_authenticate(user=self.user)
+        self.post = Post.objects.create(
+            image="\\posts\\test_image1.png",
+            caption="The content of the first post",
+            author=self.user,
+        )
+        self.comments = [
+            Comment.objects.create(
+                post=self.post,
+                content=f"Comment {index}",
+                author=self.other_user,
+            )
+            for index in range(5)
+        ]
+        self.like = Like.objects.create(post=self.post, user=self.user)
+        Like.objects.create(post=self.post, user=self.other_user)
+        call_command("reconcile_post_counters", stdout=StringIO())
+
+    def test_feed_exposes_counts_instead_of_child_rows(self) -> None:
+        response = self.client.get("/api/posts/")
+        post_data = response.json()["results"][0]
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("likes", post_data)
+        self.assertNotIn("comments", post_data)
+        self.assertEqual(post_data["like_count"], 2)
+        self.assertEqual(post_data["comment_count"], 5)
+        self.assertTrue(post_data["liked_by_me"])
+        self.assertEqual(
+            [comment["id"] for comment in post_data["recent_comments"]],
+            [comment.id for comment in reversed(self.comments[2:])],
+        )
+
+    def test_liked_by_me_is_per_user(self) -> None:
+        self.client.delete(f"/api/likes/{self.like.id}/")
+        response = self.client.get(f"/api/posts/{self.post.id}/")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.data["liked_by_me"])
+        self.assertEqual(response.data["like_count"], 1)
+
+    def test_likes_and_comments_sub_endpoints(self) -> None:
+        likes = self.client.get(f"/api/posts/{self.post.id}/likes/")
+        comments = self.client.get(f"/api/posts/{self.post.id}/comments/")
+
+        self.assertEqual(likes.status_code, status.HTTP_200_OK)
+        self.assertEqual(likes.data["count"], 2)
+        self.assertEqual(comments.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(comments.data["results"]), 5)
+
+    def test_sub_endpoint_unknown_post(self) -> None:
+        response = self.client.get("/api/posts/0/likes/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class PostCacheTests(APITestCase):
+    TEST_PASSWORD = "testpassword"
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="testuser",
+            password=self.TEST_PASSWORD,
+        )
+        self.client.force_authenticate(user=self.user)
+        self.posts = [
+            Post.objects.create(
+                image="\\posts\\test_image1.png",
+                caption=f"Post {index}",
+                author=self.user,
+            )
+            for index in range(3)
+        ]
+
+    def test_warm_page_is_assembled_from_cache(self) -> None:
+        with CaptureQueriesContext(connection) as cold:
+            first = self.client.get("/api/posts/")
+        with CaptureQueriesContext(connection) as warm:
+            second = self.client.get("/api/posts/")
+
+        self.assertEqual(first.json(), second.json())
+        # Page count, page of IDs and versions and the viewer's likes; no
+        # post rows, tags or comments are loaded again.
+        self.assertEqual(len(warm), 3)
+        self.assertLess(len(warm), len(cold))
+
+    def test_like_bumps_only_the_liked_post(self) -> None:
+        liked, untouched = self.posts[0], self.posts[1]
+        self.client.get("/api/posts/")
+
+        self.client.put(f"/api/posts/{liked.id}/like/")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/posts/")
+
+        by_id = {post["id"]: post for post in response.data["results"]}
+        self.assertEqual(by_id[liked.id]["like_count"], 1)
+        self.assertTrue(by_id[liked.id]["liked_by_me"])
+        self.assertEqual(by_id[untouched.id]["like_count"], 0)
+        post_table = Post._meta.db_table  # noqa: SLF001
+        reloaded = [
+            query["sql"]
+            for query in queries.captured_queries
+            if f'FROM "{post_table}"' in query["sql"] and "IN (" in query["sql"]
+        ]
+        self.assertEqual(len(reloaded), 1)
+        self.assertIn(f"IN ({liked.id})", reloaded[0])
+
+    def test_comment_refreshes_cached_detail(self) -> None:
+        post = self.posts[0]
+        self.client.get(f"/api/posts/{post.id}/")
+
+        self.client.post(
+            "/api/comments/",
+            {"post": post.id, "content": "Fresh comment"},
+            format="json",
+        )
+        response = self.client.get(f"/api/posts/{post.id}/")
+
+        self.assertEqual(response.data["comment_count"], 1)
+        self.assertEqual(
+            response.data["recent_comments"][0]["content"],
+            "Fresh comment",
+        )
+
+    def test_caption_edit_refreshes_cached_detail(self) -> None:
+        post = self.posts[0]
+        self.client.get(f"/api/posts/{post.id}/")
+
+        post.caption = "Edited"
+        post.save()
+        response = self.client.get(f"/api/posts/{post.id}/")
+
+        self.assertEqual(response.data["caption"], "Edited")
+
+    def test_deleted_post_is_not_served_from_cache(self) -> None:
+        post = self.posts[0]
+        self.client.get(f"/api/posts/{post.id}/")
+        post.delete()
+
+        response = self.client.get(f"/api/posts/{post.id}/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(ASYNC_QUERY_WORKERS=4)
+class AsyncReadViewTests(TransactionTestCase):
+    # Committed rows, so the pool threads' own connections can see them.
+    TEST_PASSWORD = "testpassword"
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="testuser",
+            password=self.TEST_PASSWORD,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+        self.post = Post.objects.create(
+            image="\\posts\\test_image1.png",
+            caption="Async",
+            author=self.user,
+        )
+        Comment.objects.create(post=self.post, content="First", author=self.user)
+        Like.objects.create(post=self.post, user=self.user)
+
+    def tearDown(self) -> None:
+        concurrency.shutdown_executor()
+
+    def test_read_views_are_async(self) -> None:
+        for path in (
+            "/api/posts/",
+            f"/api/posts/{self.post.id}/",
+            f"/api/posts/{self.post.id}/comments/",
+            f"/api/posts/{self.post.id}/likes/",
+            "/api/comments/",
+            "/api/likes/",
+            "/api/feed/",
+        ):
+            with self.subTest(path=path):
+                self.assertTrue(iscoroutinefunction(resolve(path).func))
+
+    @override_settings(
+        REQUEST_METRICS_SAMPLE_RATE=1,
+        REQUEST_METRICS_SERVER_TIMING=True,
+    )
+    def test_list_queries_run_concurrently_in_pool(self) -> None:
+        with patch.object(
+            concurrency,
+            "_run_in_pool",
+            wraps=concurrency._run_in_pool,  # noqa: SLF001
+        ) as run_in_pool:
+            response = self.client.get("/api/posts/")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        [post] = response.data["results"]
+        self.assertTrue(post["liked_by_me"])
+        self.assertEqual(
+            [comment["content"] for comment in post["recent_comments"]],
+            ["First"],
+        )
+        # Page, fragments and likes (2), cache miss (3), store.
+        self.assertEqual(run_in_pool.call_count, 7)
+        # Queries on the pool threads are counted against the request.
+        self.assertIn('desc="6 queries"', response["Server-Timing"])
+
+    def test_post_children_of_missing_post(self) -> None:
+        for path in ("comments", "likes"):
+            with self.subTest(path=path):
+                response = self.client.get(f"/api/posts/{self.post.id + 1}/{path}/")
+                self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        response = self.client.get(f"/api/posts/{self.post.id}/comments/")
+        self.assertEqual(len(response.data["results"]), 1)
+
+
+class RecordingBroker(LocalBroker):
+    # Keeps every published frame in addition to delivering it.
+    def __init__(self) -> None:
+        super().__init__()
+        self.published = []
+
+    def publish(self, post_id: int, frame: bytes) -> None:
+        self.published.append((post_id, frame))
+        super().publish(post_id, frame)
+
+
+@override_settings(POST_EVENTS_BROKER="posts.tests.RecordingBroker")
+class PostEventTests(APITestCase):
+    TEST_PASSWORD = "testpassword"
+
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(
+            username="testuser",
+            password=self.TEST_PASSWORD,
+        )
+        self.client.force_authenticate(user=self.user)
+        self.post = Post.objects.create(
+            image="\\posts\\test_image1.png",
+            caption="Live",
+            author=self.user,
+        )
+
+    def decode(self, frame: bytes) -> tuple[str, dict]:
+        event, data = frame.decode().strip().split("\n")
+        return event.removeprefix("event: "), json.loads(data.removeprefix("data: "))
+
+    def test_comment_and_like_are_published_on_commit(self) -> None:
+        broker = get_broker()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                "/api/comments/",
+                {"post": self.post.id, "content": "Nice"},
+                format="json",
+            )
+            self.client.post("/api/likes/", {"post": self.post.id}, format="json")
+            self.assertEqual(broker.published, [])
+
+        [(comment_post, comment), (like_post, like)] = broker.published
+        self.assertEqual((comment_post, like_post), (self.post.id, self.post.id))
+        name, data = self.decode(comment)
+        self.assertEqual(name, "comment")
+        self.assertEqual(data["content"], "Nice")
+        self.assertEqual(data["author"], self.user.id)
+        name, data = self.decode(like)
+        self.assertEqual(name, "like")
+        self.assertEqual(data["user"], self.user.id)
+
+    def test_only_changed_like_states_are_published(self) -> None:
+        broker = get_broker()
+        broker.published.clear()
+        other = Post.objects.create(
+            image="\\posts\\test_image1.png",
+            caption="Other",
+            author=self.user,
+        )
+        url = f"/api/posts/{self.post.id}/like/"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(url)
+            self.client.put(url)
+        [(post_id, frame)] = broker.published
+        name, data = self.decode(frame)
+        self.assertEqual((post_id, name), (self.post.id, "like"))
+        self.assertEqual(data, LikeSerializer(Like.objects.get()).data)
+
+        broker.published.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                "/api/likes/batch/",
+                {
+                    "actions": [
+                        {"post": self.post.id, "liked": False},
+                        {"post": other.id, "liked": False},
+                    ],
+                },
+                format="json",
+            )
+        [(post_id, frame)] = broker.published
+        self.assertEqual(post_id, self.post.id)
+        self.assertEqual(
+            self.decode(frame),
+            ("unlike", {"post": self.post.id, "user": self.user.id}),
+        )
+
+    async def test_broker_delivers_to_matching_subscriptions(self) -> None:
+        broker = LocalBroker()
+        everything = broker.subscribe()
+        watching = broker.subscribe([self.post.id])
+        other = broker.subscribe([self.post.id + 1])
+
+        broker.publish(self.post.id, b"a")
+        broker.publish(self.post.id, b"b")
+        self.assertEqual(await everything.next_frames(), [b"a", b"b"])
+        self.assertEqual(await watching.next_frames(), [b"a", b"b"])
+        self.assertEqual(list(other.frames), [])
+
+        broker.unsubscribe(watching)
+        broker.publish(self.post.id, b"c")
+        self.assertEqual(list(watching.frames), [])
+        self.assertEqual(await everything.next_frames(), [b"c"])
+
+    @override_settings(POST_EVENTS_BUFFER_SIZE=2)
+    async def test_slow_subscriber_is_reset(self) -> None:
+        broker = LocalBroker()
+        subscription = broker.subscribe()
+        for frame in (b"a", b"b", b"c"):
+            broker.publish(self.post.id, frame)
+
+        self.assertEqual(await subscription.next_frames(), [RESET_FRAME, b"b", b"c"])
+        broker.publish(self.post.id, b"d")
+        self.assertEqual(await subscription.next_frames(), [b"d"])
+
+    async def test_stream(self) -> None:
+        response = await AsyncClient().get(
+            "/api/posts/events/",
+            {"post": self.post.id},
+            headers={
+                "Accept": "text/event-stream",
+                "Authorization": f"Bearer {AccessToken.for_user(self.user)}",
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), KEEPALIVE_FRAME)
+        get_broker().publish(self.post.id + 1, b"other")
+        get_broker().publish(self.post.id, b"event: like\ndata: {}\n\n")
+        self.assertEqual(await anext(stream), b"event: like\ndata: {}\n\n")
+        await stream.aclose()
+        response.close()
+        self.assertEqual(get_broker()._by_post, {})  # noqa: SLF001
+
+    def test_stream_releases_the_request_thread(self) -> None:
+        # Guards the asgiref internals release_request_thread() relies on.
+        # Runs its own event loop: inside an async test sync code would run
+        # on the test's thread instead of a per-request one.
+        async def request() -> tuple[bool, bool]:
+            async with ThreadSensitiveContext():
+                await sync_to_async(threading.get_ident)()
+                context = SyncToAsync.thread_sensitive_context.get()
+                held = context in SyncToAsync.context_to_thread_executor
+                concurrency.release_request_thread()
+                return held, context in SyncToAsync.context_to_thread_executor
+
+        self.assertEqual(asyncio.run(request()), (True, False))
+
+    async def test_invalid_filter_is_an_error_event(self) -> None:
+        response = await AsyncClient().get(
+            "/api/posts/events/?post=abc",
+            headers={
+                "Accept": "text/event-stream",
+                "Authorization": f"Bearer {AccessToken.for_user(self.user)}",
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(response.content.startswith(b"event: error\ndata: "))
+
+    def test_stream_is_refused_under_wsgi(self) -> None:
+        response = self.client.get(
+            "/api/posts/events/",
+            HTTP_ACCEPT="text/event-stream",
+        )
+        self.assertEqual(response.status_code, status.HTTP_501_NOT_IMPLEMENTED)
+        self.assertTrue(response.content.startswith(b"event: error\ndata: "))
+
+
+@override_settings(REQUEST_METRICS_SAMPLE_RATE=1, REQUEST_METRICS_SERVER_TIMING=True)
+class RequestMetricsTests(APITestCase):
+    TEST_PASSWORD = "testpassword"
+
+    def setUp(self) -> None:
+        cache.clear()
+        metrics.reset()
+        self.user = User.objects.create_user(
+            username="testuser",
+            password=self.TEST_PASSWORD,
+        )
+        self.staff = User.objects.create_user(
+            username="staff",
+            password=self.TEST_PASSWORD,
+            is_staff=True,
+        )
+        self.client.force_authenticate(user=self.user)
+        Post.objects.create(
+            image="\\posts\\test_image1.png",
+            caption="Measured",
+            author=self.user,
+        )
+
+    def test_server_timing_header(self) -> None:
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/api/posts/")
+
+        timing = dict(
+            metric.strip().split(";", 1)
+            for metric in response["Server-Timing"].split(",")
+        )
+        self.assertEqual(set(timing), {"db", "serialize", "render", "total"})
+        self.assertIn(f'desc="{len(queries)} queries"', timing["db"])
+
+    def test_metrics_are_aggregated_per_route(self) -> None:
+        self.client.get("/api/posts/")
+        self.client.get("/api/posts/")
+        self.client.get("/api/feed/")
+
+        response = self.client.get("/api/metrics/")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(user=self.staff)
+        response = self.client.get("/api/metrics/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        posts = response.data["routes"]["GET post-list"]
+        self.assertEqual(posts["duration_ms"]["count"], 2)
+        self.assertEqual(posts["duration_ms"]["buckets"]["+Inf"], 2)
+        self.assertEqual(posts["queries"]["count"], 2)
+        self.assertGreater(posts["phase_ms_sum"]["db"], 0)
+        self.assertIn("GET feed-list", response.data["routes"])
+
+    @override_settings(REQUEST_METRICS_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_not_measured(self) -> None:
+        response = self.client.get("/api/posts/")
+
+        self.assertNotIn("Server-Timing", response)
+        self.assertEqual(metrics.snapshot(), {})
+
+    def test_histogram_buckets_are_cumulative(self) -> None:
+        histogram = metrics.Histogram((1, 10))
+        for value in (0, 1, 5, 50):
+            histogram.observe(value)
+
+        self.assertEqual(
+            histogram.as_dict(),
+            {"count": 4, "sum": 56, "buckets": {"1": 2, "10": 3, "+Inf": 4}},
+        )
+
+
+class QueryBudgetTests(QueryBudgetMixin, APITestCase):
+    # Budgets hold for any number of rows on the page.
+    TEST_PASSWORD = "testpassword"
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.user = User.objects.create_superuser(
+            username="admin",
+            password=self.TEST_PASSWORD,
+        )
+        self.client.force_authenticate(user=self.user)
+        tag = Tag.objects.create(name="budget")
+        authors = [
+            User.objects.create_user(
+                username=f"author{index}",
+                password=self.TEST_PASSWORD,
+            )
+            for index in range(5)
+        ]
+        for author in authors:
+            post = Post.objects.create(
+                image="\\posts\\test_image1.png",
+                caption=f"Post by {author.username}",
+                author=author,
+            )
+            post.tags.add(tag)
+        self.post = post
+        for author in authors:
+            comment = Comment.objects.create(
+                post=self.post,
+                content="Comment",
+                author=author,
+            )
+            Comment.objects.create(
+                post=self.post,
+                parent=comment,
+                content="Reply",
+                author=author,
+            )
+            Like.objects.create(post=self.post, user=author)
+
+    def test_api_endpoints(self) -> None:
+        for path, budget in (
+            ("/api/posts/", 7),
+            (f"/api/posts/{self.post.id}/", 2),
+            (f"/api/posts/{self.post.id}/comments/", 3),
+            (f"/api/posts/{self.post.id}/likes/", 3),
+            ("/api/comments/", 2),
+            ("/api/likes/", 2),
+            ("/api/tags/budget/posts/", 4),
+        ):
+            with self.subTest(path=path), self.assertQueryBudget(budget):
+                response = self.client.get(path)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_admin_changelists(self) -> None:
+        self.client.force_login(self.user)
+        for model in ("post", "comment", "like"):
+            with self.subTest(model=model), self.assertQueryBudget(5):
+                response = self.client.get(f"/admin/posts/{model}/")
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_exceeding_the_budget_fails(self) -> None:
+        with (
+            self.assertRaisesMessage(AssertionError, "2 queries executed, budget is 1"),
+            self.assertQueryBudget(1),
+        ):
+            User.objects.count()
+            Post.objects.count()
+
+
+class PostConditionalGetTests(APITestCase):
+    TEST_PASSWORD = "testpassword"
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="testuser",
+            password=self.TEST_PASSWORD,
+        )
+        self.other_user = User.objects.create_user(
+            username="otheruser",
+            password=self.TEST_PASSWORD,
+        )
+        self.client.force_authenticate(user=self.user)
+        self.post = Post.objects.create(
+            image="\\posts\\test_image1.png",
+            caption="The content of the first post",
+            author=self.user,
+        )
+
+    def revalidate(self, url: str) -> int:
+        etag = self.client.get(url)["ETag"]
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code
+
+    def test_unchanged_list_is_not_modified_without_serializing(self) -> None:
+        first = self.client.get("/api/posts/")
+
+        # The page count and the page's IDs and versions.
+        with self.assertNumQueries(2):
+            second = self.client.get("/api/posts/", HTTP_IF_NONE_MATCH=first["ETag"])
+
+        self.assertEqual(second.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(second["ETag"], first["ETag"])
+        self.assertFalse(second.content)
+        self.assertIn("private", first["Cache-Control"])
+
+    def test_list_changes_with_likes_and_new_posts(self) -> None:
+        etag = self.client.get("/api/posts/")["ETag"]
+        self.client.put(f"/api/posts/{self.post.id}/like/")
+        liked = self.client.get("/api/posts/", HTTP_IF_NONE_MATCH=etag)
+
+        Post.objects.create(
+            image="\\posts\\test_image1.png",
+            caption="Another post",
+            author=self.other_user,
+        )
+        posted = self.client.get("/api/posts/", HTTP_IF_NONE_MATCH=liked["ETag"])
+
+        self.assertEqual(liked.status_code, status.HTTP_200_OK)
+        self.assertEqual(posted.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(posted.data["results"]), 2)
+
+    def test_detail_is_revalidated_per_post_version(self) -> None:
+        url = f"/api/posts/{self.post.id}/"
+        self.assertEqual(self.revalidate(url), status.HTTP_304_NOT_MODIFIED)
+
+        etag = self.client.get(url)["ETag"]
+        self.client.post(
+            "/api/comments/",
+            {"post": self.post.id, "content": "New comment"},
+            format="json",
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["comment_count"], 1)
+
+    def test_writes_outside_views_change_the_etag(self) -> None:
+        # As a management command or another worker would write.
+        url = f"/api/posts/{self.post.id}/"
+        list_etag = self.client.get("/api/posts/")["ETag"]
+        detail_etag = self.client.get(url)["ETag"]
+        Post.objects.filter(pk=self.post.pk).update(like_count=5)
+
+        listed = self.client.get("/api/posts/", HTTP_IF_NONE_MATCH=list_etag)
+        detail = self.client.get(url, HTTP_IF_NONE_MATCH=detail_etag)
+
+        self.assertEqual(listed.status_code, status.HTTP_200_OK)
+        self.assertEqual(listed.data["results"][0]["like_count"], 5)
+        self.assertEqual(detail.status_code, status.HTTP_200_OK)
+        self.assertEqual(detail.data["like_count"], 5)
+
+    def test_etag_is_per_viewer(self) -> None:
+        url = f"/api/posts/{self.post.id}/"
+        etag = self.client.get(url)["ETag"]
+
+        self.client.force_authenticate(user=self.other_user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class FastJSONTests(APITestCase):
+    TEST_PASSWORD = "testpassword"
+
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(
+            username="testuser",
+            password=self.TEST_PASSWORD,
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def test_renderer_matches_stock_output(self) -> None:
+        data = {
+            **feed_page(5),
+            "price": Decimal("1.50"),
+            "label": gettext_lazy("Post not found."),
+            "caption": "line\u2028break",
+        }
+
+        fast = FastJSONRenderer().render(data)
+
+        self.assertEqual(json.loads(fast), json.loads(JSONRenderer().render(data)))
+        self.assertNotIn("\u2028".encode(), fast)
+
+    def test_parser_round_trip(self) -> None:
+        page = feed_page(3)
+        parsed = FastJSONParser().parse(BytesIO(FastJSONRenderer().render(page)))
+
+        self.assertEqual(parsed, page)
+
+    def test_api_uses_fast_renderer_and_parser(self) -> None:
+        listed = self.client.get("/api/posts/")
+        malformed = self.client.post(
+            "/api/comments/",
+            b'{"post": ',
+            content_type="application/json",
+        )
+
+        self.assertIsInstance(listed.accepted_renderer, FastJSONRenderer)
+        self.assertEqual(listed.json()["results"], [])
+        self.assertEqual(malformed.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("JSON parse error", malformed.json()["detail"])
+
+
+class ReadSerializerParityTests(APITestCase):
+    TEST_PASSWORD = "testpassword"
+
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(
+            username="testuser",
+            password=self.TEST_PASSWORD,
+        )
+        self.other_user = User.objects.create_user(
+            username="otheruser",
+            password=self.TEST_PASSWORD,
+        )
+        self.request = Request(APIRequestFactory().get("/api/posts/"))
+        self.request.user = self.user
+        tags = Tag.get_or_create_many(["city", "night", "rain"])
+        self.posts = [
+            Post.objects.create(
+                image="posts/ab/cd/abcd.png",
+                image_status=Post.ImageStatus.READY,
+                image_width=800,
+                image_height=600,
+                image_variants={
+                    "thumbnail": {
+                        "name": "posts/ab/cd/abcd_thumbnail.webp",
+                        "width": 320,
+                        "height": 240,
+                    },
+                },
+                caption="Night walk \u2728",
+                author=self.user,
+            ),
+            Post.objects.create(
+                image="\\posts\\test_image1.png",
+                caption="No tags, no comments",
+                author=self.other_user,
+            ),
+        ]
+        self.posts[0].tags.set(tags)
+        for index in range(5):
+            Comment.objects.create(
+                post=self.posts[0],
+                content=f"Comment {index}",
+                author=self.other_user,
+            )
+        Like.objects.create(post=self.posts[0], user=self.other_user)
+        call_command("reconcile_post_counters", stdout=StringIO())
+
+    def test_post_representation_matches_post_serializer(self) -> None:
+        post_ids = [post.id for post in self.posts]
+        queryset = with_viewer_state(
+            Post.objects.filter(pk__in=post_ids).order_by("id"),
+            self.user,
+        ).prefetch_related(Prefetch("tags", queryset=Tag.objects.order_by("id")))
+        expected = PostSerializer(
+            queryset,
+            many=True,
+            context={"request": self.request},
+        ).data
+
+        with self.assertNumQueries(3):
+            fast = PostReadSerializer(self.request, RECENT_COMMENTS).serialize(
+                post_ids,
+            )
+
+        self.assertEqual(
+            sorted(fast, key=lambda post: post["id"]),
+            json.loads(JSONRenderer().render(expected)),
+        )
+
+    def test_comment_and_like_representations_match(self) -> None:
+        comments = Comment.objects.order_by("id")
+        likes = Like.objects.order_by("id")
+
+        self.assertEqual(
+            CommentReadSerializer.many(CommentReadSerializer.rows(comments)),
+            CommentSerializer(comments, many=True).data,
+        )
+        self.assertEqual(
+            LikeReadSerializer.many(LikeReadSerializer.rows(likes)),
+            LikeSerializer(likes, many=True).data,
+        )
+
+    def test_list_endpoints_use_read_serializers(self) -> None:
+        self.client.force_authenticate(user=self.user)
+
+        comments = self.client.get("/api/comments/")
+        likes = self.client.get("/api/likes/")
+
+        self.assertEqual(comments.status_code, status.HTTP_200_OK)
+        self.assertEqual(comments.data["count"], 5)
+        self.assertEqual(
+            set(comments.data["results"][0]),
+            {"id", "post", "parent", "content", "created_at", "author"},
+        )
+        self.assertEqual(likes.status_code, status.HTTP_200_OK)
+        self.assertEqual(likes.data["results"][0]["user"], self.other_user.id)
+
+
+class DatabaseConnectionTests(TransactionTestCase):
+    def tearDown(self) -> None:
+        concurrency.shutdown_executor()
+
+    def allow_threaded_connections(self, *aliases: str) -> None:
+        # Aliases registered at run time, unknown when the test class was
+        # set up.
+        patcher = patch.object(
+            type(self),
+            "databases",
+            self.databases | set(aliases),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_benchmark_reports_each_mode(self) -> None:
+        modes = ("connect", "persistent", "pooled")
+        self.allow_threaded_connections(*(f"benchmark_{mode}" for mode in modes))
+        out = StringIO()
+        call_command(
+            "benchmark_db_connections",
+            requests=6,
+            concurrency=2,
+            queries=1,
+            stdout=out,
+        )
+        for mode in modes:
+            self.assertIn(f"\n{mode}: ", out.getvalue())
+            self.assertNotIn(f"benchmark_{mode}", connections.settings)
+
+    def test_async_query_threads_return_pooled_connections(self) -> None:
+        settings_dict = copy.deepcopy(connection.settings_dict)
+        settings_dict["OPTIONS"]["pool"] = {"min_size": 0, "max_size": 2}
+        connections.settings["pooled"] = settings_dict
+        self.allow_threaded_connections("pooled")
+        self.addCleanup(connections.settings.pop, "pooled")
+        pooled = connections["pooled"]
+        self.addCleanup(pooled.close_pool)
+
+        def query() -> BaseDatabaseWrapper:
+            with connections["pooled"].cursor() as cursor:
+                cursor.execute("SELECT 1")
+            return connections["pooled"]
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            thread_connection = executor.submit(
+                concurrency._run_in_pool,  # noqa: SLF001
+                query,
+            ).result()
+        self.assertIsNot(thread_connection, pooled)
+        self.assertIsNone(thread_connection.connection)
+        self.assertEqual(pooled.pool.get_stats()["pool_available"], 1)
+
+
+class BenchmarkCommandTests(TransactionTestCase):
+    # Committed rows, so the benchmark's request threads can see them.
+    def setUp(self) -> None:
+        cache.clear()
+        call_command(
+            "generate_benchmark_data",
+            users=6,
+            follows=3,
+            tags=4,
+            posts=30,
+            comments=20,
+            likes=40,
+            batch_size=7,
+            stdout=StringIO(),
+        )
+
+    def tearDown(self) -> None:
+        concurrency.shutdown_executor()
+
+    def test_generated_data_is_consistent(self) -> None:
+        self.assertEqual(User.objects.filter(username__startswith="bench").count(), 6)
+        self.assertEqual(Post.objects.count(), 30)
+        self.assertEqual(Comment.objects.count(), 20)
+        self.assertFalse(
+            Comment.objects.exclude(parent=None)
+            .exclude(parent__post=F("post"))
+            .exists(),
+        )
+        self.assertFalse(
+            Post.objects.annotate(likes_total=Count("likes"))
+            .exclude(like_count=F("likes_total"))
+            .exists(),
+        )
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=F("post__author")).count(),
+            30,
+        )
+        self.assertEqual(
+            TagUsage.objects.aggregate(total=Sum("post_count"))["total"],
+            Post.tags.through.objects.count(),
+        )
+        with self.assertRaisesMessage(CommandError, "exist already"):
+            call_command("generate_benchmark_data", stdout=StringIO())
+
+    def test_baseline_round_trip(self) -> None:
+        baseline = Path(tempfile.mkdtemp()) / "baseline.json"
+        self.addCleanup(shutil.rmtree, baseline.parent)
+        options = {"iterations": 3, "concurrency": 2, "users": 3, "stdout": StringIO()}
+        call_command(
+            "benchmark_api",
+            "feed_scroll",
+            "like_storm",
+            save=baseline,
+            **options,
+        )
+
+        saved = json.loads(baseline.read_text())
+        feed = saved["scenarios"]["feed_scroll"]["GET feed"]
+        self.assertEqual(feed["statuses"], {"200": feed["requests"]})
+        self.assertGreater(feed["max_queries"], 0)
+        likes = saved["scenarios"]["like_storm"]
+        self.assertEqual(likes["POST like"]["statuses"], {"201": 3})
+        self.assertEqual(likes["DELETE like"]["statuses"], {"204": 3})
+        self.assertEqual(
+            Like.objects.count(),
+            sum(Post.objects.values_list("like_count", flat=True)),
+        )
+
+        # Each run starts cold, as a fresh process would. A few requests give
+        # no stable latency, so only the query counts are held to the baseline.
+        options["tolerance"] = 100
+        cache.clear()
+        call_command("benchmark_api", "feed_scroll", compare=baseline, **options)
+        feed["max_queries"] -= 1
+        baseline.write_text(json.dumps(saved))
+        cache.clear()
+        with self.assertRaisesMessage(CommandError, "feed_scroll GET feed: up to"):
+            call_command("benchmark_api", "feed_scroll", compare=baseline, **options)
+
+
+class PostCounterTests(APITestCase):
+    TEST_PASSWORD = "testpassword"
+
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(
+            username="testuser",
+            password=self.TEST_PASSWORD,
+        )
+        self.client.force_authenticate(user=self.user)
+        self.post = Post.objects.create(
+            image="\\posts\\test_image1.png",
+            caption="The content of the first post",
+            author=self.user,
+        )
+
+    def test_like_and_unlike_update_like_count(self) -> None:
+        response = self.client.post(
+            "/api/likes/",
+            {"post": self.post.id},
+            format="json",
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+
+        self.client.delete(f"/api/likes/{response.data['id']}/")
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+
+    def test_deleting_an_already_deleted_like_keeps_like_count(self) -> None:
+        response = self.client.post(
+            "/api/likes/",
+            {"post": self.post.id},
+            format="json",
+        )
+        stale = Like.objects.get(pk=response.data["id"])
+        self.client.delete(f"/api/likes/{stale.id}/")
+
+        LikeCreateView().perform_destroy(stale)
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+
+    def test_comment_create_and_delete_update_comment_count(self) -> None:
+        response = self.client.post(
+            "/api/comments/",
+            {"post": self.post.id, "content": "Nice!"},
+            format="json",
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+
+        self.client.delete(f"/api/comments/{response.data['id']}/")
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
+
+    def test_reconcile_command_fixes_drift(self) -> None:
+        Comment.objects.create(post=self.post, content="Hi", author=self.user)
+        Post.objects.filter(pk=self.post.pk).update(like_count=7)
+        out = StringIO()
+
+        call_command("reconcile_post_counters", stdout=out)
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+        self.assertEqual(self.post.comment_count, 1)
+        self.assertIn("Reconciled 1 post(s).", out.getvalue())
+
+
+class LikeToggleTests(APITestCase):
+    TEST_PASSWORD = "testpassword"
+
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(
+            username="testuser",
+            password=self.TEST_PASSWORD,
+        )
+        self.client.force_authenticate(user=self.user)
+        self.post1 = Post.objects.create(
+            image="\\posts\\test_image1.png",
+            caption="The content of the first post",
+            author=self.user,
+        )
+        self.post2 = Post.objects.create(
+            image="\\posts\\test_image2.jpg",
+            caption="The content of the second post",
+            author=self.user,
+        )
+        self.url = f"/api/posts/{self.post1.id}/like/"
+
+    def test_like_is_idempotent(self) -> None:
+        self.client.put(self.url)
+        response = self.client.put(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data,
+            {"post": self.post1.id, "liked": True, "like_count": 1},
+        )
+        self.assertEqual(Like.objects.count(), 1)
+
+    def test_unlike_is_idempotent(self) -> None:
+        self.client.put(self.url)
+        self.client.delete(self.url)
+        response = self.client.delete(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data,
+            {"post": self.post1.id, "liked": False, "like_count": 0},
+        )
+        self.assertEqual(Like.objects.count(), 0)
+
+    def test_like_unknown_post(self) -> None:
+        response = self.client.put("/api/posts/0/like/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(Like.objects.count(), 0)
+
+    def test_batch_applies_last_action_per_post(self) -> None:
+        data = {
+            "actions": [
+                {"post": self.post1.id, "liked": True},
+                {"post": self.post2.id, "liked": True},
+                {"post": self.post1.id, "liked": False},
+                {"post": 999999, "liked": True},
+            ],
+        }
+        response = self.client.post("/api/likes/batch/", data, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data["results"],
+            [
+                {"post": self.post1.id, "liked": False, "like_count": 0},
+                {"post": self.post2.id, "liked": True, "like_count": 1},
+                {"post": 999999, "detail": "Post not found."},
+            ],
+        )
+        self.assertEqual(
+            list(Like.objects.values_list("post_id", flat=True)),
+            [self.post2.id],
+        )
+
+    def test_batch_requires_actions(self) -> None:
+        response = self.client.post(
+            "/api/likes/batch/",
+            {"actions": []},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_batch_rejects_ids_beyond_bigint(self) -> None:
+        response = self.client.post(
+            "/api/likes/batch/",
+            {"actions": [{"post": 2**63, "liked": True}]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
 class PostCreateViewTest(APITestCase):
     TEST_PASSWORD = "testpassword"
 
@@ -60,48 +1503,887 @@ class PostCreateViewTest(APITestCase):
             username="testuser",
             password=self.TEST_PASSWORD,
         )
-        refresh = RefreshToken.for_user(self.user)
-        self.access_token = str(refresh.access_token)
-        self.client.credentials(HTTP_AUTHORIZATION="Bearer " + self.access_token)
-        self.url = "/api/posts/"
+        refresh = RefreshToken.for_user(self.user)
+        self.access_token = str(refresh.access_token)
+        self.client.credentials(HTTP_AUTHORIZATION="Bearer " + self.access_token)
+        self.url = "/api/posts/"
+
+    def tearDown(self) -> None:
+        Post.objects.all().delete()
+        User.objects.all().delete()
+
+    def test_create_post_authenticated(self) -> None:
+        img_path = Path("media/posts/test_image1.png")
+        with img_path.open("rb") as img_file:
+            data = {"caption": "Test post authenticated", "image": img_file}
+            response = self.client.post(self.url, data, format="multipart")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertEqual(Post.objects.get().caption, "Test post authenticated")
+
+    def test_create_post_unauthenticated(self) -> None:
+        self.client.credentials()
+        img_path = Path("media/posts/test_image1.png")
+        with img_path.open("rb") as img_file:
+            data = {"caption": "Test post authenticated", "image": img_file}
+            response = self.client.post(self.url, data, format="multipart")
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(Post.objects.count(), 0)
+
+    def test_create_post_with_tags(self) -> None:
+        img_path = Path("media/posts/test_image1.png")
+        with img_path.open("rb") as img_file:
+            data = {
+                "caption": "Test post authenticated",
+                "image": img_file,
+                "tag_names": ["test", "tag"],
+            }
+            response = self.client.post(self.url, data, format="multipart")
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertEqual(Tag.objects.count(), 2)
+
+    def test_create_post_rejects_non_image(self) -> None:
+        fake_image = SimpleUploadedFile("fake.png", b"not an image" * 1000)
+        data = {"caption": "Fake", "image": fake_image}
+        response = self.client.post(self.url, data, format="multipart")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("image", response.data)
+        self.assertEqual(Post.objects.count(), 0)
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=1000)
+    def test_create_post_rejects_too_many_pixels(self) -> None:
+        img_path = Path("media/posts/test_image1.png")
+        with img_path.open("rb") as img_file:
+            data = {"caption": "Too big", "image": img_file}
+            response = self.client.post(self.url, data, format="multipart")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["image"], ["The image has too many pixels."])
+        self.assertEqual(Post.objects.count(), 0)
+
+    def test_upload_handler_streams_hash_and_dimensions(self) -> None:
+        content = Path("media/posts/test_image1.png").read_bytes()
+        handler = StreamingImageUploadHandler()
+        handler.chunk_size = 1024
+        with suppress(StopFutureHandlers):
+            handler.new_file("image", "photo.png", "image/png", len(content))
+        for start in range(0, len(content), handler.chunk_size):
+            handler.receive_data_chunk(content[start : start + 1024], start)
+
+        uploaded = handler.file_complete(len(content))
+
+        self.assertEqual(uploaded.sha256, hashlib.sha256(content).hexdigest())
+        self.assertEqual(
+            (uploaded.image_format, uploaded.image_width, uploaded.image_height),
+            ("PNG", 1198, 571),
+        )
+        self.assertEqual(uploaded.read(), content)
+        uploaded.close()
+
+    def test_create_post_normalizes_tag_names(self) -> None:
+        Tag.objects.create(name="travel")
+        img_path = Path("media/posts/test_image1.png")
+        with img_path.open("rb") as img_file:
+            data = {
+                "caption": "Test post authenticated",
+                "image": img_file,
+                "tag_names": [" Travel ", "TRAVEL", "New   York", "new york"],
+            }
+            response = self.client.post(self.url, data, format="multipart")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            sorted(Tag.objects.values_list("name", flat=True)),
+            ["new york", "travel"],
+        )
+        self.assertEqual(Post.objects.get().tags.count(), 2)
+
+    def test_create_post_tag_queries_do_not_grow_with_tag_count(self) -> None:
+        def queries_for(tag_names: list[str]) -> int:
+            img_path = Path("media/posts/test_image1.png")
+            with (
+                img_path.open("rb") as img_file,
+                CaptureQueriesContext(
+                    connection,
+                ) as queries,
+            ):
+                data = {"caption": "Tagged", "image": img_file, "tag_names": tag_names}
+                response = self.client.post(self.url, data, format="multipart")
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+            return len(queries)
+
+        few = queries_for(["one", "two"])
+        many = queries_for([f"tag{index}" for index in range(20)])
+        self.assertEqual(few, many)
+
+
+class PostImageProcessingTests(APITestCase):
+    TEST_PASSWORD = "testpassword"
+
+    def setUp(self) -> None:
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.user = User.objects.create_user(
+            username="testuser",
+            password=self.TEST_PASSWORD,
+        )
+        self.client.force_authenticate(user=self.user)
 
     def tearDown(self) -> None:
-        Post.objects.all().delete()
-        User.objects.all().delete()
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
 
-    def test_create_post_authenticated(self) -> None:
+    def create_post(self) -> Post:
+        image = SimpleUploadedFile(
+            "photo.png",
+            Path("media/posts/test_image1.png").read_bytes(),
+            content_type="image/png",
+        )
+        return Post.objects.create(image=image, caption="Photo", author=self.user)
+
+    def test_process_post_image_generates_variants(self) -> None:
+        post = self.create_post()
+
+        process_post_image(post.id)
+
+        post.refresh_from_db()
+        self.assertEqual(post.image_status, Post.ImageStatus.READY)
+        self.assertEqual((post.image_width, post.image_height), (1198, 571))
+        self.assertEqual(set(post.image_variants), {"thumbnail", "feed", "full"})
+        thumbnail = post.image_variants["thumbnail"]
+        self.assertEqual((thumbnail["width"], thumbnail["height"]), (320, 153))
+        self.assertTrue((Path(self.media_root) / thumbnail["name"]).exists())
+
+        response = self.client.get(f"/api/posts/{post.id}/")
+        feed_name = post.image.name.replace(".png", "_feed.webp")
+        self.assertEqual(
+            response.data["image_variants"]["feed"]["url"],
+            f"http://testserver/media/{feed_name}",
+        )
+
+    def test_process_post_image_reuses_variants_of_identical_image(self) -> None:
+        first = self.create_post()
+        process_post_image(first.id)
+        second = self.create_post()
+
+        process_post_image(second.id)
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(second.image_status, Post.ImageStatus.READY)
+        self.assertEqual(second.image_variants, first.image_variants)
+
+    def test_stored_variants_are_never_rewritten(self) -> None:
+        first = self.create_post()
+        process_post_image(first.id)
+        first.refresh_from_db()
+        feed = Path(self.media_root) / first.image_variants["feed"]["name"]
+        content = feed.read_bytes()
+        second = self.create_post()
+        first.delete()
+
+        with override_settings(POST_IMAGE_QUALITY=10):
+            process_post_image(second.id)
+
+        second.refresh_from_db()
+        self.assertEqual(second.image_variants, first.image_variants)
+        self.assertEqual(feed.read_bytes(), content)
+
+    def test_process_post_image_marks_broken_files_failed(self) -> None:
+        post = Post.objects.create(
+            image=SimpleUploadedFile("broken.png", b"not an image"),
+            caption="Broken",
+            author=self.user,
+        )
+
+        with self.assertLogs("posts.images", level="ERROR"):
+            process_post_image(post.id)
+
+        post.refresh_from_db()
+        self.assertEqual(post.image_status, Post.ImageStatus.FAILED)
+
+    def test_create_post_schedules_processing_after_commit(self) -> None:
         img_path = Path("media/posts/test_image1.png")
-        with img_path.open("rb") as img_file:
-            data = {"caption": "Test post authenticated", "image": img_file}
-            response = self.client.post(self.url, data, format="multipart")
+        with (
+            img_path.open("rb") as img_file,
+            self.captureOnCommitCallbacks() as callbacks,
+        ):
+            data = {"caption": "Test post", "image": img_file}
+            response = self.client.post("/api/posts/", data, format="multipart")
 
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
-        self.assertEqual(Post.objects.count(), 1)
-        self.assertEqual(Post.objects.get().caption, "Test post authenticated")
+        self.assertEqual(response.data["image_status"], Post.ImageStatus.PENDING)
+        self.assertEqual(len(callbacks), 1)
 
-    def test_create_post_unauthenticated(self) -> None:
-        self.client.credentials()
-        img_path = Path("media/posts/test_image1.png")
-        with img_path.open("rb") as img_file:
-            data = {"caption": "Test post authenticated", "image": img_file}
-            response = self.client.post(self.url, data, format="multipart")
+    def test_image_change_restarts_processing(self) -> None:
+        post = self.create_post()
+        process_post_image(post.id)
+        previous = post.image.name
+        buffer = BytesIO()
+        Image.new("RGB", (40, 30), "teal").save(buffer, format="PNG")
+        image = SimpleUploadedFile("new.png", buffer.getvalue())
 
-        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
-        self.assertEqual(Post.objects.count(), 0)
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.patch(
+                f"/api/posts/{post.id}/",
+                {"image": image},
+                format="multipart",
+            )
 
-    def test_create_post_with_tags(self) -> None:
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["image_status"], Post.ImageStatus.PENDING)
+        self.assertEqual(response.data["image_variants"], {})
+        self.assertEqual(len(callbacks), 1)
+        post.refresh_from_db()
+        self.assertEqual(post.image_width, None)
+        self.assertEqual(ImageBlob.objects.get(name=previous).ref_count, 0)
+        self.assertEqual(ImageBlob.objects.get(name=post.image.name).ref_count, 1)
+
+
+class ContentAddressedStorageTests(APITestCase):
+    TEST_PASSWORD = "testpassword"
+
+    def setUp(self) -> None:
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.user = User.objects.create_user(
+            username="testuser",
+            password=self.TEST_PASSWORD,
+        )
+        self.client.force_authenticate(user=self.user)
+        self.content = Path("media/posts/test_image1.png").read_bytes()
+
+    def tearDown(self) -> None:
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def upload(self) -> Post:
+        data = {
+            "caption": "Repost",
+            "image": SimpleUploadedFile("photo.PNG", self.content),
+        }
+        response = self.client.post("/api/posts/", data, format="multipart")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return Post.objects.get(pk=response.data["id"])
+
+    def test_identical_uploads_share_one_hashed_file(self) -> None:
+        digest = hashlib.sha256(self.content).hexdigest()
+
+        first, second = self.upload(), self.upload()
+
+        expected = f"posts/{digest[:2]}/{digest[2:4]}/{digest}.png"
+        self.assertEqual(first.image.name, expected)
+        self.assertEqual(second.image.name, expected)
+        self.assertEqual(len(list(Path(self.media_root).rglob("*.png"))), 1)
+        self.assertEqual(ImageBlob.objects.get(name=expected).ref_count, 2)
+
+    def test_saving_stored_bytes_restarts_the_grace_period(self) -> None:
+        post = self.upload()
+        post.delete()
+        ImageBlob.objects.update(updated_at=timezone.now() - timedelta(days=2))
+
+        name = post_image_storage().save("posts/again.png", ContentFile(self.content))
+        call_command("collect_post_images", grace_hours=24, stdout=StringIO())
+
+        self.assertEqual(name, post.image.name)
+        self.assertTrue((Path(self.media_root) / name).exists())
+
+    def test_concurrent_save_of_the_same_bytes_keeps_the_hashed_name(self) -> None:
+        post = self.upload()
+        storage = post_image_storage()
+
+        # Another save wins between the existence check and the link.
+        with patch.object(ContentAddressedStorage, "exists", return_value=False):
+            name = storage.save("posts/again.png", ContentFile(self.content))
+
+        self.assertEqual(name, post.image.name)
+        self.assertEqual(
+            [path.name for path in Path(self.media_root).rglob("*.*")],
+            [PurePosixPath(name).name],
+        )
+
+    def test_collect_post_images_removes_unreferenced_files(self) -> None:
+        first, second = self.upload(), self.upload()
+        path = Path(self.media_root) / first.image.name
+        (path.parent / f"{path.stem}_feed.webp").write_bytes(b"variant")
+
+        first.delete()
+        call_command("collect_post_images", grace_hours=0, stdout=StringIO())
+        self.assertTrue(path.exists())
+
+        second.delete()
+        self.assertEqual(ImageBlob.objects.get(name=first.image.name).ref_count, 0)
+        call_command("collect_post_images", grace_hours=0, stdout=StringIO())
+        self.assertFalse(path.exists())
+        self.assertEqual(list(path.parent.iterdir()), [])
+        self.assertFalse(ImageBlob.objects.exists())
+
+    def test_collect_post_images_keeps_legacy_names_sharing_a_stem(self) -> None:
+        directory = Path(self.media_root) / "posts"
+        directory.mkdir()
+        for name in ("photo.png", "photo_AbC1234.png", "photo_feed.webp"):
+            (directory / name).write_bytes(self.content)
+        ImageBlob.objects.create(name="posts/photo.png")
+
+        call_command("collect_post_images", grace_hours=0, stdout=StringIO())
+
+        self.assertEqual(
+            [path.name for path in directory.iterdir()],
+            ["photo_AbC1234.png"],
+        )
+
+    def test_collect_post_images_scan_removes_untracked_files(self) -> None:
+        post = self.upload()
+        path = Path(self.media_root) / post.image.name
+        Post.objects.filter(pk=post.pk).delete()
+        ImageBlob.objects.all().delete()
+
+        call_command(
+            "collect_post_images",
+            grace_hours=0,
+            scan=True,
+            stdout=StringIO(),
+        )
+
+        self.assertFalse(path.exists())
+
+
+class PostImportExportTests(APITestCase):
+    TEST_PASSWORD = "testpassword"
+
+    def setUp(self) -> None:
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.source = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.source)
+        self.user = User.objects.create_user(
+            username="importer",
+            password=self.TEST_PASSWORD,
+        )
+        self.client.force_authenticate(user=self.user)
+        self.content = Path("media/posts/test_image1.png").read_bytes()
+        (self.source / "images").mkdir()
+        (self.source / "images" / "photo.png").write_bytes(self.content)
+
+    def tearDown(self) -> None:
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def write_manifest(self, posts: list[dict]) -> Path:
+        path = self.source / "posts.ndjson"
+        path.write_text("".join(json.dumps(post) + "\n" for post in posts))
+        return path
+
+    def import_posts(self, path: Path, **options: object) -> str:
+        out = StringIO()
+        call_command("import_posts", str(path), batch_size=2, stdout=out, **options)
+        return out.getvalue()
+
+    def test_import_writes_posts_tags_and_references(self) -> None:
+        path = self.write_manifest(
+            [
+                {
+                    "author": "importer",
+                    "caption": "Lake at dawn",
+                    "image": "images/photo.png",
+                    "tags": ["Sunset ", "lake", "lake"],
+                    "created_at": "2024-05-01T10:00:00Z",
+                },
+                {"caption": "Second", "image": "images/photo.png", "tags": ["lake"]},
+                {"caption": "Third", "image": "images/photo.png"},
+            ],
+        )
+        self.import_posts(path, author="importer")
+
+        posts = Post.objects.filter(author=self.user).order_by("id")
+        self.assertEqual(posts.count(), 3)
+        first = posts[0]
+        self.assertEqual(first.created_at, datetime(2024, 5, 1, 10, tzinfo=UTC))
+        self.assertEqual(first.image_status, Post.ImageStatus.PENDING)
+        self.assertEqual(
+            sorted(first.tags.values_list("name", flat=True)),
+            ["lake", "sunset"],
+        )
+        self.assertEqual(ImageBlob.objects.get(name=first.image.name).ref_count, 3)
+        self.assertEqual(len(list(Path(self.media_root).rglob("*.png"))), 1)
+        self.assertEqual(
+            TagUsage.objects.aggregate(total=Sum("post_count"))["total"],
+            3,
+        )
+        self.assertEqual(TimelineEntry.objects.filter(user=self.user).count(), 3)
+        response = self.client.get("/api/posts/search/", {"q": "dawn"})
+        self.assertEqual(
+            [post["id"] for post in response.data["results"]],
+            [first.id],
+        )
+
+    def test_import_resumes_after_last_committed_batch(self) -> None:
+        posts = [
+            {"author": "importer", "caption": f"Post {n}", "image": "images/photo.png"}
+            for n in range(3)
+        ]
+        posts[2]["image"] = "images/missing.png"
+        path = self.write_manifest(posts)
+        with self.assertRaisesMessage(CommandError, "images/missing.png"):
+            self.import_posts(path)
+        self.assertEqual(Post.objects.count(), 2)
+
+        posts[2]["image"] = "images/photo.png"
+        path = self.write_manifest(posts)
+        out = self.import_posts(path)
+        self.assertIn("Resuming after 2 post(s)", out)
+        self.assertEqual(
+            list(Post.objects.order_by("id").values_list("caption", flat=True)),
+            ["Post 0", "Post 1", "Post 2"],
+        )
+        self.assertIn("Imported 0 post(s), 3", self.import_posts(path))
+
+    def test_import_rejects_paths_outside_the_image_directory(self) -> None:
+        path = self.write_manifest(
+            [{"author": "importer", "caption": "Escape", "image": "../etc/passwd"}],
+        )
+        with self.assertRaisesMessage(CommandError, "Cannot read image"):
+            self.import_posts(path, images=self.source / "images")
+        self.assertFalse(Post.objects.exists())
+
+    def test_import_reads_tar_archive(self) -> None:
+        manifest = json.dumps(
+            {"author": "importer", "caption": "From tar", "image": "photo.png"},
+        ).encode()
+        archive = self.source / "posts.tar.gz"
+        with tarfile.open(archive, "w:gz") as tar:
+            for name, content in (
+                ("posts.ndjson", manifest),
+                ("photo.png", self.content),
+            ):
+                info = tarfile.TarInfo(name)
+                info.size = len(content)
+                tar.addfile(info, BytesIO(content))
+
+        self.import_posts(archive)
+        self.assertEqual(Post.objects.get().caption, "From tar")
+
+    def test_export_streams_history_that_imports_back(self) -> None:
+        path = self.write_manifest(
+            [
+                {
+                    "author": "importer",
+                    "caption": f"Post {n}",
+                    "image": "images/photo.png",
+                    "tags": ["lake"],
+                }
+                for n in range(3)
+            ],
+        )
+        self.import_posts(path)
+        post = Post.objects.order_by("id").first()
+        Comment.objects.create(post=post, author=self.user, content="Nice")
+        Like.objects.create(post=post, user=self.user)
+
+        with patch("posts.exports.EXPORT_CHUNK_ROWS", 2):
+            response = self.client.get("/api/posts/export/")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response["Content-Type"], "application/x-ndjson")
+            chunks = list(response.streaming_content)
+        self.assertEqual(len(chunks), 4)
+        lines = [json.loads(line) for line in b"".join(chunks).splitlines()]
+        self.assertEqual(
+            [line["type"] for line in lines],
+            ["post", "post", "post", "comment", "like"],
+        )
+        self.assertEqual(lines[0]["tags"], ["lake"])
+        self.assertEqual(lines[0]["image"], post.image.name)
+        self.assertTrue(lines[0]["image_url"].startswith("http://testserver/"))
+        self.assertEqual(lines[3]["content"], "Nice")
+
+        export = self.source / "export.ndjson"
+        export.write_bytes(b"".join(chunks))
+        self.import_posts(export, images=Path(self.media_root))
+        self.assertEqual(Post.objects.filter(caption="Post 0").count(), 2)
+
+    async def test_thread_bound_stream_steps_on_one_thread(self) -> None:
+        threads = []
+
+        def chunks() -> Iterator[bytes]:
+            try:
+                for chunk in (b"a", b"b", b"c"):
+                    threads.append(threading.get_ident())
+                    yield chunk
+            finally:
+                threads.append("closed")
+
+        stream = concurrency.ThreadBoundStream(chunks())
+        self.assertEqual([chunk async for chunk in stream], [b"a", b"b", b"c"])
+        stream.close()
+        self.assertEqual(len(set(threads[:3])), 1)
+        self.assertEqual(threads[3], "closed")
+
+
+class MediaServingTests(TestCase):
+    def setUp(self) -> None:
+        self.media_root = tempfile.mkdtemp()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.settings_override.enable()
+        self.content = Path("media/posts/test_image1.png").read_bytes()
+        self.digest = hashlib.sha256(self.content).hexdigest()
+        self.name = f"posts/{self.digest[:2]}/{self.digest[2:4]}/{self.digest}.png"
+        path = Path(self.media_root) / self.name
+        path.parent.mkdir(parents=True)
+        path.write_bytes(self.content)
+        self.url = f"/media/{self.name}"
+
+    def tearDown(self) -> None:
+        self.settings_override.disable()
+        shutil.rmtree(self.media_root)
+
+    def test_hashed_file_is_immutable(self) -> None:
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b"".join(response.streaming_content), self.content)
+        self.assertEqual(response["ETag"], f'"{self.digest}"')
+        self.assertEqual(
+            response["Cache-Control"],
+            "public, max-age=31536000, immutable",
+        )
+        self.assertEqual(response["Content-Type"], "image/png")
+
+    def test_variant_is_immutable(self) -> None:
+        name = self.name.replace(".png", "_feed.png")
+        (Path(self.media_root) / name).write_bytes(self.content)
+
+        response = self.client.get(f"/media/{name}")
+
+        self.assertEqual(response["ETag"], f'"{self.digest}_feed"')
+        self.assertEqual(
+            response["Cache-Control"],
+            "public, max-age=31536000, immutable",
+        )
+
+    def test_if_none_match_returns_not_modified(self) -> None:
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=f'"{self.digest}"')
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b"")
+
+    def test_range_request(self) -> None:
+        response = self.client.get(self.url, HTTP_RANGE="bytes=10-19")
+
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b"".join(response.streaming_content), self.content[10:20])
+        self.assertEqual(
+            response["Content-Range"],
+            f"bytes 10-19/{len(self.content)}",
+        )
+
+    def test_unsatisfiable_range(self) -> None:
+        response = self.client.get(self.url, HTTP_RANGE="bytes=999999999-")
+        self.assertEqual(
+            response.status_code,
+            status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+        )
+
+    @override_settings(MEDIA_SENDFILE_BACKEND="nginx")
+    def test_nginx_offload(self) -> None:
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["X-Accel-Redirect"], f"/protected-media/{self.name}")
+        self.assertEqual(response.content, b"")
+
+    def test_path_traversal_is_rejected(self) -> None:
+        response = self.client.get("/media/../manage.py")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class HomeTimelineTests(APITestCase):
+    TEST_PASSWORD = "testpassword"
+
+    def setUp(self) -> None:
+        self.reader = User.objects.create_user(
+            username="reader",
+            password=self.TEST_PASSWORD,
+            last_login=timezone.now(),
+        )
+        self.author = User.objects.create_user(
+            username="author",
+            password=self.TEST_PASSWORD,
+        )
+        self.stranger = User.objects.create_user(
+            username="stranger",
+            password=self.TEST_PASSWORD,
+        )
+        self.old_post = self.create_post(self.author, "Before the follow")
+        self.client.force_authenticate(user=self.reader)
+
+    def create_post(self, author: User, caption: str) -> Post:
+        author.refresh_from_db()
+        self.client.force_authenticate(user=author)
         img_path = Path("media/posts/test_image1.png")
         with img_path.open("rb") as img_file:
-            data = {
-                "caption": "Test post authenticated",
-                "image": img_file,
-                "tag_names": ["test", "tag"],
-            }
-            response = self.client.post(self.url, data, format="multipart")
+            data = {"caption": caption, "image": img_file}
+            response = self.client.post("/api/posts/", data, format="multipart")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.client.force_authenticate(user=self.reader)
+        return Post.objects.get(pk=response.data["id"])
 
-        self.assertEqual(response.status_code, 201)
-        self.assertEqual(Post.objects.count(), 1)
-        self.assertEqual(Tag.objects.count(), 2)
+    def feed_captions(self) -> list[str]:
+        response = self.client.get("/api/feed/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [post["caption"] for post in response.data["results"]]
+
+    def test_follow_backfills_and_new_posts_fan_out(self) -> None:
+        self.client.put(f"/api/users/{self.author.id}/follow/")
+        self.create_post(self.author, "After the follow")
+        self.create_post(self.stranger, "Not followed")
+
+        self.assertEqual(
+            self.feed_captions(),
+            ["After the follow", "Before the follow"],
+        )
+        self.assertEqual(TimelineEntry.objects.filter(user=self.reader).count(), 2)
+
+    def test_unfollow_removes_author_from_timeline(self) -> None:
+        self.client.put(f"/api/users/{self.author.id}/follow/")
+        self.client.delete(f"/api/users/{self.author.id}/follow/")
+
+        self.assertEqual(self.feed_captions(), [])
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.follower_count, 0)
+
+    @override_settings(FEED_CELEBRITY_FOLLOWERS=0)
+    def test_celebrity_posts_are_merged_on_read(self) -> None:
+        self.client.put(f"/api/users/{self.author.id}/follow/")
+        post = self.create_post(self.author, "Celebrity post")
+
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.reader, post=post).exists(),
+        )
+        self.assertEqual(
+            self.feed_captions(),
+            ["Celebrity post", "Before the follow"],
+        )
+
+    def test_dormant_followers_are_refilled_on_sign_in(self) -> None:
+        self.client.put(f"/api/users/{self.author.id}/follow/")
+        User.objects.filter(pk=self.reader.pk).update(
+            last_login=timezone.now() - timedelta(days=60),
+        )
+        post = self.create_post(self.author, "While away")
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.reader, post=post).exists(),
+        )
+
+        response = self.client.post(
+            "/api/token/",
+            {"username": "reader", "password": self.TEST_PASSWORD},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.feed_captions(), ["While away", "Before the follow"])
+
+    @override_settings(FEED_CELEBRITY_FOLLOWERS=1)
+    def test_former_celebrity_posts_are_copied_to_timelines(self) -> None:
+        self.client.put(f"/api/users/{self.author.id}/follow/")
+        self.client.force_authenticate(user=self.stranger)
+        self.client.put(f"/api/users/{self.author.id}/follow/")
+        post = self.create_post(self.author, "Celebrity post")
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.reader, post=post).exists(),
+        )
+
+        self.client.force_authenticate(user=self.stranger)
+        self.client.delete(f"/api/users/{self.author.id}/follow/")
+        self.client.force_authenticate(user=self.reader)
+
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.reader, post=post).exists(),
+        )
+        self.assertEqual(
+            self.feed_captions(),
+            ["Celebrity post", "Before the follow"],
+        )
+
+    def test_timeline_cursor_pagination(self) -> None:
+        self.client.put(f"/api/users/{self.author.id}/follow/")
+        for index in range(11):
+            self.create_post(self.author, f"Post {index}")
+
+        first = self.client.get("/api/feed/")
+        second = self.client.get(first.data["next"])
+
+        self.assertEqual(len(first.data["results"]), 10)
+        self.assertEqual(len(second.data["results"]), 2)
+        self.assertIsNone(second.data["next"])
+
+
+class CommentThreadTests(APITestCase):
+    TEST_PASSWORD = "testpassword"
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="testuser",
+            password=self.TEST_PASSWORD,
+        )
+        self.client.force_authenticate(user=self.user)
+        self.post = Post.objects.create(
+            image="\\posts\\test_image1.png",
+            caption="Threads",
+            author=self.user,
+        )
+
+    def comment(self, content: str, parent: Comment | None = None) -> Comment:
+        response = self.client.post(
+            "/api/comments/",
+            {
+                "post": self.post.id,
+                "content": content,
+                "parent": parent.id if parent else None,
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return Comment.objects.get(pk=response.data["id"])
+
+    def test_thread_page_embeds_first_replies(self) -> None:
+        quiet = self.comment("Quiet")
+        busy = self.comment("Busy")
+        for index in range(REPLY_PREVIEW + 2):
+            self.comment(f"Reply {index}", busy)
+        self.comment("Only reply", quiet)
+
+        url = f"/api/posts/{self.post.id}/comments/"
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Post exists, top-level page, replies of the whole page.
+        self.assertEqual(len(queries), 3)
+        first, second = response.data["results"]
+        self.assertEqual((first["id"], second["id"]), (busy.id, quiet.id))
+        self.assertEqual(
+            [reply["content"] for reply in first["replies"]],
+            [f"Reply {index}" for index in range(REPLY_PREVIEW)],
+        )
+        self.assertTrue(first["has_more_replies"])
+        self.assertEqual(second["replies"][0]["parent"], quiet.id)
+        self.assertFalse(second["has_more_replies"])
+
+    def test_top_level_comments_are_cursor_paginated(self) -> None:
+        comments = [self.comment(f"Comment {index}") for index in range(12)]
+        self.comment("Reply", comments[0])
+
+        url = f"/api/posts/{self.post.id}/comments/"
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append([comment["id"] for comment in response.data["results"]])
+            url = response.data["next"]
+
+        self.assertEqual([len(page) for page in pages], [10, 2])
+        self.assertEqual(
+            [comment_id for page in pages for comment_id in page],
+            [comment.id for comment in reversed(comments)],
+        )
+
+    def test_replies_are_paged_oldest_first(self) -> None:
+        parent = self.comment("Parent")
+        replies = [self.comment(f"Reply {index}", parent) for index in range(11)]
+
+        response = self.client.get(f"/api/comments/{parent.id}/replies/")
+        self.assertEqual(
+            [reply["id"] for reply in response.data["results"]],
+            [reply.id for reply in replies[:10]],
+        )
+        response = self.client.get(response.data["next"])
+        self.assertEqual(response.data["results"][0]["id"], replies[10].id)
+        self.assertIsNone(response.data["next"])
+
+        response = self.client.get(f"/api/comments/{replies[-1].id + 1}/replies/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get("/api/comments/abc/replies/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_reply_must_be_on_the_parent_post(self) -> None:
+        other = Post.objects.create(
+            image="\\posts\\test_image1.png",
+            caption="Other",
+            author=self.user,
+        )
+        parent = Comment.objects.create(
+            post=other,
+            content="Elsewhere",
+            author=self.user,
+        )
+
+        response = self.client.post(
+            "/api/comments/",
+            {"post": self.post.id, "content": "Reply", "parent": parent.id},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("parent", response.data)
+
+    def test_update_only_changes_content(self) -> None:
+        other = Post.objects.create(
+            image="\\posts\\test_image1.png",
+            caption="Other",
+            author=self.user,
+        )
+        parent = self.comment("Parent")
+        reply = self.comment("Reply", parent)
+
+        response = self.client.patch(
+            f"/api/comments/{reply.id}/",
+            {"post": other.id, "parent": None, "content": "Edited"},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        reply.refresh_from_db()
+        self.assertEqual(
+            (reply.post_id, reply.parent_id, reply.content),
+            (self.post.id, parent.id, "Edited"),
+        )
+
+    def test_comment_cannot_be_moved_under_its_own_replies(self) -> None:
+        parent = self.comment("Parent")
+        reply = self.comment("Reply", parent)
+        nested = self.comment("Nested", reply)
+
+        for new_parent in (parent, nested):
+            parent.parent = new_parent
+            with self.assertRaisesMessage(
+                ValidationError,
+                "A comment cannot reply to itself or its replies.",
+            ):
+                parent.full_clean()
+
+        nested.parent = parent
+        nested.full_clean()
+
+    def test_deleting_a_comment_deletes_and_uncounts_its_replies(self) -> None:
+        parent = self.comment("Parent")
+        self.comment("Reply", parent)
+        self.comment("Unrelated")
+
+        response = self.client.delete(f"/api/comments/{parent.id}/")
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        self.assertEqual(Comment.objects.filter(post=self.post).count(), 1)
 
 
 class CommentCreateViewTest(APITestCase):
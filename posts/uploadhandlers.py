@@ -0,0 +1,94 @@
+import hashlib
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import (
+    FileUploadHandler,
+    SkipFile,
+    StopFutureHandlers,
+)
+from django.http import HttpRequest
+from PIL import Image
+
+
+# Streams an image upload to disk in fixed-size chunks. The image header is
+# parsed from the first chunks, so wrong formats, oversized dimensions and
+# decompression bombs are rejected before the rest of the body is stored, and
+# a SHA-256 of the content is computed on the way through. Memory use per
+# upload is bounded by POST_IMAGE_HEADER_BYTES whatever the file size.
+class StreamingImageUploadHandler(FileUploadHandler):
+    chunk_size = 64 * 2**10
+
+    def __init__(self, request: HttpRequest | None = None) -> None:
+        super().__init__(request)
+        self.errors = {}
+
+    def new_file(self, field_name: str, *args: object, **kwargs: object) -> None:
+        super().new_file(field_name, *args, **kwargs)
+        self.file = TemporaryUploadedFile(
+            self.file_name,
+            self.content_type,
+            0,
+            self.charset,
+            self.content_type_extra,
+        )
+        self.digest = hashlib.sha256()
+        self.header = bytearray()
+        self.image_info = None
+        raise StopFutureHandlers
+
+    def receive_data_chunk(self, raw_data: bytes, start: int) -> None:
+        if start + len(raw_data) > settings.POST_IMAGE_MAX_UPLOAD_SIZE:
+            self.reject("The image file is too large.")
+
+        if self.image_info is None:
+            self.header += raw_data
+            self.inspect_header(complete=False)
+
+        self.digest.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size: int) -> TemporaryUploadedFile | None:
+        if self.image_info is None:
+            try:
+                self.inspect_header(complete=True)
+            except SkipFile:
+                self.file.close()
+                return None
+
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.sha256 = self.digest.hexdigest()
+        (
+            self.file.image_format,
+            self.file.image_width,
+            self.file.image_height,
+        ) = self.image_info
+        return self.file
+
+    def inspect_header(self, *, complete: bool) -> None:
+        try:
+            with Image.open(BytesIO(self.header)) as image:
+                image_format, (width, height) = image.format, image.size
+        except Image.DecompressionBombError:
+            self.reject("The image has too many pixels.")
+        except OSError:
+            if complete or len(self.header) >= settings.POST_IMAGE_HEADER_BYTES:
+                self.reject(
+                    "Upload a valid image. The file you uploaded was either not "
+                    "an image or a corrupted image.",
+                )
+            return
+
+        if image_format not in settings.POST_IMAGE_ALLOWED_FORMATS:
+            self.reject(f"Unsupported image format: {image_format}.")
+        if width * height > settings.POST_IMAGE_MAX_PIXELS:
+            self.reject("The image has too many pixels.")
+
+        self.image_info = (image_format, width, height)
+        self.header = bytearray()
+
+    def reject(self, message: str) -> None:
+        self.errors[self.field_name] = [message]
+        raise SkipFile
@@ -5,19 +5,31 @@ from rest_framework_simplejwt.views import (
     TokenRefreshView,
 )
 
+from users.throttling import LOGIN_THROTTLES
+
 from .views import (
     CommentCreateView,
+    FeedViewSet,
     LikeCreateView,
     PostViewSet,
+    RequestMetricsView,
+    TagViewSet,
 )
 
 router = DefaultRouter()
 router.register(r"posts", PostViewSet)
 router.register(r"comments", CommentCreateView)
 router.register(r"likes", LikeCreateView)
+router.register(r"feed", FeedViewSet, basename="feed")
+router.register(r"tags", TagViewSet)
 
 urlpatterns = [
     path("", include(router.urls)),
-    path("token/", TokenObtainPairView.as_view(), name="token_obtain_pair"),
+    path(
+        "token/",
+        TokenObtainPairView.as_view(throttle_classes=LOGIN_THROTTLES),
+        name="token_obtain_pair",
+    ),
     path("token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
+    path("metrics/", RequestMetricsView.as_view(), name="request_metrics"),
 ]
@@ -1,40 +1,514 @@
+import hashlib
+from collections.abc import Awaitable, Callable, Sequence
+from functools import partial
+
+import adrf.viewsets
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef, Prefetch, QuerySet
+from django.http import Http404, HttpResponseBase, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_cache_control
 from rest_framework import serializers, status, viewsets
-from rest_framework.parsers import FormParser, MultiPartParser
+from rest_framework.decorators import action
+from rest_framework.parsers import FormParser
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.request import Request
 from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import metrics
+from .cache import (
+    acached_post_data,
+    bump_post_versions,
+    cached_post_data,
+)
+from .concurrency import (
+    ThreadBoundStream,
+    bind_connection_state,
+    gather_blocking,
+    run_blocking,
+)
+from .events import EventStream, get_broker, publish_event
+from .exports import export_history
+from .feed import fan_out_post
+from .images import schedule_post_image
+from .models import Comment, Like, Post, Tag
+from .pagination import (
+    CommentPagination,
+    PostFeedPagination,
+    ReplyPagination,
+    SearchPagination,
+    TagPostsPagination,
+    TimelinePagination,
+)
+from .parsers import StreamingImageMultiPartParser
+from .renderers import EventStreamRenderer, FastJSONRenderer, NDJSONRenderer
+from .search import index_posts, search_posts
+from .serializers import (
+    CommentReadSerializer,
+    CommentSerializer,
+    LikeBatchSerializer,
+    LikeReadSerializer,
+    LikeSerializer,
+    PostEventsSerializer,
+    PostReadSerializer,
+    PostSearchSerializer,
+    PostSerializer,
+    RowSerializer,
+    TagSerializer,
+    absolute_url,
+)
+from .tags import trending_tags
+
+User = get_user_model()
+
+RECENT_COMMENTS = 3
+REPLY_PREVIEW = 3
+
+
+def with_recent_comments(queryset: QuerySet) -> QuerySet:
+    recent_comments = Comment.objects.order_by("-created_at", "-id")
+    return queryset.prefetch_related(
+        Prefetch(
+            "comments",
+            queryset=recent_comments[:RECENT_COMMENTS],
+            to_attr="recent_comments",
+        ),
+    )
+
+
+def thread(comment: dict, replies: dict[int, list[dict]]) -> dict:
+    first_replies = replies.get(comment["id"], [])
+    return {
+        **comment,
+        "replies": first_replies[:REPLY_PREVIEW],
+        "has_more_replies": len(first_replies) > REPLY_PREVIEW,
+    }
+
+
+def with_viewer_state(queryset: QuerySet, user: User) -> QuerySet:
+    return with_recent_comments(queryset).annotate(
+        liked_by_me=Exists(Like.objects.filter(post=OuterRef("pk"), user_id=user.pk)),
+    )
+
+
+def make_etag(*parts: object) -> str:
+    digest = hashlib.sha1(usedforsecurity=False)
+    digest.update(repr(parts).encode())
+    return f'"{digest.hexdigest()}"'
+
+
+async def conditional_response(
+    request: Request,
+    etag: str,
+    respond: Callable[[], Awaitable[HttpResponseBase]],
+) -> HttpResponseBase:
+    # Answers If-None-Match with a 304 before the body is built. Responses
+    # depend on the viewer, so shared caches must not store them.
+    response = get_conditional_response(request, etag=etag) or await respond()
+    if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+        response["ETag"] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def publish_like_changes(user_id: int, added: list[tuple], removed: list[int]) -> None:
+    # Events for the likes Like.apply_states() actually added or removed;
+    # states that were already in place change nothing and publish nothing.
+    for like in LikeReadSerializer.many(added):
+        publish_event("like", like["post"], like)
+    for post_id in removed:
+        publish_event("unlike", post_id, {"post": post_id, "user": user_id})
+
+
+# Viewsets with async handlers: adrf dispatches them on the event loop and
+# runs the sync ones (writes) in a thread.
+class AsyncViewSet(adrf.viewsets.ViewSet):
+    def initial(self, request: Request, *args: object, **kwargs: object) -> None:
+        super().initial(request, *args, **kwargs)
+        bind_connection_state()
 
-from .models import Comment, Like, Post
-from .serializers import CommentSerializer, LikeSerializer, PostSerializer
 
+class CachedPostsMixin:
+    # Lists pages of bare (id, created_at) rows and fills them from the
+    # per-post cache in posts.cache; only cache misses are serialized.
+    page_queryset = Post.objects.only("id", "created_at", "version")
 
-class PostViewSet(viewsets.ModelViewSet):
+    def serialize_posts(self, post_ids: list[int]) -> list[dict]:
+        serializer = PostReadSerializer(self.request, RECENT_COMMENTS)
+        return serializer.serialize(post_ids)
+
+    async def aserialize_posts(self, post_ids: list[int]) -> list[dict]:
+        serializer = PostReadSerializer(self.request, RECENT_COMMENTS)
+        return await serializer.aserialize(post_ids)
+
+    def cached_data(self, posts: list[Post]) -> list[dict]:
+        return cached_post_data(posts, self.request, self.serialize_posts)
+
+    async def acached_data(self, posts: list[Post]) -> list[dict]:
+        return await acached_post_data(posts, self.request, self.aserialize_posts)
+
+
+class CachedPostListMixin(CachedPostsMixin):
+    async def list_page(self) -> list[Post]:
+        queryset = self.filter_queryset(
+            self.page_queryset.order_by("-created_at", "-id"),
+        )
+        return await run_blocking(partial(self.paginate_queryset, queryset))
+
+    async def page_response(self, page: list[Post]) -> Response:
+        return self.get_paginated_response(await self.acached_data(page))
+
+    async def list(
+        self,
+        request: Request,  # noqa: ARG002
+        *args: object,  # noqa: ARG002
+        **kwargs: object,  # noqa: ARG002
+    ) -> Response:
+        return await self.page_response(await self.list_page())
+
+
+class PostViewSet(AsyncViewSet, CachedPostListMixin, viewsets.ModelViewSet):
     queryset = (
         Post.objects.all()
-        .order_by("-created_at")
+        .order_by("-created_at", "-id")
         .select_related("author")
-        .prefetch_related("likes", "comments")
+        .prefetch_related("tags")
     )
     serializer_class = PostSerializer
     permission_classes = [IsAuthenticated]
-    parser_classes = [MultiPartParser, FormParser]
+    parser_classes = [StreamingImageMultiPartParser, FormParser]
+    pagination_class = PostFeedPagination
+    lookup_value_regex = r"\d+"
+
+    def get_queryset(self) -> QuerySet:
+        return with_viewer_state(super().get_queryset(), self.request.user)
 
+    @transaction.atomic
     def perform_create(self, serializer: serializers.Serializer) -> None:
-        serializer.save(author=self.request.user)
+        post = serializer.save(author=self.request.user)
+        index_posts([post.pk])
+        fan_out_post(post)
+        schedule_post_image(post.pk)
+        serializer.instance = self.get_queryset().get(pk=post.pk)
 
+    @transaction.atomic
+    def perform_update(self, serializer: serializers.Serializer) -> None:
+        previous_image = serializer.instance.image.name
+        post = serializer.save()
+        index_posts([post.pk])
+        if post.image.name != previous_image:
+            # The variants belong to the old file; the new one is processed
+            # like a new post's. ImageBlob references move in posts.signals.
+            reset = {
+                "image_status": Post.ImageStatus.PENDING,
+                "image_width": None,
+                "image_height": None,
+                "image_variants": {},
+            }
+            Post.objects.filter(pk=post.pk).update(**reset)
+            for field, value in reset.items():
+                setattr(post, field, value)
+            schedule_post_image(post.pk)
 
-class CommentCreateView(viewsets.ModelViewSet):
-    queryset = Comment.objects.all()
+    async def list(
+        self,
+        request: Request,
+        *args: object,  # noqa: ARG002
+        **kwargs: object,  # noqa: ARG002
+    ) -> Response:
+        # The page rows carry each post's version, so the ETag covers exactly
+        # what the page shows (with its links and count) and a 304 skips the
+        # fragments and the serialization.
+        page = await self.list_page()
+        envelope = self.get_paginated_response([]).data
+        etag = make_etag(
+            request.user.pk,
+            request.get_host(),
+            request.get_full_path(),
+            [(key, value) for key, value in envelope.items() if key != "results"],
+            [(post.id, post.version) for post in page],
+        )
+        return await conditional_response(
+            request,
+            etag,
+            partial(self.page_response, page),
+        )
+
+    async def retrieve(
+        self,
+        request: Request,
+        *args: object,  # noqa: ARG002
+        **kwargs: object,
+    ) -> Response:
+        post = await run_blocking(
+            self.page_queryset.filter(pk=kwargs[self.lookup_field]).first,
+        )
+        if post is None:
+            raise Http404
+        etag = make_etag(
+            request.user.pk,
+            request.get_host(),
+            post.id,
+            post.created_at,
+            post.version,
+        )
+        return await conditional_response(
+            request,
+            etag,
+            partial(self.retrieve_post, post),
+        )
+
+    async def retrieve_post(self, post: Post) -> Response:
+        data = await self.acached_data([post])
+        if not data:
+            raise Http404
+        return Response(data[0])
+
+    @action(detail=False, methods=["get"], pagination_class=SearchPagination)
+    def search(self, request: Request) -> Response:
+        params = PostSearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        page = self.paginate_queryset(
+            search_posts(self.page_queryset, params.validated_data["q"]),
+        )
+        return self.get_paginated_response(self.cached_data(page))
+
+    async def post_rows_page(self, pk: str, rows: QuerySet) -> Sequence[tuple]:
+        # The post lookup only decides between the page and a 404, so both
+        # queries run at once.
+        exists, page = await gather_blocking(
+            Post.objects.filter(pk=pk).exists,
+            partial(self.paginate_queryset, rows.filter(post_id=pk)),
+        )
+        if not exists:
+            raise Http404
+        return page
+
+    @action(detail=True, methods=["get"])
+    async def likes(
+        self,
+        request: Request,  # noqa: ARG002
+        pk: str | None = None,
+    ) -> Response:
+        page = await self.post_rows_page(
+            pk,
+            LikeReadSerializer.rows(Like.objects.order_by("-created_at", "-id")),
+        )
+        return self.get_paginated_response(LikeReadSerializer.many(page))
+
+    @action(detail=True, methods=["put", "delete"])
+    def like(self, request: Request, pk: str | None = None) -> Response:
+        liked = request.method == "PUT"
+        like_counts, added, removed = Like.apply_states(
+            request.user.id,
+            {int(pk): liked},
+        )
+        publish_like_changes(request.user.id, added, removed)
+        if not like_counts:
+            return Response(
+                {"detail": "Post not found."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return Response(
+            {"post": int(pk), "liked": liked, "like_count": like_counts[int(pk)]},
+        )
+
+    @action(detail=True, methods=["get"], pagination_class=CommentPagination)
+    async def comments(
+        self,
+        request: Request,  # noqa: ARG002
+        pk: str | None = None,
+    ) -> Response:
+        # A page of top-level comments with the first REPLY_PREVIEW replies
+        # of each: two queries, whatever the size of the threads. The rest
+        # of a thread is paged from /comments/<id>/replies/.
+        page = await self.post_rows_page(
+            pk,
+            CommentReadSerializer.rows(Comment.objects.filter(parent=None)),
+        )
+        replies = await run_blocking(
+            partial(
+                CommentReadSerializer.replies_by_parent,
+                [row[0] for row in page],
+                REPLY_PREVIEW + 1,
+            ),
+        )
+        return self.get_paginated_response(
+            [thread(comment, replies) for comment in CommentReadSerializer.many(page)],
+        )
+
+    @action(
+        detail=False,
+        methods=["get"],
+        renderer_classes=[EventStreamRenderer, FastJSONRenderer],
+    )
+    async def events(self, request: Request) -> StreamingHttpResponse | Response:
+        # Server-sent events for new comments, likes and unlikes, of all posts
+        # or of the ``post`` ids given. Only served over ASGI: a WSGI server
+        # would buffer the endless stream and tie up a worker thread for good.
+        if not isinstance(request._request, ASGIRequest):  # noqa: SLF001
+            return Response(
+                {"detail": "Event streams need an ASGI server."},
+                status=status.HTTP_501_NOT_IMPLEMENTED,
+            )
+        params = PostEventsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        response = StreamingHttpResponse(
+            EventStream(get_broker(), params.validated_data.get("post")),
+            content_type="text/event-stream",
+        )
+        response["Cache-Control"] = "no-cache"
+        # Keeps nginx from buffering the stream.
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    @action(
+        detail=False,
+        methods=["get"],
+        renderer_classes=[FastJSONRenderer, NDJSONRenderer],
+    )
+    def export(self, request: Request) -> StreamingHttpResponse:
+        # The user's whole history as NDJSON, see posts.exports.
+        storage = Post._meta.get_field("image").storage  # noqa: SLF001
+        history = export_history(
+            request.user.id,
+            lambda name: absolute_url(storage.url(name), request),
+        )
+        if isinstance(request._request, ASGIRequest):  # noqa: SLF001
+            history = ThreadBoundStream(history)
+        response = StreamingHttpResponse(history, content_type="application/x-ndjson")
+        response["Content-Disposition"] = (
+            f'attachment; filename="history-{request.user.id}.ndjson"'
+        )
+        return response
+
+
+class FeedViewSet(AsyncViewSet, CachedPostListMixin, viewsets.GenericViewSet):
+    queryset = Post.objects.select_related("author").prefetch_related("tags")
+    serializer_class = PostSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = TimelinePagination
+
+
+class TagViewSet(CachedPostsMixin, viewsets.GenericViewSet):
+    queryset = Tag.objects.all()
+    serializer_class = TagSerializer
+    permission_classes = [IsAuthenticated]
+    lookup_field = "name"
+    lookup_value_regex = "[^/]+"
+
+    def get_object(self) -> Tag:
+        name = Tag.normalize_name(self.kwargs[self.lookup_field])
+        return get_object_or_404(self.get_queryset(), name=name)
+
+    @action(detail=True, methods=["get"], pagination_class=TagPostsPagination)
+    def posts(
+        self,
+        request: Request,  # noqa: ARG002
+        name: str | None = None,  # noqa: ARG002
+    ) -> Response:
+        # Pages through the tag's (tag_id, post_id) index, newest post first,
+        # and loads only the posts on the page.
+        tag = self.get_object()
+        page = self.paginate_queryset(
+            Post.tags.through.objects.filter(tag=tag).only("post_id"),
+        )
+        posts = self.page_queryset.in_bulk([row.post_id for row in page])
+        # A post deleted since the page was read is skipped.
+        return self.get_paginated_response(
+            self.cached_data(
+                [posts[row.post_id] for row in page if row.post_id in posts],
+            ),
+        )
+
+    @action(detail=False, methods=["get"])
+    def trending(self, request: Request) -> Response:  # noqa: ARG002
+        return Response(trending_tags())
+
+
+class RowListMixin:
+    # Lists through a RowSerializer; every other action keeps using the
+    # model serializer.
+    read_serializer_class: type[RowSerializer]
+
+    async def list(
+        self,
+        request: Request,  # noqa: ARG002
+        *args: object,  # noqa: ARG002
+        **kwargs: object,  # noqa: ARG002
+    ) -> Response:
+        rows = self.read_serializer_class.rows(
+            self.filter_queryset(self.get_queryset()),
+        )
+        page = await run_blocking(partial(self.paginate_queryset, rows))
+        if page is None:
+            page = await run_blocking(partial(list, rows))
+            return Response(self.read_serializer_class.many(page))
+        return self.get_paginated_response(self.read_serializer_class.many(page))
+
+
+def index_comment_posts(post_ids: list[int]) -> None:
+    if settings.POST_SEARCH_INCLUDE_COMMENTS:
+        index_posts(post_ids)
+
+
+class CommentCreateView(AsyncViewSet, RowListMixin, viewsets.ModelViewSet):
+    queryset = Comment.objects.order_by("-created_at", "-id")
     serializer_class = CommentSerializer
+    read_serializer_class = CommentReadSerializer
     permission_classes = [IsAuthenticated]
+    lookup_value_regex = r"\d+"
 
+    @transaction.atomic
     def perform_create(self, serializer: serializers.Serializer) -> None:
-        serializer.save(author=self.request.user)
+        comment = serializer.save(author=self.request.user)
+        Post.adjust_counter(comment.post_id, "comment_count", 1)
+        index_comment_posts([comment.post_id])
+        publish_event("comment", comment.post_id, serializer.data)
+
+    @transaction.atomic
+    def perform_update(self, serializer: serializers.Serializer) -> None:
+        comment = serializer.save()
+        bump_post_versions([comment.post_id])
+        index_comment_posts([comment.post_id])
 
+    @transaction.atomic
+    def perform_destroy(self, instance: Comment) -> None:
+        # Replies are deleted along with their parent.
+        _, deleted = instance.delete()
+        Post.adjust_counter(
+            instance.post_id,
+            "comment_count",
+            -deleted[Comment._meta.label],  # noqa: SLF001
+        )
+        index_comment_posts([instance.post_id])
 
-class LikeCreateView(viewsets.ModelViewSet):
-    queryset = Like.objects.all()
-    serializer_clas = LikeSerializer
+    @action(detail=True, methods=["get"], pagination_class=ReplyPagination)
+    async def replies(
+        self,
+        request: Request,  # noqa: ARG002
+        pk: str | None = None,
+    ) -> Response:
+        exists, page = await gather_blocking(
+            Comment.objects.filter(pk=pk).exists,
+            partial(
+                self.paginate_queryset,
+                self.read_serializer_class.rows(Comment.objects.filter(parent_id=pk)),
+            ),
+        )
+        if not exists:
+            raise Http404
+        return self.get_paginated_response(self.read_serializer_class.many(page))
+
+
+class LikeCreateView(AsyncViewSet, RowListMixin, viewsets.ModelViewSet):
+    queryset = Like.objects.order_by("-created_at", "-id")
+    serializer_class = LikeSerializer
+    read_serializer_class = LikeReadSerializer
     permission_classes = [IsAuthenticated]
 
     def create(self, request: Request) -> Response:
@@ -53,12 +527,66 @@ class LikeCreateView(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND,
             )
 
-        if Like.objects.filter(post=post, user=request.user).exists():
+        try:
+            with transaction.atomic():
+                like = Like.objects.create(post=post, user=request.user)
+                Post.adjust_counter(post.id, "like_count", 1)
+        except IntegrityError:
             return Response(
                 {"detail": "You have already liked this post."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-
-        like = Like.objects.create(post=post, user=request.user)
         serializer = LikeSerializer(like)
+        publish_event("like", post.id, serializer.data)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @transaction.atomic
+    def perform_destroy(self, instance: Like) -> None:
+        # A concurrent unlike may have deleted the row already.
+        _, deleted = instance.delete()
+        if deleted.get(Like._meta.label):  # noqa: SLF001
+            Post.adjust_counter(instance.post_id, "like_count", -1)
+            publish_like_changes(instance.user_id, [], [instance.post_id])
+
+    @action(detail=False, methods=["post"])
+    def batch(self, request: Request) -> Response:
+        serializer = LikeBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        # Actions are replayed in order, so the last one for a post wins.
+        states = {
+            action["post"]: action["liked"]
+            for action in serializer.validated_data["actions"]
+        }
+        like_counts, added, removed = Like.apply_states(request.user.id, states)
+        publish_like_changes(request.user.id, added, removed)
+
+        results = []
+        for post_id, liked in states.items():
+            if post_id not in like_counts:
+                results.append({"post": post_id, "detail": "Post not found."})
+                continue
+            results.append(
+                {"post": post_id, "liked": liked, "like_count": like_counts[post_id]},
+            )
+        return Response({"results": results})
+
+
+class IsStaffMember(IsAuthenticated):
+    # Token users carry no staff flag, so this one reads it from the database.
+    def has_permission(self, request: Request, view: APIView) -> bool:
+        return super().has_permission(request, view) and (
+            User.objects.filter(pk=request.user.id, is_staff=True).exists()
+        )
+
+
+class RequestMetricsView(APIView):
+    permission_classes = [IsStaffMember]
+
+    def get(self, request: Request) -> Response:  # noqa: ARG002
+        return Response(
+            {
+                "sample_rate": settings.REQUEST_METRICS_SAMPLE_RATE,
+                "routes": metrics.snapshot(),
+            },
+        )
@@ -2,6 +2,27 @@
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The read endpoints for posts, comments and likes are async views, so serve
+the project with an ASGI server, one worker process per CPU core, capping the
+connections each worker accepts:
+
+    uvicorn snap_share.asgi:application --workers 4 --limit-concurrency 1000
+
+--limit-concurrency answers 503 once a worker holds that many connections
+instead of queueing without bound. Open /api/posts/events/ streams count
+against it but cost no thread or database connection while idle (tens of
+KB each), so a worker that serves streams can take a limit in the tens of
+thousands, with ``ulimit -n`` raised to match. Each worker opens up to
+ASYNC_QUERY_WORKERS database connections for the concurrent queries of async
+views, plus one per request thread running a sync view (the writes), so keep
+workers * (ASYNC_QUERY_WORKERS + busy sync requests) below the database's
+max_connections. The pool threads keep their connections between requests;
+request threads do not outlive their request, so leave DB_CONN_MAX_AGE at 0
+or their connections pile up. Set DB_POOL_MAX_SIZE instead: every thread then
+borrows from one pool per worker, so workers * DB_POOL_MAX_SIZE bounds the
+connections and requests no longer open their own.
+``manage.py load_test`` compares deployments.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
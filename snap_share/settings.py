@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 import os
 from datetime import timedelta
+from importlib.util import find_spec
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -38,6 +39,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "posts",
     "rest_framework",
     "rest_framework.authtoken",
@@ -47,6 +49,7 @@ INSTALLED_APPS = [
 AUTH_USER_MODEL = "users.CustomUser"
 
 MIDDLEWARE = [
+    "posts.metrics.RequestMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -80,17 +83,68 @@ WSGI_APPLICATION = "snap_share.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# Database connections are either pooled or persistent, never both.
+# DB_POOL_MAX_SIZE > 0 shares a psycopg connection pool per process: a
+# request borrows a connection for its duration and hands it back. The pool
+# checks a connection before lending it (CONN_HEALTH_CHECKS) and replaces
+# connections older than DB_POOL_MAX_LIFETIME or idle longer than
+# DB_POOL_MAX_IDLE seconds; requests that wait DB_POOL_TIMEOUT seconds for a
+# free connection fail. It is the option for ASGI (see snap_share/asgi.py),
+# whose request threads do not outlive their request. With the pool off, WSGI
+# workers can keep their connection for DB_CONN_MAX_AGE seconds, checked
+# before each request that reuses it. ``manage.py benchmark_db_connections``
+# compares the modes.
+DB_POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", "0"))
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.postgresql",
         "NAME": os.environ.get("POSTGRES_DB"),
         "USER": os.environ.get("POSTGRES_USER"),
         "PASSWORD": os.environ.get("POSTGRES_PASSWORD"),
-        "HOST": "db",
-        "PORT": "5432",
+        "HOST": os.environ.get("POSTGRES_HOST", "db"),
+        "PORT": os.environ.get("POSTGRES_PORT", "5432"),
+        "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", "0")),
+        "CONN_HEALTH_CHECKS": True,
+        # Behind PgBouncer in transaction mode, where a server-side cursor
+        # cannot outlive its transaction. QuerySet.iterator() (the history
+        # export) then reads whole results into memory.
+        "DISABLE_SERVER_SIDE_CURSORS": (
+            os.environ.get("DB_DISABLE_SERVER_SIDE_CURSORS") == "1"
+        ),
+        "OPTIONS": {},
+    },
+}
+if DB_POOL_MAX_SIZE > 0:
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+    DATABASES["default"]["OPTIONS"]["pool"] = {
+        "min_size": min(int(os.environ.get("DB_POOL_MIN_SIZE", "2")), DB_POOL_MAX_SIZE),
+        "max_size": DB_POOL_MAX_SIZE,
+        "timeout": float(os.environ.get("DB_POOL_TIMEOUT", "10")),
+        "max_lifetime": float(os.environ.get("DB_POOL_MAX_LIFETIME", "1800")),
+        "max_idle": float(os.environ.get("DB_POOL_MAX_IDLE", "300")),
+    }
+
+# Per-process memory cache by default; point CACHE_BACKEND/CACHE_LOCATION at a
+# shared backend (e.g. django.core.cache.backends.redis.RedisCache) when
+# running more than one worker.
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get(
+            "CACHE_BACKEND",
+            "django.core.cache.backends.locmem.LocMemCache",
+        ),
+        "LOCATION": os.environ.get("CACHE_LOCATION", "snap-share"),
     },
 }
 
+# Serialized posts are cached per post under the post's version column, which
+# the database moves on every write, so any backend (the per-process default
+# included) serves fresh fragments; a shared one only raises the hit rate.
+# POST_CACHE_TIMEOUT only bounds how long orphaned fragments live.
+POST_CACHE_ALIAS = "default"
+POST_CACHE_TIMEOUT = 5 * 60
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -111,6 +165,39 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Argon2 is preferred when argon2-cffi is installed; hashes made by any
+# other listed hasher are upgraded on the next successful login.
+PASSWORD_HASHERS = [
+    "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+if find_spec("argon2") is not None:
+    PASSWORD_HASHERS.insert(0, "django.contrib.auth.hashers.Argon2PasswordHasher")
+
+AUTHENTICATION_BACKENDS = ["users.backends.PooledModelBackend"]
+
+# Async views run independent queries of one request concurrently on this
+# many threads per process, each holding its own database connection (see
+# posts.concurrency). 0 runs them one after another on the request's thread.
+ASYNC_QUERY_WORKERS = int(os.environ.get("ASYNC_QUERY_WORKERS", "8"))
+
+# Share of requests whose SQL, serialization and render time is measured and
+# aggregated per route at /api/metrics/ (staff only). See posts.metrics.
+# Server-Timing headers expose those timings to every client, so they are
+# only sent when REQUEST_METRICS_SERVER_TIMING=1.
+REQUEST_METRICS_SAMPLE_RATE = float(
+    os.environ.get("REQUEST_METRICS_SAMPLE_RATE", "0.01"),
+)
+REQUEST_METRICS_SERVER_TIMING = os.environ.get("REQUEST_METRICS_SERVER_TIMING") == "1"
+
+# Password hashing runs in this many worker processes (0 hashes inline). At
+# most PASSWORD_HASHING_MAX_PENDING hashes may be queued; requests that wait
+# longer than PASSWORD_HASHING_TIMEOUT seconds for a slot get a 503.
+PASSWORD_HASHING_WORKERS = int(os.environ.get("PASSWORD_HASHING_WORKERS", "2"))
+PASSWORD_HASHING_MAX_PENDING = 32
+PASSWORD_HASHING_TIMEOUT = 5
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
@@ -133,22 +220,86 @@ STATIC_URL = "static/"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# How media bytes leave the server: "nginx" answers with X-Accel-Redirect to an
+# internal location aliased to MEDIA_ROOT, "xsendfile" with X-Sendfile
+# (Apache/lighttpd), and an empty value streams the file from Python.
+MEDIA_SENDFILE_BACKEND = os.environ.get("MEDIA_SENDFILE_BACKEND") or None
+MEDIA_ACCEL_REDIRECT_PREFIX = "/protected-media/"
+# Cache lifetime for media that is not content-addressed (hashed names are
+# served as immutable).
+MEDIA_CACHE_MAX_AGE = 24 * 60 * 60
+
+# Resized copies generated for every uploaded post image, keyed by variant name
+# with the longest side in pixels as the value.
+POST_IMAGE_VARIANTS = {"thumbnail": 320, "feed": 1080, "full": 2048}
+POST_IMAGE_FORMAT = "WEBP"
+POST_IMAGE_QUALITY = 80
+POST_IMAGE_WORKERS = int(os.environ.get("POST_IMAGE_WORKERS", "2"))
+
+# Limits enforced while an image upload is still streaming in.
+POST_IMAGE_ALLOWED_FORMATS = ("JPEG", "PNG", "WEBP", "GIF")
+POST_IMAGE_MAX_UPLOAD_SIZE = 20 * 2**20
+POST_IMAGE_MAX_PIXELS = 50_000_000
+POST_IMAGE_HEADER_BYTES = 256 * 2**10
+
+# Home timeline: posts by authors with more followers than this are not copied
+# into follower timelines on write but merged in when the timeline is read.
+FEED_CELEBRITY_FOLLOWERS = 10000
+# How many recent posts of a newly followed author are copied into the
+# follower's timeline.
+FEED_BACKFILL_POSTS = 50
+# Posts are only copied into the timelines of followers who signed in within
+# this many days; a returning user's timeline is refilled when they sign in.
+FEED_ACTIVE_DAYS = 30
+
+# Full-text search over post captions, tag names and (optionally) comments.
+# "simple" does no stemming, so it works for captions in any language.
+POST_SEARCH_CONFIG = os.environ.get("POST_SEARCH_CONFIG", "simple")
+POST_SEARCH_INCLUDE_COMMENTS = True
+# Only the text of this many newest comments is indexed per post.
+POST_SEARCH_MAX_COMMENTS = 100
+
+# Trending tags count the posts created per tag in buckets of
+# TRENDING_TAGS_BUCKET and rank tags over the buckets of the last
+# TRENDING_TAGS_WINDOW; the ranking is cached for
+# TRENDING_TAGS_CACHE_TIMEOUT seconds.
+TRENDING_TAGS_BUCKET = timedelta(hours=1)
+TRENDING_TAGS_WINDOW = timedelta(hours=24)
+TRENDING_TAGS_LIMIT = 20
+TRENDING_TAGS_CACHE_TIMEOUT = 60
+
+# Like and comment events streamed from /api/posts/events/. The default
+# broker only reaches clients connected to the same process. Each client
+# buffers at most POST_EVENTS_BUFFER_SIZE undelivered events and is sent a
+# keepalive comment after POST_EVENTS_KEEPALIVE idle seconds.
+POST_EVENTS_BROKER = os.environ.get("POST_EVENTS_BROKER", "posts.events.LocalBroker")
+POST_EVENTS_BUFFER_SIZE = 64
+POST_EVENTS_KEEPALIVE = 15
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# The JSON renderer and parser use orjson when it is installed and fall back
+# to the standard library otherwise.
 REST_FRAMEWORK = {
-    "DEFAULT_RENDERER_CLASSES": ("rest_framework.renderers.JSONRenderer",),
-    "DEFAULT_PARSER_CLASSES": ("rest_framework.parsers.JSONParser",),
+    "DEFAULT_RENDERER_CLASSES": ("posts.renderers.FastJSONRenderer",),
+    "DEFAULT_PARSER_CLASSES": ("posts.parsers.FastJSONParser",),
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 10,
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "users.authentication.ClaimsJWTAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    # Sign-in and registration endpoints only; see users.throttling.
+    "DEFAULT_THROTTLE_RATES": {
+        "login": "30/min",
+        "login_username": "10/min",
+        "register": "10/hour",
+    },
 }
 
 
@@ -157,4 +308,18 @@ SIMPLE_JWT = {
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
     "ROTATE_REFRESH_TOKENS": False,
     "BLACKLIST_AFTER_ROTATION": True,
+    "TOKEN_OBTAIN_SERIALIZER": "users.serializers.ClaimsTokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "users.serializers.ClaimsTokenRefreshSerializer",
+    "TOKEN_USER_CLASS": "users.tokens.ClaimsTokenUser",
 }
+
+# Safe requests are authenticated from signed token claims without loading
+# the user. Validated tokens are kept in a per-process LRU of this size.
+JWT_VALIDATED_TOKEN_CACHE_SIZE = 1024
+# Revocations (logout, password or is_active changes) are checked in the
+# database on writes and token refreshes, and from this cache on safe
+# requests. A shared cache sees them at once; a per-process one can accept a
+# revoked token for up to JWT_REVOCATION_CACHE_TIMEOUT seconds in the other
+# processes.
+JWT_REVOCATION_CACHE_ALIAS = "default"
+JWT_REVOCATION_CACHE_TIMEOUT = 30
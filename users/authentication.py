@@ -0,0 +1,130 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import AbstractBaseUser
+from django.db.models import Exists
+from django.utils.translation import gettext_lazy as _
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.request import Request
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import (
+    AuthenticationFailed,
+    InvalidToken,
+)
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import Token
+
+from .tokens import (
+    ClaimsTokenUser,
+    is_revoked,
+    is_revoked_cached,
+    revoked_tokens,
+)
+
+
+class ValidatedTokenCache:
+    # Process-wide LRU of raw token bytes to validated tokens, so hot tokens
+    # skip signature verification. Expiry is still checked on every hit.
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self.tokens: OrderedDict[bytes, Token] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, raw_token: bytes) -> Token | None:
+        with self.lock:
+            token = self.tokens.get(raw_token)
+            if token is None:
+                return None
+            if token["exp"] <= time.time():
+                del self.tokens[raw_token]
+                return None
+            self.tokens.move_to_end(raw_token)
+            return token
+
+    def put(self, raw_token: bytes, token: Token) -> None:
+        with self.lock:
+            self.tokens[raw_token] = token
+            self.tokens.move_to_end(raw_token)
+            while len(self.tokens) > self.maxsize:
+                self.tokens.popitem(last=False)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.tokens.clear()
+
+
+validated_tokens = ValidatedTokenCache(settings.JWT_VALIDATED_TOKEN_CACHE_SIZE)
+
+
+# Read requests are authenticated from the signed id/username/is_active
+# claims and the cached revocation state, without a query while it is cached;
+# writes load the user row, together with the token's own revocation, in one
+# query. Revoked tokens are rejected on both paths, and tokens issued without
+# the claims always load the user.
+class ClaimsJWTAuthentication(JWTAuthentication):
+    def authenticate(
+        self,
+        request: Request,
+    ) -> tuple[AbstractBaseUser | ClaimsTokenUser, Token] | None:
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        if request.method in SAFE_METHODS and "is_active" in validated_token:
+            user = ClaimsTokenUser(validated_token)
+            if not user.is_active:
+                raise AuthenticationFailed(
+                    _("User is inactive"),
+                    code="user_inactive",
+                )
+            self.check_revoked(is_revoked_cached(validated_token))
+            return user, validated_token
+
+        user = self.get_user(validated_token)
+        self.check_revoked(is_revoked(validated_token, user))
+        return user, validated_token
+
+    @staticmethod
+    def check_revoked(revoked: bool) -> None:  # noqa: FBT001
+        if revoked:
+            raise AuthenticationFailed(
+                _("Token has been revoked."),
+                code="token_revoked",
+            )
+
+    def get_user(self, validated_token: Token) -> AbstractBaseUser:
+        # JWTAuthentication.get_user, with the revocation of the token
+        # annotated onto the same query.
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(
+                _("Token contained no recognizable user identification"),
+            ) from e
+
+        try:
+            user = self.user_model.objects.annotate(
+                token_revoked=Exists(revoked_tokens(validated_token)),
+            ).get(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist as e:
+            raise AuthenticationFailed(
+                _("User not found"),
+                code="user_not_found",
+            ) from e
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
+
+    def get_validated_token(self, raw_token: bytes) -> Token:
+        token = validated_tokens.get(raw_token)
+        if token is None:
+            token = super().get_validated_token(raw_token)
+            validated_tokens.put(raw_token, token)
+        return token
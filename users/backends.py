@@ -0,0 +1,57 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.models import AbstractBaseUser
+from django.http import HttpRequest
+from rest_framework.request import Request
+
+from .hashing import HashingUnavailable, hash_password, verify_password
+
+User = get_user_model()
+
+
+# ModelBackend with the hash check (and the upgrade of hashes made by an
+# older or weaker hasher) done through users.hashing.
+class PooledModelBackend(ModelBackend):
+    def authenticate(
+        self,
+        request: HttpRequest | None,
+        username: str | None = None,
+        password: str | None = None,
+        **kwargs: object,
+    ) -> AbstractBaseUser | None:
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+
+        try:
+            user = User._default_manager.get_by_natural_key(username)  # noqa: SLF001
+        except User.DoesNotExist:
+            user = None
+
+        try:
+            is_correct, must_update = verify_password(
+                password,
+                user.password if user is not None else "",
+            )
+        except HashingUnavailable:
+            # API views answer 503. Anything else (the admin login form)
+            # would show a server error, so the sign-in just fails there.
+            if isinstance(request, Request):
+                raise
+            return None
+        if user is None or not is_correct:
+            return None
+
+        if must_update:
+            # update() instead of save(): the password itself is unchanged,
+            # so this must not revoke the user's tokens.
+            try:
+                user.password = hash_password(password)
+            except HashingUnavailable:
+                # The hash is upgraded on a later sign-in instead.
+                return user if self.user_can_authenticate(user) else None
+            User._default_manager.filter(pk=user.pk).update(  # noqa: SLF001
+                password=user.password,
+            )
+        return user if self.user_can_authenticate(user) else None
@@ -0,0 +1,79 @@
+import multiprocessing
+import os
+import threading
+from collections.abc import Callable
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import TypeVar
+
+import django
+from django.conf import settings
+from django.contrib.auth import hashers
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+T = TypeVar("T")
+
+# Password hashing and verification run in a small process pool so a burst
+# of logins keeps at most PASSWORD_HASHING_WORKERS cores busy and leaves the
+# request workers free for everything else. PASSWORD_HASHING_WORKERS = 0
+# runs them inline, still bounded by the same semaphore.
+
+_executor: ProcessPoolExecutor | None = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(settings.PASSWORD_HASHING_MAX_PENDING)
+
+
+class HashingUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Too many sign-ins in progress, please retry shortly."
+    default_code = "hashing_unavailable"
+
+
+def _init_worker(settings_module: str) -> None:
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
+    django.setup()
+
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor  # noqa: PLW0603
+    with _executor_lock:
+        if _executor is None:
+            # forkserver: forking a threaded request worker is not safe.
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.PASSWORD_HASHING_WORKERS,
+                mp_context=multiprocessing.get_context("forkserver"),
+                initializer=_init_worker,
+                initargs=(settings.SETTINGS_MODULE,),
+            )
+    return _executor
+
+
+def submit(function: Callable[..., T], *args: object) -> Future:
+    if not _slots.acquire(timeout=settings.PASSWORD_HASHING_TIMEOUT):
+        raise HashingUnavailable
+
+    if settings.PASSWORD_HASHING_WORKERS <= 0:
+        future = Future()
+        try:
+            future.set_result(function(*args))
+        finally:
+            _slots.release()
+        return future
+
+    try:
+        future = get_executor().submit(function, *args)
+    except BaseException:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    return future
+
+
+def hash_password(password: str) -> str:
+    return submit(hashers.make_password, password).result()
+
+
+def verify_password(password: str, encoded: str) -> tuple[bool, bool]:
+    # (is_correct, must_update); an empty ``encoded`` still burns one hash so
+    # unknown usernames take as long as wrong passwords.
+    return submit(hashers.verify_password, password, encoded).result()
@@ -0,0 +1,69 @@
+import statistics
+import time
+from argparse import ArgumentParser
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.core.management.base import BaseCommand
+
+from users import hashing
+
+PASSWORD = "benchmark-password"
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure sign-in throughput: verify a password hash concurrently "
+        "inline on request threads and through the hashing process pool."
+    )
+
+    def add_arguments(self, parser: ArgumentParser) -> None:
+        parser.add_argument(
+            "--logins",
+            type=int,
+            default=200,
+            help="Password verifications per run.",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=8,
+            help="Simulated request threads.",
+        )
+
+    def handle(self, *args: str, **options: int) -> None:  # noqa: ARG002
+        encoded = hashers.make_password(PASSWORD)
+        algorithm = hashers.identify_hasher(encoded).algorithm
+        self.stdout.write(
+            f"{options['logins']} login(s), {options['concurrency']} thread(s), "
+            f"{algorithm}, {settings.PASSWORD_HASHING_WORKERS} hashing worker(s)",
+        )
+
+        # Start the pool outside the measurement.
+        hashing.verify_password(PASSWORD, encoded)
+        for label, verify in (
+            ("inline", hashers.verify_password),
+            ("pooled", hashing.verify_password),
+        ):
+            self.run(label, lambda verify=verify: verify(PASSWORD, encoded), options)
+
+    def run(self, label: str, login: Callable[[], object], options: dict) -> None:
+        def timed() -> float:
+            start = time.perf_counter()
+            login()
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as executor:
+            latencies = sorted(
+                executor.map(lambda _: timed(), range(options["logins"])),
+            )
+        elapsed = time.perf_counter() - start
+
+        p50, p95 = (statistics.quantiles(latencies, n=100)[index] for index in (49, 94))
+        self.stdout.write(
+            f"{label}: {options['logins'] / elapsed:.1f} logins/s, "
+            f"p50 {p50 * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms",
+        )
@@ -1,6 +1,44 @@
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
 
 class CustomUser(AbstractUser):
     bio = models.TextField(blank=True)
+    follower_count = models.PositiveIntegerField(default=0)
+    # Tokens carry the version current when they were issued; bumping it
+    # revokes every token of the user issued so far.
+    token_version = models.PositiveIntegerField(default=0)
+
+    @property
+    def is_celebrity(self) -> bool:
+        return self.follower_count > settings.FEED_CELEBRITY_FOLLOWERS
+
+
+class Follow(models.Model):
+    follower = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="following",
+    )
+    followee = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="followers",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("follower", "followee")
+
+    def __str__(self) -> str:
+        return f"{self.follower_id} follows {self.followee_id}"
+
+
+# Tokens revoked one at a time (logout), kept until they would have expired.
+class RevokedToken(models.Model):
+    jti = models.CharField(max_length=255, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self) -> str:
+        return self.jti
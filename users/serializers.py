@@ -2,8 +2,17 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
 from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import (
+    TokenObtainPairSerializer,
+    TokenRefreshSerializer,
+)
 
+from posts.feed import record_sign_in
+
+from .hashing import hash_password
 from .models import CustomUser
+from .tokens import ClaimsRefreshToken, is_revoked
 
 User = get_user_model()
 
@@ -47,6 +56,23 @@ class UserRegisterSerializer(serializers.ModelSerializer):
             username=validated_data["username"],
             email=validated_data["email"],
         )
-        user.set_password(validated_data["password1"])
+        user.password = hash_password(validated_data["password1"])
         user.save()
         return user
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = ClaimsRefreshToken
+
+    def validate(self, attrs: dict) -> dict:
+        data = super().validate(attrs)
+        record_sign_in(self.user)
+        return data
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs: dict) -> dict:
+        if is_revoked(self.token_class(attrs["refresh"])):
+            msg = "Token has been revoked."
+            raise InvalidToken(msg)
+        return super().validate(attrs)
@@ -0,0 +1,42 @@
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import receiver
+
+from .models import CustomUser
+from .tokens import revoke_user_tokens
+
+
+@receiver(pre_save, sender=CustomUser)
+def remember_previous_credentials(
+    sender: type[CustomUser],
+    instance: CustomUser,
+    update_fields: frozenset | None = None,
+    **kwargs: object,  # noqa: ARG001
+) -> None:
+    instance.previous_credentials = None
+    if instance._state.adding:  # noqa: SLF001
+        return
+    if update_fields is not None and not {"password", "is_active"} & update_fields:
+        return
+    row = (
+        sender.objects.filter(pk=instance.pk)
+        .values_list("password", "is_active", "token_version")
+        .first()
+    )
+    if row is None:
+        return
+    instance.previous_credentials = row[:2]
+    # A stale instance must not write back a version that has moved on.
+    instance.token_version = max(instance.token_version, row[2])
+
+
+@receiver(post_save, sender=CustomUser)
+def revoke_tokens_on_credential_change(
+    sender: type[CustomUser],  # noqa: ARG001
+    instance: CustomUser,
+    **kwargs: object,  # noqa: ARG001
+) -> None:
+    # Signed claims of existing tokens no longer match the user.
+    previous = instance.previous_credentials
+    if previous is not None and previous != (instance.password, instance.is_active):
+        revoke_user_tokens(instance.pk)
+        instance.token_version += 1
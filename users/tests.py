@@ -1,9 +1,26 @@
 import json
+import threading
+from datetime import timedelta
+from unittest import mock
 
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import identify_hasher, make_password
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
+from rest_framework.response import Response
 from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import hashing
+from .authentication import validated_tokens
+from .models import Follow, RevokedToken
+from .throttling import LoginUsernameRateThrottle
+from .tokens import ClaimsTokenUser, revoke_user_tokens
 
 User = get_user_model()
 
@@ -113,3 +130,296 @@ class UserAuthTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn("access", response.data)
         self.assertIn("refresh", response.data)
+
+
+class ClaimsJWTAuthenticationTests(APITestCase):
+    TEST_PASSWORD = "testpass"
+
+    def setUp(self) -> None:
+        cache.clear()
+        validated_tokens.clear()
+        self.user = User.objects.create_user(
+            username="testuser",
+            password=self.TEST_PASSWORD,
+        )
+        response = self.client.post(
+            reverse("token_obtain_pair"),
+            {"username": "testuser", "password": self.TEST_PASSWORD},
+            format="json",
+        )
+        self.access = response.data["access"]
+        self.refresh = response.data["refresh"]
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.access}")
+
+    def user_queries(self, method: str, url: str) -> tuple[int, list[str]]:
+        user_table = User._meta.db_table  # noqa: SLF001
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, format="json")
+        return response.status_code, [
+            query["sql"]
+            for query in queries.captured_queries
+            if f'FROM "{user_table}"' in query["sql"]
+        ]
+
+    def test_tokens_carry_user_claims(self) -> None:
+        token = AccessToken(self.access)
+
+        self.assertEqual(token["user_id"], str(self.user.id))
+        self.assertEqual(token["username"], "testuser")
+        self.assertTrue(token["is_active"])
+
+    def test_token_user_behaves_like_the_user(self) -> None:
+        user = ClaimsTokenUser(AccessToken(self.access))
+
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(user.username, "testuser")
+        self.assertTrue(user.is_authenticated)
+
+    def test_reads_trust_claims_and_writes_load_the_user(self) -> None:
+        self.client.get("/api/posts/")
+        read_status, read_queries = self.user_queries("get", "/api/posts/")
+        write_status, write_queries = self.user_queries("post", "/api/likes/")
+
+        self.assertEqual(read_status, status.HTTP_200_OK)
+        # The revocation state is cached by the first read.
+        self.assertEqual(read_queries, [])
+        self.assertEqual(write_status, status.HTTP_400_BAD_REQUEST)
+        # The user, with the revocation of the token in the same query.
+        [write_query] = write_queries
+        self.assertIn(RevokedToken._meta.db_table, write_query)  # noqa: SLF001
+
+    def test_validated_tokens_are_reused(self) -> None:
+        self.client.get("/api/posts/")
+        token = validated_tokens.get(self.access.encode())
+        self.client.get("/api/posts/")
+
+        self.assertIsNotNone(token)
+        self.assertIs(validated_tokens.get(self.access.encode()), token)
+
+    def test_logout_revokes_the_access_token(self) -> None:
+        self.client.get("/api/posts/")
+        self.client.post(reverse("logout"))
+        response = self.client.get("/api/posts/")
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_logout_revokes_the_refresh_token(self) -> None:
+        self.client.post(reverse("logout"), {"refresh": self.refresh}, format="json")
+        response = self.client.post(
+            reverse("token_refresh"),
+            {"refresh": self.refresh},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivation_revokes_all_tokens(self) -> None:
+        self.client.get("/api/posts/")
+        self.user.is_active = False
+        self.user.save()
+
+        response = self.client.get("/api/posts/")
+        refreshed = self.client.post(
+            reverse("token_refresh"),
+            {"refresh": self.refresh},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(refreshed.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_revocations_made_elsewhere_apply_once_the_cache_expires(self) -> None:
+        # Another process: no signals, nothing shared but the database.
+        self.client.get("/api/posts/")
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.client.get("/api/posts/").status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            self.client.post("/api/likes/").status_code,
+            status.HTTP_401_UNAUTHORIZED,
+        )
+
+        cache.clear()
+        self.assertEqual(
+            self.client.get("/api/posts/").status_code,
+            status.HTTP_401_UNAUTHORIZED,
+        )
+
+        User.objects.filter(pk=self.user.pk).update(is_active=True)
+        cache.clear()
+        self.assertEqual(self.client.get("/api/posts/").status_code, status.HTTP_200_OK)
+        revoke_user_tokens(self.user.pk)
+        self.assertEqual(
+            self.client.get("/api/posts/").status_code,
+            status.HTTP_401_UNAUTHORIZED,
+        )
+
+    def test_stale_instance_does_not_restore_revoked_tokens(self) -> None:
+        stale = User.objects.get(pk=self.user.pk)
+        self.user.set_password("another-password")
+        self.user.save()
+        stale.bio = "Still here"
+        stale.save()
+
+        self.assertEqual(
+            self.client.get("/api/posts/").status_code,
+            status.HTTP_401_UNAUTHORIZED,
+        )
+
+    def test_logout_prunes_expired_revocations(self) -> None:
+        RevokedToken.objects.create(
+            jti="expired",
+            expires_at=timezone.now() - timedelta(seconds=1),
+        )
+        self.client.post(reverse("logout"))
+
+        self.assertEqual(
+            list(RevokedToken.objects.values_list("jti", flat=True)),
+            [AccessToken(self.access)["jti"]],
+        )
+
+    def test_password_change_revokes_refresh_token(self) -> None:
+        self.user.set_password("another-password")
+        self.user.save()
+
+        response = self.client.post(
+            reverse("token_refresh"),
+            {"refresh": self.refresh},
+            format="json",
+        )
+        relogin = self.client.post(
+            reverse("token_obtain_pair"),
+            {"username": "testuser", "password": "another-password"},
+            format="json",
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {relogin.data['access']}")
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.client.get("/api/posts/").status_code, status.HTTP_200_OK)
+
+
+class PasswordHashingTests(APITestCase):
+    TEST_PASSWORD = "testpass"
+
+    def setUp(self) -> None:
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="testuser",
+            password=self.TEST_PASSWORD,
+        )
+        self.login_url = reverse("token_obtain_pair")
+
+    def login(self, password: str | None = None) -> Response:
+        data = {"username": "testuser", "password": password or self.TEST_PASSWORD}
+        return self.client.post(self.login_url, data, format="json")
+
+    def test_login_verifies_in_worker_process(self) -> None:
+        response = self.login()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNotNone(hashing._executor)  # noqa: SLF001
+        self.assertEqual(
+            self.login("wrong-password").status_code,
+            status.HTTP_401_UNAUTHORIZED,
+        )
+
+    def test_login_upgrades_outdated_hash_without_revoking_tokens(self) -> None:
+        User.objects.filter(pk=self.user.pk).update(
+            password=make_password(self.TEST_PASSWORD, hasher="pbkdf2_sha1"),
+        )
+
+        response = self.login()
+        self.user.refresh_from_db()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+
+        self.assertEqual(
+            identify_hasher(self.user.password).algorithm,
+            identify_hasher(make_password("x")).algorithm,
+        )
+        self.assertTrue(self.user.check_password(self.TEST_PASSWORD))
+        self.assertEqual(self.client.get("/api/posts/").status_code, status.HTTP_200_OK)
+
+    @override_settings(PASSWORD_HASHING_WORKERS=0)
+    def test_inline_path(self) -> None:
+        encoded = hashing.hash_password("secret-password")
+
+        self.assertEqual(
+            hashing.verify_password("secret-password", encoded),
+            (True, False),
+        )
+        self.assertEqual(hashing.verify_password("wrong", encoded), (False, False))
+
+    @override_settings(PASSWORD_HASHING_TIMEOUT=0)
+    def test_busy_pool_returns_503(self) -> None:
+        with mock.patch.object(hashing, "_slots", threading.BoundedSemaphore(1)):
+            hashing._slots.acquire()  # noqa: SLF001
+            response = self.login()
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    @override_settings(PASSWORD_HASHING_TIMEOUT=0)
+    def test_busy_pool_fails_admin_login_without_an_error(self) -> None:
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        with mock.patch.object(hashing, "_slots", threading.BoundedSemaphore(1)):
+            hashing._slots.acquire()  # noqa: SLF001
+            response = self.client.post(
+                reverse("admin:login"),
+                {"username": "testuser", "password": self.TEST_PASSWORD},
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("_auth_user_id", self.client.session)
+
+    def test_logins_are_throttled_per_username(self) -> None:
+        with mock.patch.object(
+            LoginUsernameRateThrottle,
+            "rate",
+            "2/min",
+            create=True,
+        ):
+            statuses = [self.login("wrong").status_code for _ in range(3)]
+
+        self.assertEqual(
+            statuses,
+            [
+                status.HTTP_401_UNAUTHORIZED,
+                status.HTTP_401_UNAUTHORIZED,
+                status.HTTP_429_TOO_MANY_REQUESTS,
+            ],
+        )
+
+
+class FollowTests(APITestCase):
+    TEST_PASSWORD = "testpass"
+
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(
+            username="testuser",
+            password=self.TEST_PASSWORD,
+        )
+        self.other_user = User.objects.create_user(
+            username="otheruser",
+            password=self.TEST_PASSWORD,
+        )
+        self.client.force_authenticate(user=self.user)
+        self.url = reverse("follow", args=[self.other_user.id])
+
+    def test_follow_is_idempotent(self) -> None:
+        self.client.put(self.url)
+        response = self.client.put(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"user": self.other_user.id, "following": True})
+        self.assertEqual(Follow.objects.count(), 1)
+        self.other_user.refresh_from_db()
+        self.assertEqual(self.other_user.follower_count, 1)
+
+    def test_cannot_follow_yourself(self) -> None:
+        response = self.client.put(reverse("follow", args=[self.user.id]))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_unfollow(self) -> None:
+        self.client.put(self.url)
+        response = self.client.delete(self.url)
+
+        self.assertEqual(response.data["following"], False)
+        self.assertEqual(Follow.objects.count(), 0)
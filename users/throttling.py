@@ -0,0 +1,40 @@
+import hashlib
+
+from rest_framework.request import Request
+from rest_framework.throttling import SimpleRateThrottle
+from rest_framework.views import APIView
+
+
+# Every sign-in costs a full password hash, so sign-in endpoints are limited
+# per client IP and per attempted username, independently of each other.
+class LoginRateThrottle(SimpleRateThrottle):
+    scope = "login"
+
+    def get_cache_key(self, request: Request, view: APIView) -> str:  # noqa: ARG002
+        return self.cache_format % {
+            "scope": self.scope,
+            "ident": self.get_ident(request),
+        }
+
+
+class LoginUsernameRateThrottle(SimpleRateThrottle):
+    scope = "login_username"
+
+    def get_cache_key(
+        self,
+        request: Request,
+        view: APIView,  # noqa: ARG002
+    ) -> str | None:
+        username = request.data.get("username")
+        if not isinstance(username, str) or not username:
+            return None
+        # Hashed: attempted usernames are arbitrary client input.
+        ident = hashlib.sha256(username.strip().lower().encode()).hexdigest()
+        return self.cache_format % {"scope": self.scope, "ident": ident}
+
+
+class RegisterRateThrottle(LoginRateThrottle):
+    scope = "register"
+
+
+LOGIN_THROTTLES = [LoginRateThrottle, LoginUsernameRateThrottle]
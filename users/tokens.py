@@ -0,0 +1,145 @@
+from datetime import UTC, datetime
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth.models import AbstractBaseUser
+from django.core.cache import BaseCache, caches
+from django.db import transaction
+from django.db.models import Exists, F, QuerySet
+from django.utils import timezone
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken, Token
+
+from .models import CustomUser, RevokedToken
+
+
+# Refresh tokens (and the access tokens minted from them) carry the claims
+# ClaimsJWTAuthentication needs to build a user without loading it.
+class ClaimsRefreshToken(RefreshToken):
+    @classmethod
+    def for_user(cls, user: AbstractBaseUser) -> "ClaimsRefreshToken":
+        token = super().for_user(user)
+        token["username"] = user.get_username()
+        token["is_active"] = user.is_active
+        token["token_version"] = user.token_version
+        return token
+
+
+class ClaimsTokenUser(TokenUser):
+    # simplejwt stores the user ID claim as a string.
+    @property
+    def id(self) -> int:
+        return int(self.token[api_settings.USER_ID_CLAIM])
+
+    @property
+    def is_active(self) -> bool:
+        return bool(self.token.get("is_active", False))
+
+
+# Revocations live in the database, so they hold across worker processes and
+# for changes made outside the web server (admin, shell, changepassword).
+# Reads check a copy of each user's token version and active flag, and of
+# each token's own revocation, kept in JWT_REVOCATION_CACHE_ALIAS for
+# JWT_REVOCATION_CACHE_TIMEOUT seconds. Revocations made here update the cache
+# right away; a per-process cache or a change that skips the signals (a
+# queryset update) only reaches other processes once their copy expires.
+# Writes and token refreshes always check the database.
+
+
+def revocation_cache() -> BaseCache:
+    return caches[settings.JWT_REVOCATION_CACHE_ALIAS]
+
+
+def user_state_key(user_id: object) -> str:
+    return f"jwt:user:{user_id}"
+
+
+def revoked_key(jti: object) -> str:
+    return f"jwt:revoked:{jti}"
+
+
+def revoke_tokens(*tokens: Token) -> None:
+    now = timezone.now()
+    RevokedToken.objects.filter(expires_at__lte=now).delete()
+    revoked = [
+        RevokedToken(
+            jti=token[api_settings.JTI_CLAIM],
+            expires_at=datetime.fromtimestamp(token["exp"], tz=UTC),
+        )
+        for token in tokens
+    ]
+    RevokedToken.objects.bulk_create(revoked, ignore_conflicts=True)
+    for token in revoked:
+        revocation_cache().set(
+            revoked_key(token.jti),
+            True,  # noqa: FBT003
+            timeout=max((token.expires_at - now).total_seconds(), 1),
+        )
+
+
+def revoke_user_tokens(user_id: int) -> None:
+    # Every token of the user issued up to now, including refresh tokens.
+    CustomUser.objects.filter(pk=user_id).update(
+        token_version=F("token_version") + 1,
+    )
+    # Again on commit, in case a read cached the old version in between.
+    revocation_cache().delete(user_state_key(user_id))
+    transaction.on_commit(
+        partial(revocation_cache().delete, user_state_key(user_id)),
+    )
+
+
+def revoked_tokens(token: Token) -> QuerySet[RevokedToken]:
+    return RevokedToken.objects.filter(jti=token.get(api_settings.JTI_CLAIM))
+
+
+def is_revoked(token: Token, user: CustomUser | None = None) -> bool:
+    # One query: the user's current token version and active flag (unless
+    # the caller loaded the user already, annotated with ``token_revoked``)
+    # and whether the token was revoked by itself. Tokens issued without a
+    # version claim count as version 0.
+    if user is None:
+        state = (
+            CustomUser.objects.filter(pk=token.get(api_settings.USER_ID_CLAIM))
+            .values_list(
+                "token_version",
+                "is_active",
+                Exists(revoked_tokens(token)),
+            )
+            .first()
+        )
+        if state is None:
+            return True
+        version, is_active, token_revoked = state
+    else:
+        version, is_active = user.token_version, user.is_active
+        token_revoked = user.token_revoked
+    cache_revocation_state(token, (version, is_active), token_revoked=token_revoked)
+    return token_revoked or not is_active or token.get("token_version", 0) != version
+
+
+def is_revoked_cached(token: Token) -> bool:
+    # No query while both cached entries are present.
+    user_key = user_state_key(token.get(api_settings.USER_ID_CLAIM))
+    jti_key = revoked_key(token.get(api_settings.JTI_CLAIM))
+    cached = revocation_cache().get_many([user_key, jti_key])
+    if user_key not in cached or jti_key not in cached:
+        return is_revoked(token)
+    version, is_active = cached[user_key]
+    return cached[jti_key] or not is_active or token.get("token_version", 0) != version
+
+
+def cache_revocation_state(
+    token: Token,
+    user_state: tuple[int, bool],
+    *,
+    token_revoked: bool,
+) -> None:
+    revocation_cache().set_many(
+        {
+            user_state_key(token.get(api_settings.USER_ID_CLAIM)): user_state,
+            revoked_key(token.get(api_settings.JTI_CLAIM)): token_revoked,
+        },
+        timeout=settings.JWT_REVOCATION_CACHE_TIMEOUT,
+    )
@@ -1,4 +1,7 @@
 from django.contrib.auth import logout
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.shortcuts import get_object_or_404
 from rest_framework import generics, status
 from rest_framework.authtoken.models import Token
 from rest_framework.authtoken.views import ObtainAuthToken
@@ -6,9 +9,21 @@ from rest_framework.permissions import AllowAny
 from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import Token as JWTToken
 
-from .models import CustomUser
+from posts.feed import (
+    backfill_former_celebrity,
+    backfill_timeline,
+    drop_from_timeline,
+    record_sign_in,
+)
+
+from .models import CustomUser, Follow
 from .serializers import UserRegisterSerializer, UserSerializer
+from .throttling import LOGIN_THROTTLES, RegisterRateThrottle
+from .tokens import ClaimsRefreshToken, revoke_tokens
 
 
 class UserListCreate(generics.ListCreateAPIView):
@@ -19,6 +34,7 @@ class UserListCreate(generics.ListCreateAPIView):
 class RegisterView(generics.CreateAPIView):
     serializer_class = UserRegisterSerializer
     permission_classes = [AllowAny]
+    throttle_classes = [RegisterRateThrottle]
 
     def create(self, request: Request) -> Response:
         serializer = self.get_serializer(data=request.data)
@@ -38,11 +54,13 @@ class RegisterView(generics.CreateAPIView):
 
 
 class CustomAuthToken(ObtainAuthToken):
+    throttle_classes = LOGIN_THROTTLES
 
     def post(self, request: Request) -> Response:
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = serializer.validated_data["user"]
+        record_sign_in(user)
         token, created = Token.objects.get_or_create(user=user)
         return Response(
             {
@@ -56,6 +74,53 @@ class CustomAuthToken(ObtainAuthToken):
 class LogoutView(APIView):
 
     def post(self, request: Request) -> Response:
-        request.user.auth_token.delete()
+        tokens = [request.auth] if isinstance(request.auth, JWTToken) else []
+        # The refresh token would otherwise keep minting access tokens.
+        try:
+            refresh = ClaimsRefreshToken(request.data.get("refresh", ""))
+        except TokenError:
+            pass
+        else:
+            if refresh.get(api_settings.USER_ID_CLAIM) == str(request.user.pk):
+                tokens.append(refresh)
+        if tokens:
+            revoke_tokens(*tokens)
+        Token.objects.filter(user=request.user).delete()
         logout(request)
         return Response(status=status.HTTP_200_OK)
+
+
+class FollowView(APIView):
+
+    def put(self, request: Request, pk: int) -> Response:
+        followee = get_object_or_404(CustomUser, pk=pk)
+        if followee.pk == request.user.pk:
+            return Response(
+                {"detail": "You cannot follow yourself."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            with transaction.atomic():
+                Follow.objects.create(follower=request.user, followee=followee)
+                CustomUser.objects.filter(pk=followee.pk).update(
+                    follower_count=F("follower_count") + 1,
+                )
+                backfill_timeline(request.user.pk, followee)
+        except IntegrityError:
+            pass
+        return Response({"user": followee.pk, "following": True})
+
+    def delete(self, request: Request, pk: int) -> Response:
+        with transaction.atomic():
+            deleted, _ = Follow.objects.filter(
+                follower=request.user,
+                followee_id=pk,
+            ).delete()
+            if deleted:
+                CustomUser.objects.filter(pk=pk).update(
+                    follower_count=F("follower_count") - 1,
+                )
+                drop_from_timeline(request.user.pk, pk)
+                backfill_former_celebrity(pk)
+        return Response({"user": pk, "following": False})